@@ -0,0 +1,306 @@
+"""Streaming decoding of inline base64 images in JSON responses.
+
+Providers can return generated images inline, as base64 strings in a JSON
+field, instead of as URLs to download. ``InlineImageDecoder`` parses such
+a response incrementally as it is read from the network: the base64
+strings of the image field are decoded chunk by chunk straight into files,
+and only the rest of the document is kept in memory and parsed as JSON.
+Peak memory therefore does not grow with the number or size of images.
+
+The decoded files are referenced by ``DecodedImage`` objects and can be
+memory-mapped with ``map_image`` to access their bytes without copying.
+"""
+
+import binascii
+import json
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, BinaryIO, List, Optional, Tuple
+
+from .base import ProviderError
+
+# Field of Volcengine visual API responses carrying inline images.
+IMAGE_FIELD = "binary_data_base64"
+
+# Leading bytes of the image formats returned by providers.
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (b"GIF8", "image/gif", ".gif"),
+)
+
+_WHITESPACE = b" \t\r\n"
+
+# JSON escapes that can occur inside a base64 string, and their replacement.
+_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b"", ord("t"): b""}
+
+_SKELETON, _COLON, _OPEN, _ARRAY, _STRING = range(5)
+
+@dataclass
+class DecodedImage:
+    """An inline image decoded into a file.
+
+    Attributes:
+        path: The file holding the image.
+        size: Size of the image in bytes.
+        mime_type: The image type, sniffed from its leading bytes.
+    """
+    path: str
+    size: int
+    mime_type: str
+
+    def remove(self) -> None:
+        """Delete the file, if it still exists."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def map_image(path: str) -> mmap.mmap:
+    """Memory-map a decoded image read-only.
+
+    Args:
+        path: The image file, e.g. ``DecodedImage.path``.
+
+    Returns:
+        The mapping. Close it when done.
+    """
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _sniff(head: bytes) -> Tuple[str, str]:
+    """Get the MIME type and file extension of an image from its leading bytes."""
+    for signature, mime_type, extension in _SIGNATURES:
+        if head.startswith(signature):
+            return mime_type, extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    return "application/octet-stream", ".bin"
+
+class _ImageWriter:
+    """Decodes one base64 string into a file, piece by piece."""
+
+    def __init__(self, directory: str):
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self.file: BinaryIO = os.fdopen(fd, "wb")
+        self.size = 0
+        self.head = b""
+        # Base64 characters short of a full 4-character quantum.
+        self._carry = b""
+        # Whether the previous piece ended inside a JSON escape.
+        self._escape = False
+
+    def write(self, text: bytes) -> None:
+        """Decode the next piece of the string's raw JSON text."""
+        if self._escape or b"\\" in text:
+            text = self._unescape(text)
+        text = text.translate(None, _WHITESPACE)
+        if self._carry:
+            text = self._carry + text
+        end = len(text) - len(text) % 4
+        self._carry = text[end:]
+        if end:
+            self._emit(self._decode(memoryview(text)[:end]))
+
+    @staticmethod
+    def _decode(text: Any) -> bytes:
+        try:
+            return binascii.a2b_base64(text)
+        except binascii.Error as e:
+            raise ProviderError(f"Invalid inline image data: {e}") from None
+
+    def _unescape(self, text: bytes) -> bytes:
+        parts = []
+        start = 0
+        if self._escape:
+            parts.append(self._escape_of(text[:1]))
+            start = 1
+            self._escape = False
+        while True:
+            i = text.find(b"\\", start)
+            if i < 0:
+                parts.append(text[start:])
+                break
+            parts.append(text[start:i])
+            if i + 1 == len(text):
+                self._escape = True
+                break
+            parts.append(self._escape_of(text[i + 1:i + 2]))
+            start = i + 2
+        return b"".join(parts)
+
+    @staticmethod
+    def _escape_of(char: bytes) -> bytes:
+        if not char:
+            return b""
+        replacement = _ESCAPES.get(char[0])
+        if replacement is None:
+            raise ProviderError(f"Unexpected escape in inline image data: \\{char.decode(errors='replace')}")
+        return replacement
+
+    def _emit(self, data: bytes) -> None:
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self.file.write(data)
+        self.size += len(data)
+
+    def finish(self) -> DecodedImage:
+        """Flush the last quantum and move the file to its final name."""
+        if self._carry:
+            # Tolerate omitted padding.
+            self._emit(self._decode(self._carry + b"=" * (-len(self._carry) % 4)))
+            self._carry = b""
+        self.file.close()
+        mime_type, extension = _sniff(self.head)
+        path = self.tmp_path[:-len(".part")] + extension
+        os.replace(self.tmp_path, path)
+        return DecodedImage(path=path, size=self.size, mime_type=mime_type)
+
+    def discard(self) -> None:
+        """Close and delete the partial file."""
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+class InlineImageDecoder:
+    """Incremental parser of a JSON response with inline base64 images.
+
+    Feed the raw response body as it arrives, then call ``finish`` to get
+    the parsed document, in which every base64 string of the image field
+    is replaced by a ``DecodedImage``.
+    """
+
+    def __init__(self, directory: str, field: str = IMAGE_FIELD):
+        """Initialize the decoder.
+
+        Args:
+            directory: Directory receiving the decoded images.
+            field: Name of the field holding a list of base64 strings.
+        """
+        self.directory = directory
+        self.field = field
+        self.bytes_read = 0
+        self._marker = json.dumps(field).encode()
+        self._skeleton = bytearray()
+        self._scan_from = 0
+        self._state = _SKELETON
+        self._writer: Optional[_ImageWriter] = None
+        self._images: List[DecodedImage] = []
+
+    def feed(self, data: bytes) -> None:
+        """Parse the next piece of the response body.
+
+        Args:
+            data: The bytes, in the order received.
+
+        Raises:
+            ProviderError: If the image field is malformed.
+        """
+        self.bytes_read += len(data)
+        pos = 0
+        while pos < len(data):
+            state = self._state
+            if state == _SKELETON:
+                pos = self._scan(data, pos)
+            elif state == _STRING:
+                end = data.find(b'"', pos)
+                if end < 0:
+                    self._writer.write(data[pos:])
+                    return
+                self._writer.write(data[pos:end])
+                self._images.append(self._writer.finish())
+                self._writer = None
+                self._state = _ARRAY
+                pos = end + 1
+            else:
+                char = data[pos:pos + 1]
+                if char in _WHITESPACE:
+                    pos += 1
+                elif state == _COLON:
+                    if char != b":":
+                        self._state = _SKELETON
+                        continue
+                    self._skeleton += char
+                    self._state = _OPEN
+                    pos += 1
+                elif state == _OPEN:
+                    if char != b"[":
+                        # Not a list, e.g. null: keep it as it is.
+                        self._state = _SKELETON
+                        continue
+                    self._state = _ARRAY
+                    pos += 1
+                elif char == b",":
+                    pos += 1
+                elif char == b'"':
+                    self._writer = _ImageWriter(self.directory)
+                    self._state = _STRING
+                    pos += 1
+                elif char == b"]":
+                    # Placeholder list, filled with the images by ``finish``.
+                    self._skeleton += b"[]"
+                    self._state = _SKELETON
+                    pos += 1
+                else:
+                    raise ProviderError(f"Malformed {self.field} field in response")
+
+    def _scan(self, data: bytes, pos: int) -> int:
+        """Copy document text to the skeleton until the image field starts."""
+        marker = self._marker
+        self._skeleton += data[pos:] if pos else data
+        found = self._skeleton.find(marker, self._scan_from)
+        if found < 0:
+            self._scan_from = max(len(self._skeleton) - len(marker) + 1, 0)
+            return len(data)
+        end = found + len(marker)
+        # Hand the text after the field name back to the state machine.
+        consumed = len(data) - (len(self._skeleton) - end)
+        del self._skeleton[end:]
+        self._scan_from = end
+        self._state = _COLON
+        return consumed
+
+    def finish(self) -> Any:
+        """Parse the document once the whole body was fed.
+
+        Returns:
+            The document, with the image field's strings replaced by
+            ``DecodedImage`` objects.
+
+        Raises:
+            ProviderError: If the body ended early or is not valid JSON.
+        """
+        if self._state not in (_SKELETON, _COLON, _OPEN):
+            raise ProviderError("Response ended inside inline image data")
+        try:
+            document = json.loads(self._skeleton)
+        except ValueError as e:
+            raise ProviderError(f"Invalid JSON response: {e}") from None
+        self._skeleton = bytearray()
+        self._attach(document)
+        return document
+
+    def _attach(self, value: Any) -> None:
+        """Put the decoded images in place of the placeholder lists."""
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key == self.field and item == []:
+                    value[key] = self._images
+                else:
+                    self._attach(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._attach(item)
+
+    def discard(self) -> None:
+        """Delete all images decoded so far, e.g. after a failure."""
+        if self._writer is not None:
+            self._writer.discard()
+            self._writer = None
+        for image in self._images:
+            image.remove()
+        self._images = []
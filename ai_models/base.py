@@ -3,13 +3,31 @@
 This module defines the core interfaces and types used across all AI model implementations.
 """
 
+import asyncio
+import logging
+import time
+import weakref
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional, List, Dict, Any, Union, Protocol, TypeVar, Generic
+from typing import (
+    Optional, List, Dict, Any, Union, Protocol, TypeVar, Generic,
+    AsyncIterator, Iterable, Tuple, TYPE_CHECKING
+)
+
+if TYPE_CHECKING:
+    from .metrics import Instrumentation, RequestTrace
+    from .resilience import ResiliencePolicy
 
 T = TypeVar('T')
 
+logger = logging.getLogger(__name__)
+
+# Per event loop, per provider semaphores shared by all batch calls.
+_provider_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
 class ModelType(Enum):
     """Enumeration of supported model types."""
     OPENAI = "openai"
@@ -17,6 +35,41 @@ class ModelType(Enum):
     STABLE_DIFFUSION = "stable_diffusion"
     MIDJOURNEY = "midjourney"
 
+class ErrorCode(str, Enum):
+    """Enumeration of machine-readable generation error codes."""
+    RATE_LIMITED = "rate_limited"
+    AUTH_ERROR = "auth_error"
+    CLIENT_ERROR = "client_error"
+    UPSTREAM_ERROR = "upstream_error"
+    NETWORK_ERROR = "network_error"
+    TIMEOUT = "timeout"
+    CIRCUIT_OPEN = "circuit_open"
+    OVERLOADED = "overloaded"
+    CONNECT_TIMEOUT = "connect_timeout"
+    FIRST_BYTE_TIMEOUT = "first_byte_timeout"
+    IDLE_TIMEOUT = "idle_timeout"
+    DEADLINE_EXCEEDED = "deadline_exceeded"
+    CANCELLED = "cancelled"
+    INTERNAL_ERROR = "internal_error"
+
+    @classmethod
+    def for_status(cls, status: Optional[int]) -> "ErrorCode":
+        """Map an upstream HTTP status code to an error code.
+
+        Args:
+            status: The HTTP status code, if known.
+
+        Returns:
+            The matching error code.
+        """
+        if status == 429:
+            return cls.RATE_LIMITED
+        if status in (401, 403):
+            return cls.AUTH_ERROR
+        if status is not None and 400 <= status < 500:
+            return cls.CLIENT_ERROR
+        return cls.UPSTREAM_ERROR
+
 class ContentType(Enum):
     """Enumeration of content types."""
     TEXT = "text"
@@ -43,7 +96,7 @@ class ModelConfig:
     host: Optional[str] = None
     default_model: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class GenerationRequest:
     """Request parameters for content generation.
     
@@ -59,6 +112,18 @@ class GenerationRequest:
         image_url: Optional input image URL.
         mask_url: Optional mask image URL.
         strength: Optional strength parameter.
+        retain_chunks: Whether chunks delivered through a callback are also
+            collected in the returned GenerationResponse. Disable for long
+            streams whose chunks are consumed by the callback alone.
+        deadline: Optional Unix time by which the whole generation, including
+            retries and polling, must finish.
+        connect_timeout: Optional seconds to establish an upstream connection.
+        first_byte_timeout: Optional seconds from sending an upstream request
+            to receiving its response headers.
+        idle_timeout: Optional maximum seconds between two reads of an
+            upstream response body, e.g. between streamed chunks.
+        n: Optional number of images to generate, at most the model's
+            ``max_images``. Defaults to one.
     """
     prompt: str
     model: Optional[str] = None
@@ -71,10 +136,26 @@ class GenerationRequest:
     image_url: Optional[str] = None
     mask_url: Optional[str] = None
     strength: Optional[float] = None
+    retain_chunks: bool = True
+    deadline: Optional[float] = None
+    connect_timeout: Optional[float] = None
+    first_byte_timeout: Optional[float] = None
+    idle_timeout: Optional[float] = None
+    n: Optional[int] = None
 
-@dataclass
+    def remaining(self) -> Optional[float]:
+        """Get the seconds left until the deadline, or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+@dataclass(slots=True)
 class ContentChunk:
     """A chunk of generated content.
+
+    Chunks are created per streamed delta, so they are slotted and carry no
+    metadata unless a provider has some. Chunks of one response may share a
+    single metadata dict; treat it as read-only and copy it before changes.
     
     Attributes:
         type: The type of content (text or image).
@@ -85,7 +166,7 @@ class ContentChunk:
     content: str
     metadata: Optional[Dict[str, Any]] = None
 
-@dataclass
+@dataclass(slots=True)
 class GenerationResponse:
     """Response from content generation.
     
@@ -95,12 +176,14 @@ class GenerationResponse:
         error: Optional error message.
         request_id: Optional request ID.
         metadata: Optional metadata about the generation.
+        error_code: Optional machine-readable error code, an ``ErrorCode`` value.
     """
     success: bool
     chunks: List[ContentChunk]
     error: Optional[str] = None
     request_id: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    error_code: Optional[str] = None
 
 class ContentCallback(Protocol):
     """Protocol for content callbacks."""
@@ -112,11 +195,102 @@ class ContentCallback(Protocol):
         """
         ...
 
+class ProviderError(Exception):
+    """Error reported by an upstream provider.
+
+    Attributes:
+        status: Optional HTTP status code of the failed upstream response.
+        code: The error code, derived from ``status`` unless given.
+        retry_after: Optional number of seconds the upstream asked to wait.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        code: Optional[ErrorCode] = None,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.status = status
+        self.code = code or ErrorCode.for_status(status)
+        self.retry_after = retry_after
+
+    def to_response(self) -> "GenerationResponse":
+        """Convert the error to a failed GenerationResponse."""
+        metadata = None
+        if self.retry_after is not None:
+            metadata = {"retry_after": self.retry_after}
+        return GenerationResponse(
+            success=False,
+            chunks=[],
+            error=str(self),
+            metadata=metadata,
+            error_code=self.code.value
+        )
+
+class StopGeneration(Exception):
+    """Raised by a content callback to abort the generation.
+
+    The upstream response is closed at once, releasing its connection, and
+    the generation returns a failed response with the ``cancelled`` error
+    code. Raise it when the consumer of a stream has gone away.
+    """
+
+def _parse_error_code(value: Optional[str]) -> Optional[ErrorCode]:
+    """Convert a stored error code back to an ErrorCode, if it is known."""
+    try:
+        return ErrorCode(value) if value else None
+    except ValueError:
+        return None
+
+class _StreamEnd:
+    """Queue sentinel marking the end of a chunk stream."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+async def _drain_queue(
+    queue: "asyncio.Queue[Union[ContentChunk, _StreamEnd]]",
+    producer: "asyncio.Task[None]"
+) -> AsyncIterator[ContentChunk]:
+    """Yield chunks from a queue fed by ``producer`` until it ends.
+
+    The producer is cancelled if the consumer stops early.
+    """
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _StreamEnd):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
 class AIModel(ABC, Generic[T]):
     """Abstract base class for AI models.
     
     This class defines the interface that all AI models must implement.
+
+    Attributes:
+        provider: Short provider name, used to namespace shared state such as caches.
+        max_concurrency: Maximum number of concurrent batch requests per provider.
+        stream_buffer_size: Number of chunks ``generate_stream`` reads ahead
+            of a slow consumer before it stops reading from the upstream.
+        instrumentation: Optional instrumentation receiving a trace of the
+            phases of every upstream request.
     """
+
+    provider: str = "unknown"
+    max_concurrency: int = 8
+    stream_buffer_size: int = 16
+    instrumentation: Optional["Instrumentation"] = None
     
     @abstractmethod
     async def generate(
@@ -165,6 +339,339 @@ class AIModel(ABC, Generic[T]):
         """
         raise NotImplementedError("Subclasses must implement supports_streaming()")
 
+    async def close(self) -> None:
+        """Release resources held by the model.
+
+        The default implementation does nothing.
+        """
+
+    def with_resilience(self, policy: Optional["ResiliencePolicy"] = None) -> "AIModel":
+        """Wrap the model with retries, hedging and a deadline.
+
+        Args:
+            policy: Optional resilience policy. Defaults to retries only.
+
+        Returns:
+            A ``ResilientModel`` wrapping this model.
+        """
+        from .resilience import ResilientModel
+        return ResilientModel(self, policy)
+
+    def _start_trace(self, model: str) -> "RequestTrace":
+        """Start tracing an upstream request.
+
+        Args:
+            model: The model ID of the request.
+
+        Returns:
+            A new trace, or a no-op trace if the model is not instrumented.
+        """
+        from .metrics import NULL_TRACE
+        if self.instrumentation is None:
+            return NULL_TRACE
+        return self.instrumentation.start(self.provider, model)
+
+    async def generate_stream(
+        self,
+        request: GenerationRequest,
+        buffer_size: Optional[int] = None
+    ) -> AsyncIterator[ContentChunk]:
+        """Generate content as an asynchronous stream of chunks.
+
+        Chunks are read from the upstream into a bounded buffer by a
+        background task. When the buffer is full, reading pauses until the
+        consumer catches up. Chunks are not retained once yielded. Closing
+        the iterator early, e.g. with ``contextlib.aclosing``, cancels the
+        upstream request.
+
+        Args:
+            request: The generation request parameters.
+            buffer_size: Optional buffer size. Defaults to ``stream_buffer_size``.
+
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the generation fails.
+        """
+        queue: "asyncio.Queue[Union[ContentChunk, _StreamEnd]]" = asyncio.Queue(
+            maxsize=buffer_size or self.stream_buffer_size
+        )
+
+        async def produce() -> None:
+            try:
+                async for chunk in self._iter_content(request):
+                    await queue.put(chunk)
+            except Exception as e:
+                await queue.put(_StreamEnd(e))
+            else:
+                await queue.put(_StreamEnd())
+
+        stream = _drain_queue(queue, asyncio.create_task(produce()))
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _iter_content(self, request: GenerationRequest) -> AsyncIterator[ContentChunk]:
+        """Yield the chunks of a request as they arrive from the upstream.
+
+        Providers override this with their native streaming implementation.
+        The default adapts ``generate`` with a callback, so wrappers and
+        third-party models get ``generate_stream`` for free.
+
+        Args:
+            request: The generation request parameters.
+
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the generation fails.
+        """
+        queue: "asyncio.Queue[Union[ContentChunk, _StreamEnd]]" = asyncio.Queue(maxsize=1)
+
+        async def produce() -> None:
+            try:
+                response = await self.generate(request, queue.put)
+            except Exception as e:
+                await queue.put(_StreamEnd(e))
+            else:
+                error = None
+                if not response.success:
+                    error = ProviderError(
+                        response.error or "Generation failed",
+                        code=_parse_error_code(response.error_code)
+                    )
+                await queue.put(_StreamEnd(error))
+
+        stream = _drain_queue(queue, asyncio.create_task(produce()))
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    async def _generate_from_stream(
+        self,
+        request: GenerationRequest,
+        callback: ContentCallback
+    ) -> GenerationResponse:
+        """Implement the callback API on top of ``generate_stream``.
+
+        Args:
+            request: The generation request parameters.
+            callback: The callback receiving each chunk.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+
+        Raises:
+            ProviderError: If the generation fails.
+        """
+        chunks: List[ContentChunk] = []
+        stream = self.generate_stream(request)
+        try:
+            async for chunk in stream:
+                if request.retain_chunks:
+                    chunks.append(chunk)
+                try:
+                    await callback(chunk)
+                except StopGeneration as e:
+                    # Closing the stream below aborts the upstream response.
+                    return GenerationResponse(
+                        success=False,
+                        chunks=chunks,
+                        error=str(e) or "Generation stopped by the callback",
+                        error_code=ErrorCode.CANCELLED.value
+                    )
+                except Exception:
+                    logger.exception("Error in content callback")
+        finally:
+            await stream.aclose()
+
+        return GenerationResponse(success=True, chunks=chunks)
+
+    async def generate_many(
+        self,
+        requests: Iterable[GenerationRequest],
+        concurrency: Optional[int] = None,
+        ordered: bool = True
+    ) -> List[GenerationResponse]:
+        """Generate content for many requests with bounded concurrency.
+
+        A failing request does not affect the others; it is reported as an
+        unsuccessful GenerationResponse in its slot.
+
+        Args:
+            requests: The generation requests.
+            concurrency: Maximum number of requests of this batch in flight.
+                Defaults to ``max_concurrency``.
+            ordered: If True, responses are returned in request order,
+                otherwise in completion order.
+
+        Returns:
+            One GenerationResponse per request.
+
+        Raises:
+            Exception: Whatever iterating ``requests`` raised.
+        """
+        if not ordered:
+            return [response async for _, response in self.as_completed(requests, concurrency)]
+
+        responses: Dict[int, GenerationResponse] = {}
+        async for index, response in self.as_completed(requests, concurrency):
+            responses[index] = response
+        return [responses[index] for index in range(len(responses))]
+
+    async def as_completed(
+        self,
+        requests: Iterable[GenerationRequest],
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, GenerationResponse]]:
+        """Generate content for many requests, yielding results as they complete.
+
+        Requests are pulled from ``requests`` lazily, so it may be a generator
+        over a large catalogue. In addition to ``concurrency``, all batches of
+        the same provider share a semaphore of size ``max_concurrency``.
+
+        Args:
+            requests: The generation requests.
+            concurrency: Maximum number of requests of this batch in flight.
+                Defaults to ``max_concurrency``.
+
+        Yields:
+            Tuples of the request index and its GenerationResponse.
+
+        Raises:
+            Exception: Whatever iterating ``requests`` raised, once the
+                requests already started have been yielded.
+        """
+        provider_limit = self._provider_semaphore()
+        pending = enumerate(requests)
+        results: "asyncio.Queue[Optional[Tuple[int, GenerationResponse]]]" = asyncio.Queue()
+        errors: List[Exception] = []
+
+        async def worker() -> None:
+            try:
+                for index, request in pending:
+                    async with provider_limit:
+                        response = await self._generate_safely(request)
+                    results.put_nowait((index, response))
+            except Exception as e:
+                # Only ``requests`` can raise here; the generator is finished now.
+                errors.append(e)
+            finally:
+                results.put_nowait(None)
+
+        workers = [
+            asyncio.create_task(worker())
+            for _ in range(max(1, concurrency or self.max_concurrency))
+        ]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is None:
+                    running -= 1
+                else:
+                    yield item
+            if errors:
+                raise errors[0]
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _generate_safely(self, request: GenerationRequest) -> GenerationResponse:
+        """Generate content, reporting unexpected exceptions as a failed response."""
+        try:
+            return await self.generate(request)
+        except Exception as e:
+            logger.exception("Error in batch generation")
+            return GenerationResponse(
+                success=False,
+                chunks=[],
+                error=str(e),
+                error_code=ErrorCode.INTERNAL_ERROR.value
+            )
+
+    def _provider_semaphore(self) -> asyncio.Semaphore:
+        """Get the semaphore shared by all batch calls of this provider."""
+        semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(self.provider)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            semaphores[self.provider] = semaphore
+        return semaphore
+
+class ModelWrapper(AIModel):
+    """Base class for models that add behaviour around another model.
+
+    All calls are delegated to the wrapped model. Subclasses override the
+    methods they want to intercept.
+
+    Attributes:
+        model: The wrapped model.
+    """
+
+    def __init__(self, model: AIModel):
+        """Initialize the wrapper.
+
+        Args:
+            model: The model to wrap.
+        """
+        self.model = model
+
+    @property
+    def provider(self) -> str:
+        """The provider name of the wrapped model."""
+        return self.model.provider
+
+    @property
+    def max_concurrency(self) -> int:
+        """The batch concurrency limit of the wrapped model."""
+        return self.model.max_concurrency
+
+    @property
+    def config(self) -> Optional[ModelConfig]:
+        """The configuration of the wrapped model, if it has one."""
+        return getattr(self.model, "config", None)
+
+    @property
+    def default_model(self) -> Optional[str]:
+        """The default model of the wrapped model, if it has one."""
+        return getattr(self.model, "default_model", None)
+
+    async def __aenter__(self) -> "ModelWrapper":
+        """Enter the model context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the wrapped model when exiting context."""
+        await self.close()
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content using the wrapped model."""
+        return await self.model.generate(request, callback)
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get list of available models of the wrapped model."""
+        return self.model.get_available_models()
+
+    def supports_streaming(self, model: str) -> bool:
+        """Check if the wrapped model supports streaming for a model."""
+        return self.model.supports_streaming(model)
+
+    async def close(self) -> None:
+        """Close the wrapped model."""
+        await self.model.close()
+
 class ModelFactory(ABC):
     """Abstract factory for creating AI model instances."""
     
@@ -0,0 +1,132 @@
+"""Cold import and startup time of the package.
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+``sys.modules``. For each target it reports the median wall time of the
+import, the slowest modules according to ``python -X importtime`` and
+whether ``aiohttp`` was pulled in.
+
+Usage:
+    python -m ai_models.benchmarks.import_time [--runs N] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Name and code of each measured startup path.
+TARGETS: List[Tuple[str, str]] = [
+    ("base", "import ai_models.base"),
+    ("factory", "import ai_models.factory"),
+    (
+        "factory+openai",
+        "from ai_models.base import ModelConfig, ModelType\n"
+        "from ai_models.factory import model_factory\n"
+        "model_factory.create_model(ModelType.OPENAI, ModelConfig(api_key='k'))",
+    ),
+    (
+        "factory+doubao",
+        "from ai_models.base import ModelConfig, ModelType\n"
+        "from ai_models.factory import model_factory\n"
+        "model_factory.create_model(ModelType.DOUBAO, ModelConfig(api_key='k'))",
+    ),
+]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+exec(compile({code!r}, "<target>", "exec"))
+elapsed = time.perf_counter() - start
+result = [elapsed, "aiohttp" in sys.modules, len(sys.modules)]
+import json
+print(json.dumps(result))
+"""
+
+def _env() -> Dict[str, str]:
+    """Environment making the package importable from the source tree."""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def measure(code: str, runs: int) -> Dict[str, Any]:
+    """Measure one startup path.
+
+    Args:
+        code: The code to time.
+        runs: Number of fresh interpreters to run.
+
+    Returns:
+        The median and minimum time, whether aiohttp was imported and the
+        number of loaded modules.
+    """
+    env = _env()
+    times = []
+    aiohttp_loaded = False
+    modules = 0
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(code=code)],
+            capture_output=True, text=True, check=True, env=env,
+        ).stdout
+        elapsed, aiohttp_loaded, modules = json.loads(output.strip().splitlines()[-1])
+        times.append(elapsed)
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "min_ms": min(times) * 1000,
+        "aiohttp": aiohttp_loaded,
+        "modules": modules,
+    }
+
+def slowest_modules(code: str, top: int) -> List[Tuple[str, int]]:
+    """Get the modules with the highest cumulative import time.
+
+    Args:
+        code: The code to profile.
+        top: Number of modules to return.
+
+    Returns:
+        ``(module, microseconds)`` pairs, slowest first.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True, env=_env(),
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            entries.append((name.strip(), int(cumulative)))
+    return sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in TARGETS:
+        result = measure(code, args.runs)
+        result["slowest"] = slowest_modules(code, args.top)
+        results[name] = result
+        print(
+            f"{name:<16} {result['median_ms']:8.1f} ms median {result['min_ms']:8.1f} ms min"
+            f"  {result['modules']:4d} modules  aiohttp {'yes' if result['aiohttp'] else 'no'}"
+        )
+        for module, micros in result["slowest"]:
+            print(f"    {micros / 1000:8.1f} ms  {module}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "targets": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
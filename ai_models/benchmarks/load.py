@@ -0,0 +1,321 @@
+"""Load test of the model implementations against local stand-ins.
+
+Starts ``StandinServer`` in a child process, so its CPU time does not count
+against the client, then drives ``OpenAIModel`` and ``DoubaoModel`` through
+a set of scenarios at fixed concurrency. For each scenario it reports
+throughput, latency and time-to-first-chunk percentiles and client CPU time
+per request. The memory high-water mark is reported once for the whole run,
+since the operating system only tracks it per process; ``--tracemalloc``
+adds a Python allocation peak per scenario. Results can be written as JSON
+and compared with a previous run to catch regressions.
+
+Usage:
+    python -m ai_models.benchmarks.load [--scenario NAME ...] [--requests N]
+        [--output results.json] [--compare baseline.json] [--threshold 0.1]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+from ..base import ContentChunk, GenerationRequest, ModelConfig, ModelType
+from ..factory import DefaultModelFactory
+from ..openai_model import CoalesceConfig
+from .standins import StandinConfig, StandinServer, add_arguments, config_from_args
+
+@dataclass
+class Scenario:
+    """One load scenario.
+
+    Attributes:
+        name: Unique scenario name used in reports.
+        model_type: The provider to drive.
+        concurrency: Number of requests kept in flight.
+        stream: Whether to pass a callback, i.e. stream the response.
+        async_mode: Whether Doubao uses submit/poll.
+        coalesce: Whether OpenAI coalesces streamed text deltas.
+    """
+    name: str
+    model_type: ModelType
+    concurrency: int
+    stream: bool = False
+    async_mode: bool = False
+    coalesce: bool = False
+
+SCENARIOS = [
+    Scenario("openai-stream-c1", ModelType.OPENAI, 1, stream=True),
+    Scenario("openai-stream-c16", ModelType.OPENAI, 16, stream=True),
+    Scenario("openai-stream-c64", ModelType.OPENAI, 64, stream=True),
+    Scenario("openai-coalesced-c64", ModelType.OPENAI, 64, stream=True, coalesce=True),
+    Scenario("openai-json-c16", ModelType.OPENAI, 16),
+    Scenario("doubao-sync-c16", ModelType.DOUBAO, 16),
+    Scenario("doubao-async-c64", ModelType.DOUBAO, 64, async_mode=True),
+]
+
+# Metrics where a lower value is better; all others are better when higher.
+LOWER_IS_BETTER = (
+    "latency_p50", "latency_p95", "latency_p99",
+    "ttfc_p50", "ttfc_p95", "ttfc_p99",
+    "cpu_ms_per_request",
+)
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def max_rss_kb() -> Optional[int]:
+    """Peak resident set size of this process, in kilobytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+def model_config(model_type: ModelType, url: str) -> ModelConfig:
+    """Configuration pointing a provider at the stand-in server."""
+    if model_type is ModelType.OPENAI:
+        return ModelConfig(api_key="bench", endpoint=f"{url}/v1/chat/completions")
+    return ModelConfig(
+        api_key="bench",
+        api_secret="bench",
+        endpoint=url,
+        region="cn-north-1",
+        service="cv",
+        host="visual.volcengineapi.com",
+    )
+
+async def run_scenario(scenario: Scenario, url: str, requests: int, warmup: int) -> Dict[str, Any]:
+    """Run one scenario and collect its measurements.
+
+    Args:
+        scenario: The scenario.
+        url: Base URL of the stand-in server.
+        requests: Number of measured requests.
+        warmup: Number of unmeasured requests sent first.
+
+    Returns:
+        The scenario results.
+    """
+    options: Dict[str, Any] = {}
+    if scenario.async_mode:
+        options["async_mode"] = True
+    if scenario.coalesce:
+        options["coalesce"] = CoalesceConfig()
+    async with DefaultModelFactory() as factory:
+        model = factory.create_model(scenario.model_type, model_config(scenario.model_type, url), **options)
+        latencies: List[float] = []
+        first_chunks: List[float] = []
+        errors: Dict[str, int] = {}
+        chunks = 0
+
+        async def one(measure: bool) -> None:
+            nonlocal chunks
+            start = time.perf_counter()
+            first: List[float] = []
+
+            async def callback(chunk: ContentChunk) -> None:
+                if not first:
+                    first.append(time.perf_counter() - start)
+
+            response = await model.generate(
+                GenerationRequest(prompt="benchmark"),
+                callback if scenario.stream else None
+            )
+            elapsed = time.perf_counter() - start
+            if not measure:
+                return
+            if not response.success:
+                code = response.error_code or "unknown"
+                errors[code] = errors.get(code, 0) + 1
+                return
+            latencies.append(elapsed)
+            first_chunks.append(first[0] if first else elapsed)
+            chunks += len(response.chunks)
+
+        async def drive(count: int, measure: bool) -> None:
+            remaining = iter(range(count))
+
+            async def worker() -> None:
+                for _ in remaining:
+                    await one(measure)
+
+            await asyncio.gather(*(worker() for _ in range(scenario.concurrency)))
+
+        await drive(warmup, measure=False)
+
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        await drive(requests, measure=True)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+    result: Dict[str, Any] = {
+        "name": scenario.name,
+        "provider": scenario.model_type.value,
+        "concurrency": scenario.concurrency,
+        "stream": scenario.stream,
+        "async_mode": scenario.async_mode,
+        "coalesce": scenario.coalesce,
+        "requests": requests,
+        "errors": errors,
+        "chunks": chunks,
+        "duration": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "cpu_ms_per_request": cpu * 1000 / requests if requests else 0.0,
+    }
+    for pct in (50, 95, 99):
+        result[f"latency_p{pct}"] = percentile(latencies, pct)
+        result[f"ttfc_p{pct}"] = percentile(first_chunks, pct)
+    if tracemalloc.is_tracing():
+        result["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+    return result
+
+def _serve(config: StandinConfig, connection) -> None:
+    """Child process entry point running the stand-in server."""
+    async def serve() -> None:
+        server = StandinServer(config)
+        connection.send(await server.start())
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, connection.recv)
+        await server.stop()
+
+    asyncio.run(serve())
+
+def git_revision() -> Optional[str]:
+    """The current git revision, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Compare results with a baseline run.
+
+    Args:
+        results: The current results.
+        baseline: The baseline results.
+        threshold: Relative change counted as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+        A description of every regression.
+    """
+    previous = {scenario["name"]: scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in results["scenarios"]:
+        before = previous.get(scenario["name"])
+        if before is None:
+            continue
+        for metric in ("throughput",) + LOWER_IS_BETTER:
+            old, new = before.get(metric), scenario.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            print(f"  {scenario['name']:<20} {metric:<20} {old:12.4f} -> {new:12.4f} ({change:+.1%})"
+                  f"{'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append(f"{scenario['name']} {metric} {change:+.1%}")
+    return regressions
+
+def print_result(result: Dict[str, Any]) -> None:
+    """Print a one-line summary of a scenario."""
+    def ms(value: Optional[float]) -> str:
+        return f"{value * 1000:8.1f}" if value is not None else "     n/a"
+
+    print(
+        f"{result['name']:<20} {result['throughput']:9.1f} req/s"
+        f"  p50 {ms(result['latency_p50'])}  p95 {ms(result['latency_p95'])}"
+        f"  p99 {ms(result['latency_p99'])}  ttfc p50 {ms(result['ttfc_p50'])} ms"
+        f"  cpu {result['cpu_ms_per_request']:6.2f} ms/req"
+        f"  errors {sum(result['errors'].values())}"
+    )
+
+async def run(args: argparse.Namespace, url: str) -> List[Dict[str, Any]]:
+    """Run all selected scenarios."""
+    selected = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    results = []
+    for scenario in selected:
+        result = await run_scenario(scenario, url, args.requests, args.warmup)
+        print_result(result)
+        results.append(result)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=[s.name for s in SCENARIOS])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Compare with the JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Report the Python allocation peak per scenario (slower)")
+    parser.add_argument("--log-level", default="CRITICAL",
+                        help="Log level of the models; injected errors are logged at ERROR")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("ai_models").setLevel(args.log_level)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    standin_config = config_from_args(args)
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(standin_config, child), daemon=True)
+    server.start()
+    try:
+        url = parent.recv()
+        scenarios = asyncio.run(run(args, url))
+    finally:
+        parent.send("stop")
+        server.join(timeout=5)
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "standin": asdict(standin_config),
+        "scenarios": scenarios,
+        # Process-wide peak over all scenarios, not attributable to one.
+        "max_rss_kb": max_rss_kb(),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"comparison with {args.compare} (revision {baseline.get('revision')}):")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
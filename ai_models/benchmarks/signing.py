@@ -0,0 +1,133 @@
+"""Microbenchmark for Doubao request signing.
+
+Compares the original per-request signing routine (async helpers and a fresh
+four-step key derivation for every call) against ``V4Signer``.
+
+Usage:
+    python -m ai_models.benchmarks.signing [--iterations N]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import urllib.parse
+from typing import Dict
+
+from ..signing import V4Signer
+
+ACCESS_KEY = "AKLTbenchmarkaccesskey"
+SECRET_KEY = "benchmark-secret-key"
+REGION = "cn-north-1"
+SERVICE = "cv"
+HOST = "visual.volcengineapi.com"
+ACTION = "CVProcess"
+VERSION = "2022-08-31"
+BODY = json.dumps({
+    "req_key": "high_aes_general_v21_L",
+    "prompt": "一只可爱的熊猫在竹林中玩耍，水彩风格",
+    "return_url": True,
+}).encode()
+
+class LegacySigner:
+    """Verbatim port of the signing path previously inlined in DoubaoModel."""
+
+    def _sign_string_encoder(self, source: str) -> str:
+        return urllib.parse.quote(source, safe="").replace("*", "%2A")
+
+    async def _hash_sha256(self, content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    async def _hmac_sha256(self, key: bytes, content: str) -> bytes:
+        return hmac.new(key, content.encode(), hashlib.sha256).digest()
+
+    async def _gen_signing_secret_key_v4(self, secret_key, date, region, service) -> bytes:
+        k_date = await self._hmac_sha256(secret_key.encode(), date)
+        k_region = await self._hmac_sha256(k_date, region)
+        k_service = await self._hmac_sha256(k_region, service)
+        return await self._hmac_sha256(k_service, "request")
+
+    async def sign(self, body: str, x_date: str) -> Dict[str, str]:
+        x_content_sha256 = await self._hash_sha256(body)
+        short_x_date = x_date[:8]
+        credential_scope = f"{short_x_date}/{REGION}/{SERVICE}/request"
+        sign_header = "host;x-date;x-content-sha256;content-type"
+        content_type = "application/json"
+        query_string = "&".join([
+            f"{self._sign_string_encoder(k)}={self._sign_string_encoder(v)}"
+            for k, v in [("Action", ACTION), ("Version", VERSION)]
+        ])
+        canonical_string = "\n".join([
+            "POST",
+            "/",
+            query_string,
+            f"host:{HOST}",
+            f"x-date:{x_date}",
+            f"x-content-sha256:{x_content_sha256}",
+            f"content-type:{content_type}",
+            "",
+            sign_header,
+            x_content_sha256,
+        ])
+        hash_canonical_string = await self._hash_sha256(canonical_string)
+        string_to_sign = "\n".join([
+            "HMAC-SHA256",
+            x_date,
+            credential_scope,
+            hash_canonical_string,
+        ])
+        sign_key = await self._gen_signing_secret_key_v4(SECRET_KEY, short_x_date, REGION, SERVICE)
+        signature = hmac.new(sign_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return {
+            "Host": HOST,
+            "X-Date": x_date,
+            "X-Content-Sha256": x_content_sha256,
+            "Content-Type": content_type,
+            "Authorization": (
+                f"HMAC-SHA256 Credential={ACCESS_KEY}/{credential_scope}, "
+                f"SignedHeaders={sign_header}, Signature={signature}"
+            ),
+        }
+
+async def bench_legacy(iterations: int) -> float:
+    """Return signatures per second for the legacy signer."""
+    signer = LegacySigner()
+    body = BODY.decode()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        x_date = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        await signer.sign(body, x_date)
+    return iterations / (time.perf_counter() - start)
+
+def bench_cached(iterations: int) -> float:
+    """Return signatures per second for ``V4Signer``."""
+    signer = V4Signer(ACCESS_KEY, SECRET_KEY, REGION, SERVICE, HOST)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        signer.sign(BODY, ACTION, VERSION)
+    return iterations / (time.perf_counter() - start)
+
+def check_equivalence() -> None:
+    """Ensure both signers produce identical headers."""
+    x_date = "20240101T000000Z"
+    legacy = asyncio.run(LegacySigner().sign(BODY.decode(), x_date))
+    cached = V4Signer(ACCESS_KEY, SECRET_KEY, REGION, SERVICE, HOST).sign(BODY, ACTION, VERSION, x_date)
+    if legacy != cached:
+        raise AssertionError(f"Signer mismatch:\n{legacy}\n{cached}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    check_equivalence()
+    legacy = asyncio.run(bench_legacy(args.iterations))
+    cached = bench_cached(args.iterations)
+    print(f"legacy  : {legacy:12,.0f} signatures/s")
+    print(f"V4Signer: {cached:12,.0f} signatures/s")
+    print(f"speedup : {cached / legacy:12.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Throughput benchmark for streamed completion parsing.
+
+Builds a multi-megabyte recording shaped like a piapi chat completion stream
+(token deltas, keep-alive comments, an image link and ``[DONE]``), checks
+that ``SSEDecoder`` recovers every event regardless of how the bytes are
+split, and compares its throughput with the previous line-by-line parser.
+
+Usage:
+    python -m ai_models.benchmarks.sse [--size-mb N] [--read-size BYTES]
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+from typing import Callable, Iterator, List, Tuple
+
+from ..sse import SSEDecoder, IMAGE_URL_PATTERN, json_loads
+
+IMAGE_URL = "https://storage.theapi.app/image/0f3c9a4e-bench.png"
+
+def record_stream(size_mb: float, seed: int = 0) -> Tuple[bytes, int]:
+    """Build a synthetic completion stream.
+
+    Args:
+        size_mb: Approximate size of the recording in megabytes.
+        seed: Random seed for the token contents.
+
+    Returns:
+        The recorded bytes and the number of data events in it.
+    """
+    rng = random.Random(seed)
+    words = ["the", "panda", "plays", "in", "a", "bamboo", "forest", "，", "水彩", "风格", "\n"]
+    out = io.BytesIO()
+    events = 0
+    target = int(size_mb * 1024 * 1024)
+    while out.tell() < target:
+        if rng.random() < 0.02:
+            out.write(b": keep-alive\n\n")
+            continue
+        delta = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "gpt-4o-image",
+            "choices": [{"index": 0, "delta": {"content": rng.choice(words) + " "}}],
+        }
+        out.write(b"data: " + json.dumps(delta, ensure_ascii=False).encode() + b"\n\n")
+        events += 1
+    image = {"choices": [{"index": 0, "delta": {"content": f"![image]({IMAGE_URL})"}}]}
+    out.write(b"data: " + json.dumps(image).encode() + b"\n\n")
+    out.write(b"data: [DONE]\n\n")
+    return out.getvalue(), events + 1
+
+def reads(recording: bytes, read_size: int) -> Iterator[bytes]:
+    """Split a recording into network-sized reads."""
+    for offset in range(0, len(recording), read_size):
+        yield recording[offset:offset + read_size]
+
+def parse_legacy(recording: bytes, read_size: int) -> int:
+    """Line-by-line parsing as previously done in ``OpenAIModel``."""
+    count = 0
+    for line in io.BytesIO(recording):
+        if line.startswith(b"data: "):
+            data = line[6:].decode()
+            if data == "[DONE]":
+                break
+            try:
+                parsed = json.loads(data)
+                if parsed["choices"][0]["delta"]["content"]:
+                    count += 1
+            except Exception:
+                pass
+    return count
+
+def parse_decoder(recording: bytes, read_size: int, loads: Callable = json_loads) -> int:
+    """Incremental parsing with ``SSEDecoder``."""
+    count = 0
+    decoder = SSEDecoder()
+    for data in reads(recording, read_size):
+        for event in decoder.feed(data):
+            if event.data == "[DONE]":
+                return count
+            content = loads(event.data)["choices"][0]["delta"].get("content")
+            if content:
+                if "storage.theapi.app/image/" in content:
+                    IMAGE_URL_PATTERN.findall(content)
+                count += 1
+    return count
+
+def check_splits(recording: bytes, expected: int) -> None:
+    """Ensure arbitrary read boundaries and line endings yield identical events."""
+    head = recording[:64 * 1024]
+    head = head[:head.rfind(b"\n\n") + 2]
+    reference = [e.data for e in SSEDecoder().feed(head)]
+    for terminator in (b"\n", b"\r\n", b"\r"):
+        sample = head.replace(b"\n", terminator)
+        for read_size in (1, 2, 3, 7, 1000):
+            decoder = SSEDecoder()
+            events: List[str] = []
+            for data in reads(sample, read_size):
+                events.extend(e.data for e in decoder.feed(data))
+            events.extend(e.data for e in decoder.flush())
+            if events != reference:
+                raise AssertionError(f"Mismatch for terminator {terminator!r}, read size {read_size}")
+    if parse_decoder(recording, 16384) != expected:
+        raise AssertionError("Decoder lost events")
+
+def measure(name: str, parse: Callable[[], int], size: int, repeat: int) -> None:
+    """Run a parser and print its best throughput."""
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        events = parse()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<22} {size / best / 1e6:8.1f} MB/s {events / best:12,.0f} events/s")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--read-size", type=int, default=16384)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    recording, expected = record_stream(args.size_mb)
+    check_splits(recording, expected)
+    print(f"recording: {len(recording) / 1e6:.1f} MB, {expected:,} data events")
+
+    size = len(recording)
+    measure("legacy line parser", lambda: parse_legacy(recording, args.read_size), size, args.repeat)
+    measure("SSEDecoder + json", lambda: parse_decoder(recording, args.read_size, json.loads), size, args.repeat)
+    if json_loads is not json.loads:
+        measure("SSEDecoder + orjson", lambda: parse_decoder(recording, args.read_size), size, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Local stand-in servers for the piapi and Volcengine endpoints.
+
+``StandinServer`` serves the routes the models call, with configurable
+latency, jitter, error rate and stream shape, so benchmarks and manual tests
+run without network access or API keys:
+
+- ``POST /v1/chat/completions``: piapi chat completions, streamed as SSE
+  token deltas followed by an image link, or as one JSON body.
+- ``POST /?Action=CVProcess``: Volcengine synchronous image generation,
+  returning image URLs or, without ``return_url``, inline base64 images.
+- ``POST /?Action=CVSync2AsyncSubmitTask`` and ``CVSync2AsyncGetResult``:
+  the submit/poll variant.
+
+Usage:
+    python -m ai_models.benchmarks.standins [--port N] [--latency S] [--error-rate P]
+"""
+
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+IMAGE_URL = "https://storage.theapi.app/image/{id}.png"
+
+@dataclass
+class StandinConfig:
+    """Behaviour of the stand-in servers.
+
+    Attributes:
+        latency: Mean delay before a response starts, in seconds.
+        jitter: Maximum random deviation from ``latency``, in seconds.
+        error_rate: Probability of answering a request with an error.
+        throttle_rate: Probability of answering with 429 and ``Retry-After``.
+        retry_after: The ``Retry-After`` value of throttled responses.
+        chunks: Number of text deltas in a streamed completion.
+        chunk_size: Characters per text delta.
+        chunk_interval: Delay between streamed deltas, in seconds.
+        images: Number of images per generation.
+        render_time: Seconds an asynchronous Volcengine task stays pending.
+        image_bytes: Size of inline images, in bytes.
+        seed: Random seed of the latency and error draws.
+    """
+    latency: float = 0.05
+    jitter: float = 0.02
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    chunks: int = 20
+    chunk_size: int = 8
+    chunk_interval: float = 0.005
+    images: int = 1
+    render_time: float = 1.0
+    image_bytes: int = 256 * 1024
+    seed: int = 0
+
+class StandinServer:
+    """aiohttp application imitating both upstream providers."""
+
+    def __init__(self, config: Optional[StandinConfig] = None):
+        """Initialize the server.
+
+        Args:
+            config: Optional server behaviour.
+        """
+        self.config = config or StandinConfig()
+        self.requests: Dict[str, int] = {}
+        self._rng = random.Random(self.config.seed)
+        self._ids = itertools.count()
+        self._tasks: Dict[str, float] = {}
+        self._inline_image: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+
+    def app(self) -> web.Application:
+        """Build the aiohttp application."""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat_completions)
+        app.router.add_post("/", self._volcengine)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving.
+
+        Args:
+            host: The interface to bind.
+            port: The port to bind, or 0 for a free port.
+
+        Returns:
+            The base URL of the server.
+        """
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{bound}"
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _count(self, route: str) -> None:
+        self.requests[route] = self.requests.get(route, 0) + 1
+
+    async def _delay(self) -> None:
+        """Sleep for the configured latency and jitter."""
+        config = self.config
+        delay = config.latency + self._rng.uniform(-config.jitter, config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _injected_error(self) -> Optional[web.Response]:
+        """Draw whether the current request fails."""
+        draw = self._rng.random()
+        if draw < self.config.throttle_rate:
+            return web.json_response(
+                {"message": "Rate limit exceeded"},
+                status=429,
+                headers={"Retry-After": str(self.config.retry_after)},
+            )
+        if draw < self.config.throttle_rate + self.config.error_rate:
+            return web.json_response({"message": "Injected upstream error"}, status=500)
+        return None
+
+    def _image_urls(self) -> list:
+        return [IMAGE_URL.format(id=f"standin-{next(self._ids)}") for _ in range(self.config.images)]
+
+    def _images(self, return_url: bool) -> Dict[str, Any]:
+        """Build the image field of a Volcengine result."""
+        if return_url:
+            return {"image_urls": self._image_urls()}
+        if self._inline_image is None:
+            # A PNG signature followed by random bytes, encoded once.
+            data = b"\x89PNG\r\n\x1a\n" + self._rng.randbytes(max(self.config.image_bytes - 8, 0))
+            self._inline_image = base64.b64encode(data).decode()
+        return {"binary_data_base64": [self._inline_image] * self.config.images}
+
+    async def _chat_completions(self, request: web.Request) -> web.StreamResponse:
+        """Serve a piapi chat completion."""
+        self._count("chat_completions")
+        payload = await request.json()
+        await self._delay()
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        config = self.config
+        text = "x" * config.chunk_size
+        images = "".join(f"![image]({url})" for url in self._image_urls())
+        if not payload.get("stream"):
+            content = text * config.chunks + images
+            return web.json_response({"choices": [{"message": {"content": content}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        contents = [text] * config.chunks + ([images] if images else [])
+        for content in contents:
+            delta = {"choices": [{"index": 0, "delta": {"content": content}}]}
+            await response.write(b"data: " + json.dumps(delta).encode() + b"\n\n")
+            if config.chunk_interval > 0:
+                await asyncio.sleep(config.chunk_interval)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _volcengine(self, request: web.Request) -> web.Response:
+        """Serve a Volcengine visual API action."""
+        action = request.query.get("Action", "")
+        self._count(action)
+        payload = await request.json()
+
+        if action == "CVSync2AsyncGetResult":
+            ready_at = self._tasks.get(payload.get("task_id", ""))
+            if ready_at is None:
+                return web.json_response({"code": 50400, "message": "Task not found"}, status=404)
+            if time.monotonic() < ready_at:
+                return self._success({"status": "generating"})
+            del self._tasks[payload["task_id"]]
+            options = json.loads(payload.get("req_json") or "{}")
+            return self._success({"status": "done", **self._images(options.get("return_url", True))})
+
+        await self._delay()
+        error = self._injected_error()
+        if error is not None:
+            return error
+
+        if action == "CVProcess":
+            return self._success(self._images(payload.get("return_url", True)))
+        if action == "CVSync2AsyncSubmitTask":
+            task_id = f"task-{next(self._ids)}"
+            self._tasks[task_id] = time.monotonic() + self.config.render_time
+            return self._success({"task_id": task_id})
+        return web.json_response({"code": 50000, "message": f"Unknown action {action}"}, status=400)
+
+    def _success(self, data: Dict[str, Any]) -> web.Response:
+        return web.json_response({
+            "code": 10000,
+            "message": "Success",
+            "request_id": f"standin-{next(self._ids)}",
+            "data": data,
+        })
+
+def config_from_args(args: argparse.Namespace) -> StandinConfig:
+    """Build a config from arguments added by ``add_arguments``."""
+    return StandinConfig(**{f.name: getattr(args, f.name) for f in fields(StandinConfig)})
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add one option per ``StandinConfig`` field to a parser."""
+    for name, default in asdict(StandinConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+async def serve(config: StandinConfig, host: str, port: int) -> None:
+    """Run a stand-in server until cancelled."""
+    server = StandinServer(config)
+    url = await server.start(host, port)
+    print(f"stand-ins listening on {url}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(config_from_args(args), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Content-addressed cache for generation results.
+
+Responses are keyed on a canonical hash of the request, kept in a bounded
+in-memory LRU with a TTL, and optionally persisted to a directory so that
+they survive restarts. Wrap a model with ``CachedModel`` to opt in.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentCallback,
+    ErrorCode,
+    StopGeneration
+)
+from .serialization import model_request_key, response_to_dict, response_from_dict
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheConfig:
+    """Configuration for the generation cache.
+
+    Attributes:
+        max_entries: Maximum number of responses kept in memory.
+        ttl: Seconds a cached response stays valid.
+        disk_path: Optional directory for the persistent tier.
+        cache_unseeded: Whether to cache requests without a fixed seed.
+    """
+    max_entries: int = 1024
+    ttl: float = 3600.0
+    disk_path: Optional[str] = None
+    cache_unseeded: bool = False
+
+class GenerationCache:
+    """Two-tier (memory, disk) cache of successful generation responses."""
+
+    def __init__(self, config: Optional[CacheConfig] = None):
+        """Initialize the cache.
+
+        Args:
+            config: Optional cache configuration.
+        """
+        self.config = config or CacheConfig()
+        self._entries: "OrderedDict[str, Tuple[float, GenerationResponse]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.config.disk_path:
+            os.makedirs(self.config.disk_path, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_cacheable(self, request: GenerationRequest) -> bool:
+        """Check whether a request may be served from the cache.
+
+        Args:
+            request: The generation request.
+
+        Returns:
+            True if the request has a fixed seed or unseeded caching is enabled.
+        """
+        return request.seed is not None or self.config.cache_unseeded
+
+    async def get(self, key: str) -> Optional[GenerationResponse]:
+        """Look up a response.
+
+        Args:
+            key: The request key.
+
+        Returns:
+            A copy of the cached response, or None on a miss.
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._copy(response)
+            del self._entries[key]
+
+        if self.config.disk_path:
+            entry = await asyncio.to_thread(self._read_disk, key, now)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.hits += 1
+                return self._copy(entry[1])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: GenerationResponse) -> None:
+        """Store a successful response.
+
+        Args:
+            key: The request key.
+            response: The response to store.
+        """
+        if not response.success or not response.chunks:
+            return
+
+        expires_at = time.time() + self.config.ttl
+        response = replace(response, chunks=list(response.chunks))
+        self._remember(key, expires_at, response)
+        if self.config.disk_path:
+            await asyncio.to_thread(self._write_disk, key, expires_at, response)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries."""
+        self._entries.clear()
+
+    def _remember(self, key: str, expires_at: float, response: GenerationResponse) -> None:
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.config.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _copy(response: GenerationResponse) -> GenerationResponse:
+        metadata = dict(response.metadata or {})
+        metadata["cached"] = True
+        return replace(response, chunks=list(response.chunks), metadata=metadata)
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.config.disk_path, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, GenerationResponse]]:
+        path = self._disk_file(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Discarding unreadable cache entry %s: %s", path, e)
+            self._remove_file(path)
+            return None
+
+        if data["expires_at"] <= now:
+            self._remove_file(path)
+            return None
+        return data["expires_at"], response_from_dict(data["response"])
+
+    def _write_disk(self, key: str, expires_at: float, response: GenerationResponse) -> None:
+        path = self._disk_file(key)
+        try:
+            payload = json.dumps(
+                {"expires_at": expires_at, "response": response_to_dict(response)},
+                ensure_ascii=False,
+            )
+        except (TypeError, ValueError) as e:
+            logger.debug("Response for %s is not serializable, skipping disk tier: %s", key, e)
+            return
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove_file(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class CachedModel(ModelWrapper):
+    """Model wrapper that serves repeated requests from a ``GenerationCache``."""
+
+    def __init__(self, model: AIModel, cache: GenerationCache):
+        """Initialize the cached model.
+
+        Args:
+            model: The model to wrap.
+            cache: The cache to use. It may be shared between models.
+        """
+        super().__init__(model)
+        self.cache = cache
+
+    def cache_key(self, request: GenerationRequest) -> str:
+        """Compute the cache key of a request for the wrapped model.
+
+        Args:
+            request: The generation request.
+
+        Returns:
+            The cache key.
+        """
+        return model_request_key(self.model, request)
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content, using the cache when possible.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content. On a cache hit
+                the cached chunks are replayed through it.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        if not self.cache.is_cacheable(request):
+            return await self.model.generate(request, callback)
+
+        key = self.cache_key(request)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            if callback:
+                for i, chunk in enumerate(cached.chunks):
+                    try:
+                        await callback(chunk)
+                    except StopGeneration as e:
+                        return GenerationResponse(
+                            success=False,
+                            chunks=cached.chunks[:i + 1],
+                            error=str(e) or "Generation stopped by the callback",
+                            error_code=ErrorCode.CANCELLED.value
+                        )
+            return cached
+
+        response = await self.model.generate(request, callback)
+        try:
+            await self.cache.set(key, response)
+        except OSError as e:
+            logger.warning("Failed to persist cache entry %s: %s", key, e)
+        return response
@@ -0,0 +1,322 @@
+"""Unified model catalog and capability-based routing.
+
+``ModelCatalog`` collects the model definitions of all providers once and
+indexes them by ID, category and capability. ``CatalogRouter`` uses it to
+send any ``GenerationRequest`` to the provider serving ``request.model`` in
+constant time, so callers need a single entry point for every model.
+"""
+
+import logging
+from dataclasses import dataclass, field, replace
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .base import (
+    AIModel,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode,
+    ProviderError
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ModelInfo:
+    """Catalog entry of one model.
+
+    Attributes:
+        id: The model ID sent in requests.
+        provider: The provider serving the model.
+        name: Display name.
+        category: Display category, e.g. the provider brand.
+        max_images: Maximum number of images per generation.
+        streaming: Whether responses are streamed chunk by chunk.
+        img2img: Whether the model accepts an input image (``image_url``).
+        inpainting: Whether the model accepts a mask (``mask_url``).
+        details: The provider's full model definition.
+    """
+    id: str
+    provider: str
+    name: str = ""
+    category: str = ""
+    max_images: int = 1
+    streaming: bool = False
+    img2img: bool = False
+    inpainting: bool = False
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_definition(cls, model: AIModel, definition: Dict[str, Any]) -> "ModelInfo":
+        """Build an entry from a ``get_available_models`` definition.
+
+        Args:
+            model: The model instance providing the definition.
+            definition: The model definition.
+
+        Returns:
+            The catalog entry.
+        """
+        model_id = definition["id"]
+        return cls(
+            id=model_id,
+            provider=model.provider,
+            name=definition.get("name", model_id),
+            category=definition.get("category", ""),
+            max_images=int(definition.get("max_images", 1)),
+            streaming=bool(model.supports_streaming(model_id)),
+            img2img=bool(definition.get("img2img", False)),
+            inpainting=bool(definition.get("inpainting", False)),
+            details=definition,
+        )
+
+    def unsupported(self, request: GenerationRequest) -> Optional[str]:
+        """Check whether the model can serve a request.
+
+        Args:
+            request: The generation request.
+
+        Returns:
+            The reason the request is not supported, or None.
+        """
+        if request.image_url and not self.img2img:
+            return f"Model {self.id} does not accept input images"
+        if request.mask_url and not self.inpainting:
+            return f"Model {self.id} does not accept masks"
+        if request.n is not None and request.n > self.max_images:
+            return f"Model {self.id} generates at most {self.max_images} images"
+        return None
+
+class ModelCatalog:
+    """Index of models by ID, category and capability."""
+
+    def __init__(self, models: Iterable[ModelInfo]):
+        """Build the catalog.
+
+        Args:
+            models: The entries. If an ID appears twice, the first entry wins.
+        """
+        self._by_id: Dict[str, ModelInfo] = {}
+        self._by_category: Dict[str, List[ModelInfo]] = {}
+        self._by_provider: Dict[str, List[ModelInfo]] = {}
+        self._streaming: Set[str] = set()
+        self._img2img: Set[str] = set()
+        self._inpainting: Set[str] = set()
+
+        for info in models:
+            if info.id in self._by_id:
+                logger.warning(
+                    "Model %s of %s is shadowed by %s",
+                    info.id, info.provider, self._by_id[info.id].provider
+                )
+                continue
+            self._by_id[info.id] = info
+            self._by_category.setdefault(info.category, []).append(info)
+            self._by_provider.setdefault(info.provider, []).append(info)
+            if info.streaming:
+                self._streaming.add(info.id)
+            if info.img2img:
+                self._img2img.add(info.id)
+            if info.inpainting:
+                self._inpainting.add(info.id)
+
+    @classmethod
+    def from_models(cls, models: Iterable[AIModel]) -> "ModelCatalog":
+        """Build a catalog from the definitions of model instances.
+
+        Args:
+            models: The provider models.
+
+        Returns:
+            The catalog.
+        """
+        return cls(
+            ModelInfo.from_definition(model, definition)
+            for model in models
+            for definition in model.get_available_models()
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[ModelInfo]:
+        return iter(self._by_id.values())
+
+    def __contains__(self, model_id: str) -> bool:
+        return model_id in self._by_id
+
+    def get(self, model_id: str) -> Optional[ModelInfo]:
+        """Get the entry of a model.
+
+        Args:
+            model_id: The model ID.
+
+        Returns:
+            The entry, or None if the model is unknown.
+        """
+        return self._by_id.get(model_id)
+
+    def categories(self) -> List[str]:
+        """Get all categories, in catalog order."""
+        return list(self._by_category)
+
+    def providers(self) -> List[str]:
+        """Get all providers, in catalog order."""
+        return list(self._by_provider)
+
+    def find(
+        self,
+        category: Optional[str] = None,
+        provider: Optional[str] = None,
+        streaming: Optional[bool] = None,
+        img2img: Optional[bool] = None,
+        inpainting: Optional[bool] = None,
+        min_images: Optional[int] = None
+    ) -> List[ModelInfo]:
+        """Find the models matching all given criteria.
+
+        Args:
+            category: Optional category.
+            provider: Optional provider.
+            streaming: Optional streaming capability.
+            img2img: Optional input image capability.
+            inpainting: Optional mask capability.
+            min_images: Optional minimum of ``max_images``.
+
+        Returns:
+            The matching entries, in catalog order.
+        """
+        if category is not None:
+            candidates: Iterable[ModelInfo] = self._by_category.get(category, [])
+        elif provider is not None:
+            candidates = self._by_provider.get(provider, [])
+        else:
+            candidates = self._by_id.values()
+
+        def matches(index: Set[str], wanted: Optional[bool], model_id: str) -> bool:
+            return wanted is None or (model_id in index) == wanted
+
+        return [
+            info for info in candidates
+            if (provider is None or info.provider == provider)
+            and matches(self._streaming, streaming, info.id)
+            and matches(self._img2img, img2img, info.id)
+            and matches(self._inpainting, inpainting, info.id)
+            and (min_images is None or info.max_images >= min_images)
+        ]
+
+class CatalogRouter(AIModel):
+    """Model that routes each request to the provider serving its model."""
+
+    provider = "router"
+
+    def __init__(self, models: Iterable[AIModel], default_model: Optional[str] = None):
+        """Initialize the router.
+
+        Args:
+            models: One model per provider, possibly wrapped with middleware.
+            default_model: Model used for requests without ``model``. Defaults
+                to the first model of the catalog.
+
+        Raises:
+            ValueError: If no models are given or the default model is unknown.
+        """
+        self.models: Dict[str, AIModel] = {}
+        for model in models:
+            self.models.setdefault(model.provider, model)
+        self.catalog = ModelCatalog.from_models(self.models.values())
+        if not len(self.catalog):
+            raise ValueError("Catalog router needs at least one model")
+        self.default_model = default_model or next(iter(self.catalog)).id
+        if self.default_model not in self.catalog:
+            raise ValueError(f"Unknown default model: {self.default_model}")
+        # Model ID -> (entry, provider model), for constant-time routing.
+        self._routes: Dict[str, Tuple[ModelInfo, AIModel]] = {
+            info.id: (info, self.models[info.provider]) for info in self.catalog
+        }
+
+    def route(self, request: GenerationRequest) -> Tuple[ModelInfo, AIModel]:
+        """Find the catalog entry and provider model serving a request.
+
+        Args:
+            request: The generation request.
+
+        Returns:
+            The entry and the provider model.
+
+        Raises:
+            ProviderError: If the model is unknown or cannot serve the request.
+        """
+        route = self._routes.get(request.model or self.default_model)
+        if route is None:
+            raise ProviderError(f"Unknown model: {request.model}", code=ErrorCode.CLIENT_ERROR)
+        reason = route[0].unsupported(request)
+        if reason is not None:
+            raise ProviderError(reason, code=ErrorCode.CLIENT_ERROR)
+        return route
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content with the provider serving the request's model.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        try:
+            info, model = self.route(request)
+        except ProviderError as e:
+            return e.to_response()
+        if not request.model:
+            request = replace(request, model=info.id)
+        return await model.generate(request, callback)
+
+    async def _iter_content(self, request: GenerationRequest) -> AsyncIterator[ContentChunk]:
+        """Stream content from the provider serving the request's model.
+
+        Args:
+            request: The generation request parameters.
+
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the model is unknown or the generation fails.
+        """
+        info, model = self.route(request)
+        if not request.model:
+            request = replace(request, model=info.id)
+        async for chunk in model._iter_content(request):
+            yield chunk
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get the definitions of all models in the catalog.
+
+        Returns:
+            A list of dictionaries containing model information.
+        """
+        return [info.details for info in self.catalog]
+
+    def supports_streaming(self, model: str) -> bool:
+        """Check if a catalog model supports streaming.
+
+        Args:
+            model: The model identifier.
+
+        Returns:
+            True if the model is known and supports streaming.
+        """
+        info = self.catalog.get(model)
+        return info is not None and info.streaming
+
+    async def close(self) -> None:
+        """Close all provider models."""
+        for model in self.models.values():
+            await model.close()
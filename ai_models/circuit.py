@@ -0,0 +1,400 @@
+"""Circuit breakers and provider failover.
+
+A ``CircuitBreaker`` tracks the health of one provider model. After too many
+failures it opens and rejects calls immediately; after a cool-down it lets a
+few probe calls through (half-open) and closes again once they succeed.
+``FailoverModel`` walks a chain of provider models, skipping those whose
+breaker is open, so traffic moves away from a failing backend at once.
+Calls that were cancelled tell nothing about the backend and are not
+recorded, and requests the upstream rejected as invalid or unauthorized
+are not sent to the next target.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, FrozenSet, List, Optional, Tuple
+
+from .base import (
+    AIModel,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode,
+    StopGeneration
+)
+
+logger = logging.getLogger(__name__)
+
+class BreakerState(Enum):
+    """Enumeration of circuit breaker states."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+@dataclass
+class BreakerConfig:
+    """Configuration of a circuit breaker.
+
+    Attributes:
+        failure_threshold: Consecutive failures that open the circuit.
+        window: Number of recent calls used for the failure rate.
+        failure_rate: Failure rate within the window that opens the circuit.
+        min_calls: Calls needed in the window before the rate is considered.
+        reset_timeout: Seconds the circuit stays open before probing.
+        half_open_max_calls: Concurrent probe calls allowed while half-open.
+        failure_codes: Error codes that count as backend failures.
+    """
+    failure_threshold: int = 5
+    window: int = 20
+    failure_rate: float = 0.5
+    min_calls: int = 10
+    reset_timeout: float = 30.0
+    half_open_max_calls: int = 1
+    failure_codes: FrozenSet[str] = field(default_factory=lambda: frozenset({
+        ErrorCode.UPSTREAM_ERROR.value,
+        ErrorCode.NETWORK_ERROR.value,
+        ErrorCode.TIMEOUT.value,
+        ErrorCode.CONNECT_TIMEOUT.value,
+        ErrorCode.FIRST_BYTE_TIMEOUT.value,
+        ErrorCode.IDLE_TIMEOUT.value,
+    }))
+
+# Called with the breaker name, the old state and the new state.
+StateListener = Callable[[str, BreakerState, BreakerState], None]
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one backend."""
+
+    def __init__(
+        self,
+        name: str,
+        config: Optional[BreakerConfig] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the breaker.
+
+        Args:
+            name: Name used in logs and snapshots.
+            config: Optional breaker configuration.
+            clock: Monotonic clock.
+        """
+        self.name = name
+        self.config = config or BreakerConfig()
+        self.listeners: List[StateListener] = []
+        self._clock = clock
+        self._state = BreakerState.CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._outcomes: Deque[bool] = deque(maxlen=self.config.window)
+        self._probes = 0
+        self.rejected_total = 0
+
+    @property
+    def state(self) -> BreakerState:
+        """The current state, moving from open to half-open once the cool-down ends."""
+        if (
+            self._state is BreakerState.OPEN
+            and self._clock() - self._opened_at >= self.config.reset_timeout
+        ):
+            self._transition(BreakerState.HALF_OPEN)
+        return self._state
+
+    def allow(self) -> bool:
+        """Check whether a call may go through, reserving a probe slot if half-open.
+
+        Returns:
+            True if the call may proceed. Each allowed call must be followed
+            by ``record``.
+        """
+        state = self.state
+        if state is BreakerState.CLOSED:
+            return True
+        if state is BreakerState.HALF_OPEN and self._probes < self.config.half_open_max_calls:
+            self._probes += 1
+            return True
+        self.rejected_total += 1
+        return False
+
+    def is_failure(self, response: Optional[GenerationResponse]) -> bool:
+        """Check whether a response counts as a backend failure.
+
+        Args:
+            response: The response, or None if the call raised.
+
+        Returns:
+            True if the response indicates an unhealthy backend.
+        """
+        if response is None:
+            return True
+        return not response.success and response.error_code in self.config.failure_codes
+
+    def record(self, response: Optional[GenerationResponse]) -> None:
+        """Record the outcome of an allowed call.
+
+        Args:
+            response: The response, or None if the call raised.
+        """
+        failed = self.is_failure(response)
+        if self._state is BreakerState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            self._transition(BreakerState.OPEN if failed else BreakerState.CLOSED)
+            return
+
+        self._outcomes.append(failed)
+        if not failed:
+            self._consecutive_failures = 0
+            return
+
+        self._consecutive_failures += 1
+        failures = sum(self._outcomes)
+        if (
+            self._consecutive_failures >= self.config.failure_threshold
+            or (
+                len(self._outcomes) >= self.config.min_calls
+                and failures / len(self._outcomes) >= self.config.failure_rate
+            )
+        ):
+            self._transition(BreakerState.OPEN)
+
+    def release(self) -> None:
+        """End an allowed call without recording an outcome.
+
+        Use it instead of ``record`` for calls that were cancelled. A probe
+        slot held by the call is freed; the state does not change.
+        """
+        if self._state is BreakerState.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def _transition(self, state: BreakerState) -> None:
+        """Move to a new state and notify listeners."""
+        old = self._state
+        if old is state:
+            if state is BreakerState.OPEN:
+                self._opened_at = self._clock()
+            return
+
+        self._state = state
+        if state is BreakerState.OPEN:
+            self._opened_at = self._clock()
+        elif state is BreakerState.CLOSED:
+            self._consecutive_failures = 0
+            self._outcomes.clear()
+        if state is not BreakerState.HALF_OPEN:
+            self._probes = 0
+
+        log = logger.warning if state is BreakerState.OPEN else logger.info
+        log("Circuit %s: %s -> %s", self.name, old.value, state.value)
+        for listener in self.listeners:
+            try:
+                listener(self.name, old, state)
+            except Exception:
+                logger.exception("Circuit breaker listener failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the breaker state for monitoring.
+
+        Returns:
+            A dict describing the breaker.
+        """
+        state = self.state
+        return {
+            "state": state.value,
+            "consecutive_failures": self._consecutive_failures,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": sum(self._outcomes),
+            "rejected_total": self.rejected_total,
+            "open_for": self._clock() - self._opened_at if state is BreakerState.OPEN else 0.0,
+        }
+
+class BreakerRegistry:
+    """Registry of circuit breakers keyed by provider and model ID."""
+
+    def __init__(self, config: Optional[BreakerConfig] = None):
+        """Initialize the registry.
+
+        Args:
+            config: Optional configuration used for every breaker.
+        """
+        self.config = config or BreakerConfig()
+        self.listeners: List[StateListener] = []
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, provider: str, model_id: str) -> CircuitBreaker:
+        """Get the breaker for a provider model, creating it if needed.
+
+        Args:
+            provider: The provider name.
+            model_id: The model ID.
+
+        Returns:
+            The circuit breaker.
+        """
+        key = (provider, model_id)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(f"{provider}/{model_id}", self.config)
+            breaker.listeners = self.listeners
+            self._breakers[key] = breaker
+        return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the state of all breakers.
+
+        Returns:
+            A dict mapping ``provider/model`` to breaker state.
+        """
+        return {breaker.name: breaker.snapshot() for breaker in self._breakers.values()}
+
+# Error codes of responses that are returned without trying the next
+# target: another model would not fix the request, it was cancelled, or
+# the caller's deadline has passed and no target could finish in time.
+NO_FAILOVER_CODES = frozenset({
+    ErrorCode.CLIENT_ERROR.value,
+    ErrorCode.AUTH_ERROR.value,
+    ErrorCode.CANCELLED.value,
+    ErrorCode.DEADLINE_EXCEEDED.value,
+})
+
+@dataclass
+class FailoverTarget:
+    """One step of a failover chain.
+
+    Attributes:
+        model: The model instance serving this step.
+        model_id: The model ID sent in the request.
+    """
+    model: AIModel
+    model_id: str
+
+class FailoverModel(AIModel):
+    """Model that routes requests along a failover chain guarded by breakers.
+
+    The request's ``model`` is replaced by the ID of each target in turn.
+    """
+
+    provider = "failover"
+
+    def __init__(self, chain: List[FailoverTarget], breakers: Optional[BreakerRegistry] = None):
+        """Initialize the failover model.
+
+        Args:
+            chain: The targets, in order of preference.
+            breakers: Optional breaker registry, shared to make state inspectable.
+
+        Raises:
+            ValueError: If the chain is empty.
+        """
+        if not chain:
+            raise ValueError("Failover chain must not be empty")
+        self.chain = list(chain)
+        self.breakers = breakers or BreakerRegistry()
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content with the first healthy target that succeeds.
+
+        Once a target has delivered chunks to the callback, its response is
+        returned as is, because switching targets would duplicate content.
+        So are responses with one of the ``NO_FAILOVER_CODES``.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        delivered: List[ContentChunk] = []
+        tracked_callback: Optional[ContentCallback] = None
+        if callback:
+            async def tracked_callback(chunk: ContentChunk) -> None:
+                delivered.append(chunk)
+                await callback(chunk)
+
+        last: Optional[GenerationResponse] = None
+        for target in self.chain:
+            breaker = self.breakers.get(target.model.provider, target.model_id)
+            if not breaker.allow():
+                continue
+
+            try:
+                response = await target.model.generate(
+                    replace(request, model=target.model_id),
+                    tracked_callback
+                )
+            except (asyncio.CancelledError, StopGeneration):
+                breaker.release()
+                raise
+            except BaseException:
+                breaker.record(None)
+                raise
+            if response.error_code == ErrorCode.CANCELLED.value:
+                breaker.release()
+            else:
+                breaker.record(response)
+
+            if response.success or delivered or response.error_code in NO_FAILOVER_CODES:
+                return self._annotate(response, target)
+            logger.warning(
+                "Failover target %s failed (%s): %s",
+                breaker.name, response.error_code, response.error
+            )
+            last = response
+
+        if last is not None:
+            return last
+        return GenerationResponse(
+            success=False,
+            chunks=[],
+            error="All failover targets are unavailable",
+            error_code=ErrorCode.CIRCUIT_OPEN.value
+        )
+
+    @staticmethod
+    def _annotate(response: GenerationResponse, target: FailoverTarget) -> GenerationResponse:
+        """Record which target served the response."""
+        metadata = dict(response.metadata or {})
+        metadata["provider"] = target.model.provider
+        metadata["model"] = target.model_id
+        return replace(response, metadata=metadata)
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get the models of the chain.
+
+        Returns:
+            Model information for each target in the chain.
+        """
+        models: List[Dict[str, Any]] = []
+        for target in self.chain:
+            for info in target.model.get_available_models():
+                if info.get("id") == target.model_id:
+                    models.append(info)
+        return models
+
+    def supports_streaming(self, model: str) -> bool:
+        """Check if the first target of the chain supports streaming.
+
+        Args:
+            model: The model identifier (ignored; the chain decides).
+
+        Returns:
+            True if the preferred target supports streaming.
+        """
+        first = self.chain[0]
+        return first.model.supports_streaming(first.model_id)
+
+    async def close(self) -> None:
+        """Close all distinct models of the chain."""
+        closed = set()
+        for target in self.chain:
+            if id(target.model) not in closed:
+                closed.add(id(target.model))
+                await target.model.close()
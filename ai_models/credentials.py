@@ -0,0 +1,454 @@
+"""Pools of API credentials for one provider.
+
+A single API key caps a provider at that key's quota. A ``CredentialPool``
+holds several keys for the same provider. Each request is sent with the
+key that is least loaded or has the most quota left. Keys that are
+throttled (429) or rejected (401/403) cool down for a while before they
+are picked again. ``PooledModel`` serves requests with one provider model
+per key and moves a throttled or rejected request to the next key at once.
+Pass a pool instead of a ``ModelConfig`` to ``DefaultModelFactory``. Per-key
+usage is exported to a ``MetricsRegistry`` through ``CredentialPool.instrument``,
+labelled by ``key``.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, replace
+from enum import Enum
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, TYPE_CHECKING
+
+from .base import (
+    AIModel,
+    ModelConfig,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode
+)
+from .ratelimit import RateLimiterRegistry
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Credential:
+    """One API key of a pool.
+
+    Attributes:
+        api_key: The API key.
+        api_secret: Optional API secret, e.g. for Volcengine signing.
+        name: Optional name shown in metrics. Defaults to a hash of the key.
+        quota: Optional number of requests allowed per ``quota_period``.
+        quota_period: Length of a quota window, in seconds.
+        concurrency: Number of concurrent requests the key is sized for.
+            Load and utilization are measured against it.
+    """
+    api_key: str
+    api_secret: Optional[str] = None
+    name: Optional[str] = None
+    quota: Optional[int] = None
+    quota_period: float = 60.0
+    concurrency: int = 8
+
+    @property
+    def key_id(self) -> str:
+        """A non-secret identifier of the key."""
+        return self.name or RateLimiterRegistry.key_id(self.api_key)
+
+class PoolStrategy(str, Enum):
+    """How a pool picks the key of the next request."""
+    LEAST_LOADED = "least_loaded"
+    REMAINING_QUOTA = "remaining_quota"
+
+class CredentialState:
+    """Usage and health of one credential of a pool."""
+
+    def __init__(self, index: int, credential: Credential, clock: Callable[[], float]):
+        """Initialize the state.
+
+        Args:
+            index: Position of the credential in its pool.
+            credential: The credential.
+            clock: Monotonic clock of the pool.
+        """
+        self.index = index
+        self.credential = credential
+        self.in_flight = 0
+        self.requests_total = 0
+        self.failures_total = 0
+        self.throttled_total = 0
+        self.rejected_total = 0
+        self.cooling_until = 0.0
+        self.last_used = 0.0
+        self.strikes = 0
+        self._window_start = clock()
+        self._window_used = 0
+
+    @property
+    def load(self) -> float:
+        """In-flight requests relative to the key's concurrency."""
+        return self.in_flight / max(1, self.credential.concurrency)
+
+    def remaining(self, now: float) -> Optional[int]:
+        """Get the requests left in the current quota window.
+
+        Args:
+            now: The current clock time.
+
+        Returns:
+            The remaining requests, or None if the key has no quota.
+        """
+        quota = self.credential.quota
+        if quota is None:
+            return None
+        if now - self._window_start >= self.credential.quota_period:
+            self._window_start = now
+            self._window_used = 0
+        return max(0, quota - self._window_used)
+
+    def available_at(self, now: float) -> float:
+        """Get the clock time at which the key can be used again."""
+        at = self.cooling_until
+        if self.remaining(now) == 0:
+            at = max(at, self._window_start + self.credential.quota_period)
+        return at
+
+    def start(self, now: float) -> None:
+        """Count a request sent with the key."""
+        self.in_flight += 1
+        self.requests_total += 1
+        self._window_used += 1
+        self.last_used = now
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """Get the current usage of the key.
+
+        Args:
+            now: The current clock time.
+
+        Returns:
+            A dict of gauges and counters.
+        """
+        credential = self.credential
+        remaining = self.remaining(now)
+        snapshot: Dict[str, Any] = {
+            "in_flight": self.in_flight,
+            "concurrency": credential.concurrency,
+            "utilization": round(self.load, 3),
+            "requests_total": self.requests_total,
+            "failures_total": self.failures_total,
+            "throttled_total": self.throttled_total,
+            "rejected_total": self.rejected_total,
+            "cooldown_remaining": round(max(0.0, self.cooling_until - now), 3),
+        }
+        if remaining is not None:
+            snapshot["quota"] = credential.quota
+            snapshot["quota_remaining"] = remaining
+            snapshot["quota_utilization"] = round(1 - remaining / credential.quota, 3) if credential.quota else 1.0
+        return snapshot
+
+class CredentialPool:
+    """Credentials of one provider, with key selection and cool-downs."""
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        credentials: Sequence[Credential],
+        strategy: PoolStrategy = PoolStrategy.LEAST_LOADED,
+        cooldown: float = 5.0,
+        max_cooldown: float = 300.0,
+        rejected_cooldown: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        registry: Optional["MetricsRegistry"] = None
+    ):
+        """Initialize the pool.
+
+        Args:
+            config: Configuration shared by all keys, e.g. the endpoint.
+                Its own ``api_key`` and ``api_secret`` are ignored.
+            credentials: The keys of the pool.
+            strategy: How the key of each request is picked.
+            cooldown: Cool-down after a throttled request without
+                ``Retry-After``. It doubles with every further throttled
+                request until the key succeeds again.
+            max_cooldown: Upper bound of a throttling cool-down.
+            rejected_cooldown: Cool-down after the upstream rejects a key.
+            clock: Monotonic clock, replaceable for tests.
+            registry: Optional registry receiving the per-key metrics. See
+                ``instrument``.
+
+        Raises:
+            ValueError: If no credentials are given.
+        """
+        if not credentials:
+            raise ValueError("Credential pool needs at least one credential")
+        self.config = config
+        self.strategy = PoolStrategy(strategy)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.rejected_cooldown = rejected_cooldown
+        self._clock = clock
+        self.states = [CredentialState(i, c, clock) for i, c in enumerate(credentials)]
+        self.registry: Optional["MetricsRegistry"] = None
+        if registry is not None:
+            self.instrument(registry)
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def instrument(self, registry: "MetricsRegistry") -> None:
+        """Export the usage of every key to a metrics registry.
+
+        The gauges are labelled by ``key``, the key ID, and updated whenever
+        a request starts or ends. Quota gauges exist only for keys with a
+        quota; a new quota window shows once the key is used again.
+
+        Args:
+            registry: Registry receiving the per-key metrics.
+        """
+        self.registry = registry
+        self._in_flight_gauge = registry.gauge(
+            "credential_in_flight", "Requests in flight per API key.", ("key",)
+        )
+        self._utilization_gauge = registry.gauge(
+            "credential_utilization", "In-flight requests per API key relative to its concurrency.", ("key",)
+        )
+        self._quota_gauge = registry.gauge(
+            "credential_quota_remaining", "Requests left in the quota window per API key.", ("key",)
+        )
+        self._requests = registry.counter(
+            "credential_requests_total", "Requests sent per API key.", ("key",)
+        )
+        self._cooldowns = registry.counter(
+            "credential_cooldowns_total", "Cool-downs per API key and reason.", ("key", "reason")
+        )
+        now = self._clock()
+        for state in self.states:
+            self._publish(state, now)
+
+    def _publish(self, state: CredentialState, now: float) -> None:
+        """Update the gauges of a key, if the pool is instrumented."""
+        if self.registry is None:
+            return
+        key_id = state.credential.key_id
+        self._in_flight_gauge.set(state.in_flight, key_id)
+        self._utilization_gauge.set(round(state.load, 3), key_id)
+        remaining = state.remaining(now)
+        if remaining is not None:
+            self._quota_gauge.set(remaining, key_id)
+
+    def configs(self) -> List[ModelConfig]:
+        """Get the model configuration of each key, in pool order."""
+        return [
+            replace(self.config, api_key=state.credential.api_key, api_secret=state.credential.api_secret)
+            for state in self.states
+        ]
+
+    def acquire(self, exclude: Collection[CredentialState] = ()) -> Optional[CredentialState]:
+        """Pick the key of the next request and count the request.
+
+        Args:
+            exclude: Keys not to pick, e.g. those already tried.
+
+        Returns:
+            The picked key, or None if every key is excluded, cooling down or
+            out of quota. Pass it to ``release`` once the request is done.
+        """
+        now = self._clock()
+        best: Optional[CredentialState] = None
+        best_score: Optional[tuple] = None
+        for state in self.states:
+            if state in exclude or state.cooling_until > now:
+                continue
+            remaining = state.remaining(now)
+            if remaining == 0:
+                continue
+            headroom = float("inf") if remaining is None else remaining
+            if self.strategy is PoolStrategy.REMAINING_QUOTA:
+                score = (-headroom, state.load, state.last_used)
+            else:
+                score = (state.load, -headroom, state.last_used)
+            if best_score is None or score < best_score:
+                best, best_score = state, score
+        if best is not None:
+            best.start(now)
+            if self.registry is not None:
+                self._requests.inc(1, best.credential.key_id)
+            self._publish(best, now)
+        return best
+
+    def release(self, state: CredentialState, response: Optional[GenerationResponse]) -> None:
+        """Report the outcome of a request started with ``acquire``.
+
+        Args:
+            state: The key of the request.
+            response: The response, or None if the request was aborted.
+        """
+        state.in_flight -= 1
+        now = self._clock()
+        self._publish(state, now)
+        if response is None:
+            return
+        if response.success:
+            state.strikes = 0
+            return
+        state.failures_total += 1
+        if response.error_code == ErrorCode.RATE_LIMITED.value:
+            state.throttled_total += 1
+            state.strikes += 1
+            retry_after = (response.metadata or {}).get("retry_after")
+            if retry_after:
+                seconds = float(retry_after)
+            else:
+                seconds = min(self.max_cooldown, self.cooldown * 2 ** (state.strikes - 1))
+            self._cool(state, now + seconds, "throttled")
+        elif response.error_code == ErrorCode.AUTH_ERROR.value:
+            state.rejected_total += 1
+            self._cool(state, now + self.rejected_cooldown, "rejected")
+
+    def _cool(self, state: CredentialState, until: float, reason: str) -> None:
+        if until > state.cooling_until:
+            state.cooling_until = until
+            if self.registry is not None:
+                self._cooldowns.inc(1, state.credential.key_id, reason)
+            logger.warning(
+                "Credential %s was %s; cooling down for %.1fs",
+                state.credential.key_id, reason, until - self._clock()
+            )
+
+    def retry_after(self) -> float:
+        """Get the seconds until the first unavailable key can be used again."""
+        now = self._clock()
+        return max(0.0, min(state.available_at(now) for state in self.states) - now)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the usage of all keys.
+
+        Returns:
+            A dict mapping key IDs to usage gauges and counters.
+        """
+        now = self._clock()
+        return {state.credential.key_id: state.snapshot(now) for state in self.states}
+
+# Error codes after which a request is sent again with another key.
+SWITCH_CODES = frozenset({ErrorCode.RATE_LIMITED.value, ErrorCode.AUTH_ERROR.value})
+
+class PooledModel(AIModel):
+    """Model that spreads requests over the keys of a credential pool.
+
+    A request that is throttled or rejected is sent again right away with
+    the next available key, unless chunks were already delivered to the
+    callback. The response metadata records the ``credential`` used.
+
+    The per-key models should not retry throttled requests themselves: a
+    ``ResilientModel`` inside them would retry a 429 on the same key before
+    the pool can switch keys. Wrap the ``PooledModel`` instead, as
+    ``DefaultModelFactory`` does with its middleware.
+    """
+
+    def __init__(self, models: Sequence[AIModel], pool: CredentialPool):
+        """Initialize the pooled model.
+
+        Args:
+            models: One provider model per key, in pool order.
+            pool: The credential pool.
+
+        Raises:
+            ValueError: If the number of models does not match the pool.
+        """
+        if len(models) != len(pool):
+            raise ValueError("Pooled model needs exactly one model per credential")
+        self.models = list(models)
+        self.pool = pool
+
+    @property
+    def provider(self) -> str:
+        """The provider name of the pooled models."""
+        return self.models[0].provider
+
+    @property
+    def max_concurrency(self) -> int:
+        """The batch concurrency limit, scaled by the number of keys."""
+        return self.models[0].max_concurrency * len(self.models)
+
+    @property
+    def config(self) -> ModelConfig:
+        """The configuration shared by all keys."""
+        return self.pool.config
+
+    @property
+    def default_model(self) -> Optional[str]:
+        """The default model of the pooled models."""
+        return getattr(self.models[0], "default_model", None)
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content with the best available key.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        delivered: List[ContentChunk] = []
+        tracked_callback: Optional[ContentCallback] = None
+        if callback:
+            async def tracked_callback(chunk: ContentChunk) -> None:
+                delivered.append(chunk)
+                await callback(chunk)
+
+        tried: List[CredentialState] = []
+        last: Optional[GenerationResponse] = None
+        while True:
+            state = self.pool.acquire(tried)
+            if state is None:
+                return last if last is not None else self._unavailable()
+            tried.append(state)
+
+            response: Optional[GenerationResponse] = None
+            try:
+                response = await self.models[state.index].generate(request, tracked_callback)
+            finally:
+                self.pool.release(state, response)
+
+            if response.success or delivered or response.error_code not in SWITCH_CODES:
+                return self._annotate(response, state)
+            last = self._annotate(response, state)
+
+    def _unavailable(self) -> GenerationResponse:
+        """Build the response of a request for which no key is available."""
+        return GenerationResponse(
+            success=False,
+            chunks=[],
+            error="All credentials are cooling down or out of quota",
+            error_code=ErrorCode.RATE_LIMITED.value,
+            metadata={"retry_after": round(self.pool.retry_after(), 3)}
+        )
+
+    @staticmethod
+    def _annotate(response: GenerationResponse, state: CredentialState) -> GenerationResponse:
+        """Record which key served the response."""
+        metadata = dict(response.metadata or {})
+        metadata["credential"] = state.credential.key_id
+        return replace(response, metadata=metadata)
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get list of available models of the pooled models."""
+        return self.models[0].get_available_models()
+
+    def supports_streaming(self, model: str) -> bool:
+        """Check if the pooled models support streaming for a model."""
+        return self.models[0].supports_streaming(model)
+
+    async def close(self) -> None:
+        """Close the model of every key."""
+        for model in self.models:
+            await model.close()
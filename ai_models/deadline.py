@@ -0,0 +1,158 @@
+"""Per-phase timeouts and overall deadlines of upstream calls.
+
+A ``Deadline`` is created per generation from the timeouts and deadline of
+its ``GenerationRequest``. Providers wrap each wait on the upstream in a
+phase: waiting for the response headers, each read of the response body and
+any polling. A phase ends at its own timeout or at the overall deadline,
+whichever comes first, and a timeout raises a ``ProviderError`` whose code
+tells which limit was hit: ``first_byte_timeout``, ``idle_timeout`` or
+``deadline_exceeded``. Connect timeouts are enforced by ``aiohttp`` itself
+and classified as ``connect_timeout`` by ``transport.error_code_for``.
+
+Phases only cover waits on the upstream, never the time a consumer spends
+with a yielded chunk, so a slow consumer cannot trigger an idle timeout.
+Requests without any limits pay for no timers.
+"""
+
+import asyncio
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Optional, Protocol
+
+from .base import ErrorCode, GenerationRequest, ProviderError
+
+_NO_LIMIT = nullcontext()
+
+class _Readable(Protocol):
+    async def readany(self) -> bytes: ...
+
+class _Phase:
+    """Async context manager bounding one wait on the upstream."""
+
+    __slots__ = ("_timeout", "_code", "_seconds")
+
+    def __init__(self, when: float, code: ErrorCode, seconds: Optional[float]):
+        self._timeout = asyncio.timeout_at(when)
+        self._code = code
+        self._seconds = seconds
+
+    async def __aenter__(self) -> None:
+        await self._timeout.__aenter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> Optional[bool]:
+        try:
+            return await self._timeout.__aexit__(exc_type, exc, tb)
+        except TimeoutError:
+            if self._code is ErrorCode.DEADLINE_EXCEEDED:
+                message = "Generation deadline exceeded"
+            else:
+                message = f"Upstream {self._code.value.replace('_', ' ')} after {self._seconds}s"
+            raise ProviderError(message, code=self._code) from None
+
+class Deadline:
+    """Phase timeouts and overall deadline of one generation.
+
+    Attributes:
+        expires: Loop time of the overall deadline, or None.
+        connect_timeout: Optional seconds to acquire a connection.
+        first_byte_timeout: Optional seconds to wait for response headers.
+        idle_timeout: Optional seconds to wait for each body read.
+    """
+
+    __slots__ = ("expires", "connect_timeout", "first_byte_timeout", "idle_timeout", "_loop")
+
+    def __init__(self, request: Optional[GenerationRequest] = None):
+        """Start timing a generation.
+
+        Args:
+            request: Optional generation request carrying the limits.
+                Without it, nothing is bounded.
+        """
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.expires: Optional[float] = None
+        self.connect_timeout = self.first_byte_timeout = self.idle_timeout = None
+        if request is None:
+            return
+        self.connect_timeout = request.connect_timeout
+        self.first_byte_timeout = request.first_byte_timeout
+        self.idle_timeout = request.idle_timeout
+        remaining = request.remaining()
+        if remaining is not None:
+            self.expires = self._now() + remaining
+
+    def _now(self) -> float:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        return self._loop.time()
+
+    def check(self) -> None:
+        """Fail fast before starting work that cannot finish in time.
+
+        Raises:
+            ProviderError: If the deadline has already passed.
+        """
+        if self.expires is not None and self._now() >= self.expires:
+            raise ProviderError("Generation deadline exceeded", code=ErrorCode.DEADLINE_EXCEEDED)
+
+    def phase(self, seconds: Optional[float], code: ErrorCode) -> Any:
+        """Bound a wait by a phase timeout and the overall deadline.
+
+        Args:
+            seconds: Optional timeout of the phase.
+            code: Error code raised when the phase timeout is hit.
+
+        Returns:
+            An async context manager raising ``ProviderError`` on timeout.
+        """
+        if seconds is None and self.expires is None:
+            return _NO_LIMIT
+        when = None if seconds is None else self._now() + seconds
+        if self.expires is not None and (when is None or self.expires <= when):
+            return _Phase(self.expires, ErrorCode.DEADLINE_EXCEEDED, None)
+        return _Phase(when, code, seconds)
+
+    def first_byte(self) -> Any:
+        """Bound the wait for response headers."""
+        return self.phase(self.first_byte_timeout, ErrorCode.FIRST_BYTE_TIMEOUT)
+
+    def idle(self) -> Any:
+        """Bound one read of a response body."""
+        return self.phase(self.idle_timeout, ErrorCode.IDLE_TIMEOUT)
+
+    def total(self) -> Any:
+        """Bound a wait by the overall deadline only, e.g. polling."""
+        return self.phase(None, ErrorCode.DEADLINE_EXCEEDED)
+
+    @property
+    def bounds_reads(self) -> bool:
+        """Whether reads of a response body need a timer."""
+        return self.expires is not None or self.idle_timeout is not None
+
+    async def read(self, stream: _Readable) -> bytes:
+        """Read the next available data of a response body within the idle timeout.
+
+        Args:
+            stream: The response body stream.
+
+        Returns:
+            The data, or ``b""`` at the end of the body.
+        """
+        async with self.idle():
+            return await stream.readany()
+
+    async def iter_reads(self, stream: _Readable) -> AsyncIterator[bytes]:
+        """Iterate over the data of a response body, each read within the idle timeout.
+
+        Args:
+            stream: The response body stream.
+
+        Yields:
+            The data as it arrives.
+        """
+        while True:
+            data = await self.read(stream)
+            if not data:
+                return
+            yield data
+
+# Deadline of calls without limits.
+NO_DEADLINE = Deadline()
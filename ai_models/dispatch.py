@@ -0,0 +1,375 @@
+"""Decoupled delivery of content chunks to callbacks.
+
+Providers await the content callback inline, so a callback that waits on
+I/O stalls the upstream reader and can run into idle timeouts.
+``DispatchingModel`` hands each chunk to a bounded per-stream queue
+instead, and a separate task feeds the queue to the callback. When the
+callback falls behind and the queue is full, the overflow policy decides:
+
+- ``block``: the producer waits for room, pushing back on the upstream.
+- ``drop_oldest_text``: the oldest queued text chunk is dropped. Images are
+  never dropped.
+- ``coalesce``: a new text chunk is appended to the last queued text chunk.
+
+Callbacks that do CPU work still block the event loop. The
+``LoopLagMonitor`` measures how late the loop wakes up. Per-callback
+timings name the callbacks responsible. The monitor runs from the first
+stream until the dispatcher is closed, or until the last
+``DispatchingModel`` using it is closed.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Deque, Optional
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ContentType,
+    ErrorCode,
+    StopGeneration
+)
+from .metrics import MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+class OverflowPolicy(str, Enum):
+    """What a full dispatch queue does with the next chunk."""
+    BLOCK = "block"
+    DROP_OLDEST_TEXT = "drop_oldest_text"
+    COALESCE = "coalesce"
+
+@dataclass
+class DispatchConfig:
+    """Configuration of callback dispatch.
+
+    Attributes:
+        queue_size: Maximum number of chunks queued per stream.
+        overflow: What to do when a stream's queue is full.
+        slow_callback: Seconds per chunk above which a callback is
+            reported as slow.
+        lag_interval: Optional interval of event loop lag samples, in
+            seconds. None disables the lag monitor.
+        lag_threshold: Loop lag above which a warning is logged, in seconds.
+    """
+    queue_size: int = 64
+    overflow: OverflowPolicy = OverflowPolicy.BLOCK
+    slow_callback: float = 0.05
+    lag_interval: Optional[float] = 0.5
+    lag_threshold: float = 0.1
+
+def callback_name(callback: ContentCallback) -> str:
+    """Get a readable name of a callback for logs and metric labels."""
+    target = getattr(callback, "func", callback)  # functools.partial
+    name = getattr(target, "__qualname__", None) or type(target).__qualname__
+    module = getattr(target, "__module__", None)
+    return f"{module}.{name}" if module else name
+
+class LoopLagMonitor:
+    """Samples how late the event loop runs a timer."""
+
+    def __init__(self, interval: float, threshold: float, registry: MetricsRegistry):
+        """Initialize the monitor.
+
+        Args:
+            interval: Seconds between samples.
+            threshold: Lag above which a warning is logged, in seconds.
+            registry: Registry receiving the lag metrics.
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.lag = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._gauge = registry.gauge(
+            "event_loop_lag_seconds", "Delay of the last event loop lag sample."
+        )
+        self._histogram = registry.histogram(
+            "event_loop_lag_sample_seconds", "Event loop lag samples."
+        )
+
+    def start(self) -> None:
+        """Start sampling on the running loop, if not already started."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - start - self.interval)
+            self._gauge.set(self.lag)
+            self._histogram.observe(self.lag)
+            if self.lag > self.threshold:
+                logger.warning("Event loop lagged %.3fs behind", self.lag)
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+class DispatchStream:
+    """Bounded queue between the producer of one stream and its callback.
+
+    Use it as an async context manager. ``put`` is passed to the producer
+    as its callback. Leaving the context waits until every queued chunk has
+    been delivered, unless the context is left by cancellation.
+    """
+
+    def __init__(self, dispatcher: "CallbackDispatcher", callback: ContentCallback):
+        """Initialize the stream.
+
+        Args:
+            dispatcher: The dispatcher owning the stream.
+            callback: The callback receiving the chunks.
+        """
+        self.dispatcher = dispatcher
+        self.callback = callback
+        self.name = callback_name(callback)
+        self.delivered = 0
+        self.callback_seconds = 0.0
+        self.max_callback_seconds = 0.0
+        self.stopped: Optional[StopGeneration] = None
+        self._queue: Deque[ContentChunk] = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._closed = False
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def __aenter__(self) -> "DispatchStream":
+        self._task = asyncio.create_task(self._consume())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and not issubclass(exc_type, Exception):
+            self._task.cancel()
+        else:
+            self._closed = True
+            self._ready.set()
+            await self._task
+        self.dispatcher._finished(self)
+
+    async def put(self, chunk: ContentChunk) -> None:
+        """Queue a chunk for the callback.
+
+        Args:
+            chunk: The chunk.
+
+        Raises:
+            StopGeneration: If the callback stopped the generation.
+        """
+        if self.stopped is not None:
+            raise self.stopped
+        config = self.dispatcher.config
+        while len(self._queue) >= config.queue_size:
+            if config.overflow is OverflowPolicy.COALESCE and chunk.type is ContentType.TEXT:
+                tail = self._queue[-1]
+                if tail.type is ContentType.TEXT:
+                    self._queue[-1] = ContentChunk(
+                        type=ContentType.TEXT,
+                        content=tail.content + chunk.content,
+                        metadata=tail.metadata
+                    )
+                    self.dispatcher._overflow(self, "coalesced")
+                    return
+            elif config.overflow is OverflowPolicy.DROP_OLDEST_TEXT and self._drop_oldest_text():
+                self.dispatcher._overflow(self, "dropped")
+                break
+            self.dispatcher._overflow(self, "blocked")
+            self._space.clear()
+            await self._space.wait()
+            if self.stopped is not None:
+                raise self.stopped
+        self._queue.append(chunk)
+        self.dispatcher._depth.inc(1, self.name)
+        self._ready.set()
+
+    def _drop_oldest_text(self) -> bool:
+        for i, queued in enumerate(self._queue):
+            if queued.type is ContentType.TEXT:
+                del self._queue[i]
+                self.dispatcher._depth.dec(1, self.name)
+                return True
+        return False
+
+    async def _consume(self) -> None:
+        """Deliver queued chunks to the callback, in order."""
+        dispatcher = self.dispatcher
+        try:
+            while True:
+                while not self._queue:
+                    if self._closed:
+                        return
+                    self._ready.clear()
+                    await self._ready.wait()
+                chunk = self._queue.popleft()
+                dispatcher._depth.dec(1, self.name)
+                self._space.set()
+
+                start = time.perf_counter()
+                try:
+                    await self.callback(chunk)
+                except StopGeneration as e:
+                    self.stopped = e
+                    return
+                except Exception:
+                    logger.exception("Error in content callback")
+                dispatcher._delivered(self, time.perf_counter() - start)
+        finally:
+            dispatcher._depth.dec(len(self._queue), self.name)
+            self._queue.clear()
+            # Wake a producer blocked on a full queue.
+            self._space.set()
+
+class CallbackDispatcher:
+    """Creates dispatch streams and records their metrics."""
+
+    def __init__(self, config: Optional[DispatchConfig] = None, registry: Optional[MetricsRegistry] = None):
+        """Initialize the dispatcher.
+
+        Args:
+            config: Optional dispatch configuration.
+            registry: Optional registry receiving the dispatch metrics.
+        """
+        self.config = config or DispatchConfig()
+        self.registry = registry or MetricsRegistry()
+        self._depth = self.registry.gauge(
+            "dispatch_queue_depth", "Chunks waiting for their callback.", ("callback",)
+        )
+        self._callback_seconds = self.registry.histogram(
+            "dispatch_callback_seconds", "Time a callback took per chunk.", ("callback",)
+        )
+        self._overflows = self.registry.counter(
+            "dispatch_overflow_total", "Chunks that found their queue full, by action.",
+            ("callback", "action"),
+        )
+        self._slow = self.registry.counter(
+            "dispatch_slow_chunks_total", "Chunks whose callback exceeded the slow threshold.",
+            ("callback",),
+        )
+        self.monitor: Optional[LoopLagMonitor] = None
+        # Number of dispatching models using the dispatcher.
+        self._users = 0
+        if self.config.lag_interval is not None:
+            self.monitor = LoopLagMonitor(self.config.lag_interval, self.config.lag_threshold, self.registry)
+
+    def stream(self, callback: ContentCallback) -> DispatchStream:
+        """Create the dispatch stream of one generation.
+
+        Args:
+            callback: The callback receiving the chunks.
+
+        Returns:
+            The stream, to be entered with ``async with``.
+        """
+        if self.monitor is not None:
+            self.monitor.start()
+        return DispatchStream(self, callback)
+
+    def _delivered(self, stream: DispatchStream, seconds: float) -> None:
+        stream.delivered += 1
+        stream.callback_seconds += seconds
+        stream.max_callback_seconds = max(stream.max_callback_seconds, seconds)
+        self._callback_seconds.observe(seconds, stream.name)
+        if seconds > self.config.slow_callback:
+            self._slow.inc(1, stream.name)
+
+    def _overflow(self, stream: DispatchStream, action: str) -> None:
+        self._overflows.inc(1, stream.name, action)
+
+    def _finished(self, stream: DispatchStream) -> None:
+        if stream.delivered and stream.max_callback_seconds > self.config.slow_callback:
+            logger.warning(
+                "Slow content callback %s: %.1fms per chunk on average, %.1fms at most, over %d chunks",
+                stream.name,
+                stream.callback_seconds / stream.delivered * 1000,
+                stream.max_callback_seconds * 1000,
+                stream.delivered,
+            )
+
+    def attach(self) -> None:
+        """Register a user of the dispatcher. Call ``detach`` when done."""
+        self._users += 1
+
+    async def detach(self) -> None:
+        """Unregister a user; the last one stops the loop lag monitor."""
+        self._users = max(0, self._users - 1)
+        if self._users == 0:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stop the loop lag monitor."""
+        if self.monitor is not None:
+            await self.monitor.stop()
+
+class DispatchingModel(ModelWrapper):
+    """Model wrapper that delivers chunks to the callback through a dispatcher.
+
+    The returned response waits until the callback has received every
+    chunk that was not dropped.
+    """
+
+    def __init__(self, model: AIModel, dispatcher: CallbackDispatcher):
+        """Initialize the dispatching model.
+
+        Args:
+            model: The model to wrap.
+            dispatcher: The dispatcher, possibly shared.
+        """
+        super().__init__(model)
+        self.dispatcher = dispatcher
+        self._attached = True
+        dispatcher.attach()
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content without waiting on the callback per chunk.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        if callback is None:
+            return await self.model.generate(request)
+
+        async with self.dispatcher.stream(callback) as stream:
+            response = await self.model.generate(request, stream.put)
+        if stream.stopped is not None and response.success:
+            # The callback stopped after the upstream had finished.
+            return GenerationResponse(
+                success=False,
+                chunks=response.chunks,
+                error=str(stream.stopped) or "Generation stopped by the callback",
+                error_code=ErrorCode.CANCELLED.value,
+                request_id=response.request_id,
+                metadata=response.metadata
+            )
+        return response
+
+    async def close(self) -> None:
+        """Close the wrapped model and release the dispatcher."""
+        try:
+            await super().close()
+        finally:
+            if self._attached:
+                self._attached = False
+                await self.dispatcher.detach()
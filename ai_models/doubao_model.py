@@ -1,241 +1,291 @@
 """Doubao model implementation."""
 
+import asyncio
 import json
 import logging
-import hashlib
-import hmac
-import urllib.parse
-import datetime
-from typing import Optional, List, Dict, Any
-import aiohttp
-from base import (
+import os
+from contextlib import aclosing
+from pathlib import Path
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
+from urllib.parse import urlsplit
+from .base import (
     AIModel,
     ModelConfig,
     GenerationRequest,
     GenerationResponse,
     ContentChunk,
     ContentType,
-    ContentCallback
+    ContentCallback,
+    ErrorCode,
+    ProviderError,
+    StopGeneration
 )
+from .b64stream import DecodedImage, IMAGE_FIELD, InlineImageDecoder
+from .deadline import NO_DEADLINE, Deadline
+from .metrics import NULL_TRACE, PHASE_BUILD, PHASE_FIRST_BYTE, RequestTrace
+from .polling import TaskPoller, default_poller
+from .signing import V4Signer
+from .transport import HTTPTransport, error_code_for, provider_error_from, request_timeout
 
 logger = logging.getLogger(__name__)
 
-# Doubao model definitions
-DOUBAO_MODELS = [
-    {
-        "id": "high_aes_general_v21_L",
-        "name": "通用2.1-文生图",
-        "description": "最新的通用文生图模型，支持多种风格和场景",
-        "max_images": 4,
-        "category": "豆包",
-        "demo": {
-            "prompt": "一只可爱的熊猫在竹林中玩耍，水彩风格",
-            "images": [
-                "https://picsum.photos/seed/doubao1/512/512",
-                "https://picsum.photos/seed/doubao2/512/512",
-                "https://picsum.photos/seed/doubao3/512/512",
-                "https://picsum.photos/seed/doubao4/512/512",
-            ],
+# Statuses of asynchronous tasks that are still being processed.
+PENDING_TASK_STATUSES = frozenset({"in_queue", "generating"})
+
+# Seeds accepted by the upstream are non-negative 32-bit integers.
+SEED_RANGE = 2 ** 32
+
+_doubao_models: Optional[List[Dict[str, Any]]] = None
+
+def _build_doubao_models() -> List[Dict[str, Any]]:
+    """Build the Doubao model definitions."""
+    return [
+        {
+            "id": "high_aes_general_v21_L",
+            "name": "通用2.1-文生图",
+            "description": "最新的通用文生图模型，支持多种风格和场景",
+            "max_images": 4,
+            "category": "豆包",
+            "demo": {
+                "prompt": "一只可爱的熊猫在竹林中玩耍，水彩风格",
+                "images": [
+                    "https://picsum.photos/seed/doubao1/512/512",
+                    "https://picsum.photos/seed/doubao2/512/512",
+                    "https://picsum.photos/seed/doubao3/512/512",
+                    "https://picsum.photos/seed/doubao4/512/512",
+                ],
+            },
         },
-    },
-    {
-        "id": "high_aes_general_v20_L",
-        "name": "通用2.0Pro-文生图",
-        "description": "专业版通用文生图模型，提供更高质量的输出",
-        "max_images": 4,
-        "category": "豆包",
-        "demo": {
-            "prompt": "一片樱花林，水彩风格，柔和的粉色和白色",
-            "images": [
-                "https://picsum.photos/seed/doubao-pro1/512/512",
-                "https://picsum.photos/seed/doubao-pro2/512/512",
-                "https://picsum.photos/seed/doubao-pro3/512/512",
-                "https://picsum.photos/seed/doubao-pro4/512/512",
-            ],
+        {
+            "id": "high_aes_general_v20_L",
+            "name": "通用2.0Pro-文生图",
+            "description": "专业版通用文生图模型，提供更高质量的输出",
+            "max_images": 4,
+            "category": "豆包",
+            "demo": {
+                "prompt": "一片樱花林，水彩风格，柔和的粉色和白色",
+                "images": [
+                    "https://picsum.photos/seed/doubao-pro1/512/512",
+                    "https://picsum.photos/seed/doubao-pro2/512/512",
+                    "https://picsum.photos/seed/doubao-pro3/512/512",
+                    "https://picsum.photos/seed/doubao-pro4/512/512",
+                ],
+            },
         },
-    },
-    {
-        "id": "high_aes_general_v20",
-        "name": "通用2.0-文生图",
-        "description": "标准版通用文生图模型，适合日常使用",
-        "max_images": 4,
-        "category": "豆包",
-        "demo": {
-            "prompt": "一幅山水画，国画风格，云雾缭绕",
-            "images": [
-                "https://picsum.photos/seed/doubao-std1/512/512",
-                "https://picsum.photos/seed/doubao-std2/512/512",
-                "https://picsum.photos/seed/doubao-std3/512/512",
-                "https://picsum.photos/seed/doubao-std4/512/512",
-            ],
+        {
+            "id": "high_aes_general_v20",
+            "name": "通用2.0-文生图",
+            "description": "标准版通用文生图模型，适合日常使用",
+            "max_images": 4,
+            "category": "豆包",
+            "demo": {
+                "prompt": "一幅山水画，国画风格，云雾缭绕",
+                "images": [
+                    "https://picsum.photos/seed/doubao-std1/512/512",
+                    "https://picsum.photos/seed/doubao-std2/512/512",
+                    "https://picsum.photos/seed/doubao-std3/512/512",
+                    "https://picsum.photos/seed/doubao-std4/512/512",
+                ],
+            },
         },
-    },
-    {
-        "id": "high_aes_general_v14",
-        "name": "通用1.4-文生图",
-        "description": "经典版通用文生图模型，稳定可靠",
-        "max_images": 4,
-        "category": "豆包",
-        "demo": {
-            "prompt": "一只可爱的猫咪，写实风格",
-            "images": [
-                "https://picsum.photos/seed/doubao-classic1/512/512",
-                "https://picsum.photos/seed/doubao-classic2/512/512",
-                "https://picsum.photos/seed/doubao-classic3/512/512",
-                "https://picsum.photos/seed/doubao-classic4/512/512",
-            ],
+        {
+            "id": "high_aes_general_v14",
+            "name": "通用1.4-文生图",
+            "description": "经典版通用文生图模型，稳定可靠",
+            "max_images": 4,
+            "category": "豆包",
+            "demo": {
+                "prompt": "一只可爱的猫咪，写实风格",
+                "images": [
+                    "https://picsum.photos/seed/doubao-classic1/512/512",
+                    "https://picsum.photos/seed/doubao-classic2/512/512",
+                    "https://picsum.photos/seed/doubao-classic3/512/512",
+                    "https://picsum.photos/seed/doubao-classic4/512/512",
+                ],
+            },
         },
-    },
-    {
-        "id": "t2i_xl_sft",
-        "name": "通用XL pro-文生图",
-        "description": "超大模型，提供最高质量的图像生成",
-        "max_images": 4,
-        "category": "豆包",
-        "demo": {
-            "prompt": "一幅未来城市，赛博朋克风格",
-            "images": [
-                "https://picsum.photos/seed/doubao-xl1/512/512",
-                "https://picsum.photos/seed/doubao-xl2/512/512",
-                "https://picsum.photos/seed/doubao-xl3/512/512",
-                "https://picsum.photos/seed/doubao-xl4/512/512",
-            ],
+        {
+            "id": "t2i_xl_sft",
+            "name": "通用XL pro-文生图",
+            "description": "超大模型，提供最高质量的图像生成",
+            "max_images": 4,
+            "category": "豆包",
+            "demo": {
+                "prompt": "一幅未来城市，赛博朋克风格",
+                "images": [
+                    "https://picsum.photos/seed/doubao-xl1/512/512",
+                    "https://picsum.photos/seed/doubao-xl2/512/512",
+                    "https://picsum.photos/seed/doubao-xl3/512/512",
+                    "https://picsum.photos/seed/doubao-xl4/512/512",
+                ],
+            },
         },
-    },
-]
+    ]
+
+def doubao_models() -> List[Dict[str, Any]]:
+    """Get the Doubao model definitions, building them on first use.
+
+    Returns:
+        A list of dictionaries containing model information.
+    """
+    global _doubao_models
+    if _doubao_models is None:
+        _doubao_models = _build_doubao_models()
+    return _doubao_models
+
+def derive_seed(seed: Optional[int], index: int) -> Optional[int]:
+    """Derive the seed of one call of a multi-image fan-out.
+
+    Args:
+        seed: Optional seed of the request.
+        index: Index of the call, starting at 0.
+
+    Returns:
+        A distinct seed per call, or None to let the upstream pick random
+        seeds, which are distinct as well.
+    """
+    if seed is None:
+        return None
+    return (seed + index) % SEED_RANGE
+
+def __getattr__(name: str) -> Any:
+    # ``DOUBAO_MODELS`` is kept as a lazily built module attribute.
+    if name == "DOUBAO_MODELS":
+        return doubao_models()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class DoubaoModel(AIModel):
     """Doubao model implementation."""
+
+    provider = "doubao"
     
-    def __init__(self, config: ModelConfig):
+    def __init__(
+        self,
+        config: ModelConfig,
+        transport: Optional[HTTPTransport] = None,
+        async_mode: bool = False,
+        poller: Optional[TaskPoller] = None,
+        image_dir: Optional[str] = None
+    ):
         """Initialize Doubao model.
         
         Args:
             config: The model configuration.
+            transport: Optional shared HTTP transport. When omitted the model
+                owns a private transport that is closed by ``close()``.
+            async_mode: If True, submit generation tasks and poll for their
+                results instead of holding a connection during the render.
+            poller: Optional task poller for async mode. Defaults to the
+                poller shared by all models on the event loop.
+            image_dir: Optional directory for inline images. When set, images
+                are returned inline as base64 data instead of as URLs, and
+                decoded into files there while the response is read. Image
+                chunks then carry ``file://`` URLs of the decoded files.
         """
         self.config = config
-        self.endpoint = "https://visual.volcengineapi.com"
+        self.endpoint = config.endpoint or "https://visual.volcengineapi.com"
+        self.async_mode = async_mode
+        self._poller = poller
+        self.image_dir = image_dir
+        if image_dir is not None:
+            os.makedirs(image_dir, exist_ok=True)
         self.default_model = config.default_model or "high_aes_general_v21_L"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self._owns_transport = transport is None
+        self._transport = transport or HTTPTransport()
+        self._signer = V4Signer(
+            access_key=config.api_key,
+            secret_key=config.api_secret or "",
+            region=config.region or "",
+            service=config.service or "",
+            # The signed Host header must match the one aiohttp sends.
+            host=config.host or urlsplit(self.endpoint).netloc,
+        )
 
     async def __aenter__(self) -> "DoubaoModel":
-        """Create aiohttp session when entering context."""
-        self._session = aiohttp.ClientSession()
+        """Enter the model context."""
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Close aiohttp session when exiting context."""
-        if self._session:
-            await self._session.close()
-
-    def _sign_string_encoder(self, source: str) -> str:
-        """Encode string for signing."""
-        return urllib.parse.quote(source, safe="").replace("*", "%2A")
-
-    async def _hash_sha256(self, content: str) -> str:
-        """Calculate SHA-256 hash of content."""
-        return hashlib.sha256(content.encode()).hexdigest()
+        """Release the HTTP transport when exiting context."""
+        await self.close()
 
-    async def _hmac_sha256(self, key: bytes, content: str) -> bytes:
-        """Calculate HMAC-SHA256 of content."""
-        return hmac.new(key, content.encode(), hashlib.sha256).digest()
+    async def close(self) -> None:
+        """Close the HTTP transport if it is owned by this model."""
+        if self._owns_transport:
+            await self._transport.close()
 
-    async def _gen_signing_secret_key_v4(
+    async def _make_request(
         self,
-        secret_key: str,
-        date: str,
-        region: str,
-        service: str,
-    ) -> bytes:
-        """Generate signing secret key for AWS V4 signature."""
-        k_date = await self._hmac_sha256(secret_key.encode(), date)
-        k_region = await self._hmac_sha256(k_date, region)
-        k_service = await self._hmac_sha256(k_region, service)
-        return await self._hmac_sha256(k_service, "request")
-
-    async def _make_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Make request to Doubao API."""
-        method = "POST"
-        action = "CVProcess"
-        version = "2022-08-31"
-        url = f"{self.endpoint}?Action={action}&Version={version}"
+        payload: Dict[str, Any],
+        action: str = "CVProcess",
+        version: str = "2022-08-31",
+        trace: RequestTrace = NULL_TRACE,
+        deadline: Deadline = NO_DEADLINE,
+        decoder: Optional[InlineImageDecoder] = None
+    ) -> Dict[str, Any]:
+        """Make request to Doubao API.
 
-        body = json.dumps(payload)
-        x_content_sha256 = await self._hash_sha256(body)
-        x_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        short_x_date = x_date[:8]
-        credential_scope = f"{short_x_date}/{self.config.region}/{self.config.service}/request"
-        sign_header = "host;x-date;x-content-sha256;content-type"
-        content_type = "application/json"
-
-        query_string = "&".join([
-            f"{self._sign_string_encoder(k)}={self._sign_string_encoder(v)}"
-            for k, v in [("Action", action), ("Version", version)]
-        ])
-
-        canonical_string = "\n".join([
-            method,
-            "/",
-            query_string,
-            f"host:{self.config.host}",
-            f"x-date:{x_date}",
-            f"x-content-sha256:{x_content_sha256}",
-            f"content-type:{content_type}",
-            "",
-            sign_header,
-            x_content_sha256,
-        ])
-
-        hash_canonical_string = await self._hash_sha256(canonical_string)
-        string_to_sign = "\n".join([
-            "HMAC-SHA256",
-            x_date,
-            credential_scope,
-            hash_canonical_string,
-        ])
-
-        sign_key = await self._gen_signing_secret_key_v4(
-            self.config.api_secret,
-            short_x_date,
-            self.config.region,
-            self.config.service,
-        )
+        With a decoder, the response is parsed while it is read and its
+        inline images are decoded into files, in a thread so the file
+        writes do not block the event loop; see ``ai_models.b64stream``.
+        """
+        url = f"{self.endpoint}?Action={action}&Version={version}"
+        feeding: Optional["asyncio.Task[None]"] = None
 
-        signature = hmac.new(sign_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        with trace.span(PHASE_BUILD):
+            body = json.dumps(payload).encode()
+            headers = self._signer.sign(body, action, version)
 
         try:
-            if not self._session:
-                self._session = aiohttp.ClientSession()
-
-            async with self._session.post(
-                url,
-                headers={
-                    "Host": self.config.host,
-                    "X-Date": x_date,
-                    "X-Content-Sha256": x_content_sha256,
-                    "Content-Type": content_type,
-                    "Authorization": (
-                        f"HMAC-SHA256 Credential={self.config.api_key}/{credential_scope}, "
-                        f"SignedHeaders={sign_header}, Signature={signature}"
-                    ),
-                },
-                data=body,
-            ) as response:
-                if not response.ok:
-                    error_data = await response.json()
-                    raise Exception(
-                        error_data.get("message") or 
-                        f"Doubao API error: {response.status} {response.status_text}"
-                    )
-
-                result = await response.json()
-                if result.get("error"):
-                    raise Exception(result["error"])
-
-                return result
+            session = await self._transport.session_for(self.endpoint)
 
-        except Exception as e:
-            logger.error("Doubao API request failed: %s", str(e))
+            async with deadline.first_byte():
+                response = await session.post(
+                    url,
+                    headers=headers,
+                    data=body,
+                    timeout=request_timeout(session, deadline.connect_timeout),
+                    trace_request_ctx=trace,
+                )
+            try:
+                trace.mark(PHASE_FIRST_BYTE)
+                async with deadline.idle():
+                    if not response.ok:
+                        raise await provider_error_from(
+                            response,
+                            f"Doubao API error: {response.status} {response.reason}"
+                        )
+                    if decoder is None:
+                        raw = await response.read()
+                if decoder is not None:
+                    async for data in deadline.iter_reads(response.content):
+                        feeding = asyncio.create_task(asyncio.to_thread(decoder.feed, data))
+                        # Shielded, so a cancelled read still waits for the thread below.
+                        await asyncio.shield(feeding)
+            except BaseException:
+                response.close()
+                raise
+            finally:
+                response.release()
+
+            if decoder is None:
+                trace.add_bytes(len(raw))
+                result = json.loads(raw)
+            else:
+                trace.add_bytes(decoder.bytes_read)
+                result = decoder.finish()
+            if result.get("error"):
+                raise ProviderError(str(result["error"]))
+
+            return result
+
+        except BaseException as e:
+            if decoder is not None:
+                if feeding is not None:
+                    await asyncio.gather(feeding, return_exceptions=True)
+                await self._discard([decoder])
+            if isinstance(e, Exception):
+                logger.error("Doubao API request failed: %s", str(e))
             raise
 
     async def generate(
@@ -245,6 +295,10 @@ class DoubaoModel(AIModel):
     ) -> GenerationResponse:
         """Generate content using Doubao.
         
+        With a callback, the images of each upstream call are delivered as
+        soon as that call completes, so the first image of a fan-out does
+        not wait for the slowest one.
+
         Args:
             request: The generation request parameters.
             callback: Optional callback for streaming content.
@@ -252,49 +306,273 @@ class DoubaoModel(AIModel):
         Returns:
             A GenerationResponse containing the generation results.
         """
+        chunks: List[ContentChunk] = []
+        request_id: Optional[str] = None
         try:
-            model = request.model or self.default_model
-            payload = {
-                "req_key": model,
-                "prompt": request.prompt,
-                "return_url": True,
-            }
+            async with aclosing(self._iter_images(request)) as images:
+                async for chunk in images:
+                    if request_id is None:
+                        request_id = chunk.metadata["request_id"]
+                    if request.retain_chunks or not callback:
+                        chunks.append(chunk)
+                    if callback:
+                        try:
+                            await callback(chunk)
+                        except StopGeneration as e:
+                            # Closing the iterator cancels the calls still running.
+                            return GenerationResponse(
+                                success=False,
+                                chunks=chunks,
+                                error=str(e) or "Generation stopped by the callback",
+                                error_code=ErrorCode.CANCELLED.value,
+                                request_id=request_id
+                            )
 
-            result = await self._make_request(payload)
-            
-            if result.get("message") == "Success" and result.get("data", {}).get("image_urls"):
-                chunks = [
-                    ContentChunk(
-                        type=ContentType.IMAGE,
-                        content=url,
-                        metadata={"request_id": result.get("request_id")}
-                    )
-                    for url in result["data"]["image_urls"]
-                ]
-                
-                if callback:
-                    for chunk in chunks:
-                        await callback(chunk)
-                
-                return GenerationResponse(
-                    success=True,
-                    chunks=chunks,
-                    request_id=result.get("request_id")
-                )
-            
             return GenerationResponse(
-                success=False,
-                chunks=[],
-                error=result.get("message", "Unknown error")
+                success=True,
+                chunks=chunks,
+                request_id=request_id
             )
 
+        except ProviderError as e:
+            logger.error("Doubao API error: %s", e)
+            return e.to_response()
         except Exception as e:
             logger.exception("Error in Doubao generation")
             return GenerationResponse(
                 success=False,
                 chunks=[],
-                error=str(e)
+                error=str(e),
+                error_code=error_code_for(e).value
+            )
+
+    async def _iter_content(self, request: GenerationRequest) -> AsyncIterator[ContentChunk]:
+        """Yield the generated images as each Doubao call completes.
+        
+        Args:
+            request: The generation request parameters.
+            
+        Yields:
+            One image chunk per generated image.
+
+        Raises:
+            ProviderError: If the API returns an error.
+        """
+        async with aclosing(self._iter_images(request)) as images:
+            async for chunk in images:
+                yield chunk
+
+    async def _iter_images(self, request: GenerationRequest) -> AsyncIterator[ContentChunk]:
+        """Fan out one Doubao call per requested image and yield the results.
+
+        The calls run in parallel with distinct seeds derived from
+        ``request.seed``. The images of each call are yielded in completion
+        order. The first failure, or closing the iterator, cancels the calls
+        still running.
+
+        Args:
+            request: The generation request parameters.
+
+        Yields:
+            One image chunk per generated image.
+
+        Raises:
+            ProviderError: If ``request.n`` is invalid or exceeds the model's
+                ``max_images``, or if a call fails.
+        """
+        n = 1 if request.n is None else request.n
+        if n < 1:
+            raise ProviderError(f"Invalid number of images: {n}", code=ErrorCode.CLIENT_ERROR)
+        model = request.model or self.default_model
+        max_images = next((m.get("max_images", 1) for m in doubao_models() if m["id"] == model), 1)
+        if n > max_images:
+            # Every image is a paid call; do not fan out beyond the model's limit.
+            raise ProviderError(
+                f"Model {model} generates at most {max_images} images", code=ErrorCode.CLIENT_ERROR
+            )
+        deadline = Deadline(request)
+        deadline.check()
+
+        if n == 1:
+            chunks, _ = await self._request_images(request, request.seed, deadline)
+            for chunk in chunks:
+                yield chunk
+            return
+
+        calls = [
+            asyncio.create_task(self._request_images(request, derive_seed(request.seed, i), deadline))
+            for i in range(n)
+        ]
+        try:
+            for call in asyncio.as_completed(calls):
+                chunks, _ = await call
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            for call in calls:
+                call.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+
+    async def _request_images(
+        self,
+        request: GenerationRequest,
+        seed: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE
+    ) -> Tuple[List[ContentChunk], Optional[str]]:
+        """Make one Doubao call and convert the result to image chunks.
+        
+        Args:
+            request: The generation request parameters.
+            seed: Optional seed of the call. Without it, the upstream picks one.
+            deadline: Optional deadline of the call.
+            
+        Returns:
+            The image chunks and the upstream request ID.
+
+        Raises:
+            ProviderError: If the API does not return any images.
+        """
+        model = request.model or self.default_model
+        payload: Dict[str, Any] = {
+            "req_key": model,
+            "prompt": request.prompt,
+            "return_url": self.image_dir is None,
+        }
+        if seed is not None:
+            payload["seed"] = seed
+
+        trace = self._start_trace(model)
+        decoders: List[InlineImageDecoder] = []
+        try:
+            if self.async_mode:
+                result = await self._run_task(payload, trace, deadline, decoders)
+            else:
+                result = await self._make_request(
+                    payload,
+                    trace=trace,
+                    deadline=deadline,
+                    decoder=self._decoder(decoders)
+                )
+
+            data = result.get("data") or {}
+            if result.get("message") == "Success" and (data.get("image_urls") or data.get(IMAGE_FIELD)):
+                # All images of a response share one metadata dict.
+                metadata: Dict[str, Any] = {"request_id": result.get("request_id")}
+                if seed is not None:
+                    metadata["seed"] = seed
+                if data.get(IMAGE_FIELD):
+                    chunks = [self._inline_chunk(image, metadata) for image in data[IMAGE_FIELD]]
+                else:
+                    chunks = [
+                        ContentChunk(type=ContentType.IMAGE, content=url, metadata=metadata)
+                        for url in data["image_urls"]
+                    ]
+                for chunk in chunks:
+                    trace.add_chunk(chunk)
+                trace.finish()
+                return chunks, result.get("request_id")
+
+            raise ProviderError(result.get("message", "Unknown error"))
+        except BaseException as e:
+            # No chunk refers to the decoded images yet.
+            await self._discard(decoders)
+            trace.finish(e)
+            raise
+
+    def _decoder(self, decoders: Optional[List[InlineImageDecoder]] = None) -> Optional[InlineImageDecoder]:
+        """Create a decoder for a response that may carry inline images.
+
+        Args:
+            decoders: Optional list the decoder is added to, so the caller
+                can discard its images if the response is not used.
+        """
+        if self.image_dir is None:
+            return None
+        decoder = InlineImageDecoder(self.image_dir)
+        if decoders is not None:
+            decoders.append(decoder)
+        return decoder
+
+    @staticmethod
+    async def _discard(decoders: List[InlineImageDecoder]) -> None:
+        """Delete the images of decoders, in a thread that cancellation does not abort."""
+        if decoders:
+            await asyncio.shield(asyncio.to_thread(lambda: [decoder.discard() for decoder in decoders]))
+
+    @staticmethod
+    def _inline_chunk(image: DecodedImage, metadata: Dict[str, Any]) -> ContentChunk:
+        """Create the chunk of a decoded inline image."""
+        return ContentChunk(
+            type=ContentType.IMAGE,
+            content=Path(image.path).resolve().as_uri(),
+            metadata={
+                **metadata,
+                "path": image.path,
+                "size": image.size,
+                "mime_type": image.mime_type,
+            }
+        )
+
+    async def _run_task(
+        self,
+        payload: Dict[str, Any],
+        trace: RequestTrace = NULL_TRACE,
+        deadline: Deadline = NO_DEADLINE,
+        decoders: Optional[List[InlineImageDecoder]] = None
+    ) -> Dict[str, Any]:
+        """Submit an asynchronous generation task and wait for its result.
+        
+        Args:
+            payload: The generation payload.
+            trace: Optional trace of the submit and poll calls.
+            deadline: Optional deadline of the submit and poll calls and of
+                the wait for the task as a whole.
+            decoders: Optional list receiving the decoder of each poll.
+            
+        Returns:
+            The result of the finished task.
+
+        Raises:
+            ProviderError: If the task cannot be submitted or fails.
+        """
+        submitted = await self._make_request(
+            payload,
+            action="CVSync2AsyncSubmitTask",
+            trace=trace,
+            deadline=deadline
+        )
+        task_id = (submitted.get("data") or {}).get("task_id")
+        if not task_id:
+            raise ProviderError(submitted.get("message") or "Doubao task submission failed")
+
+        query = {
+            "req_key": payload["req_key"],
+            "task_id": task_id,
+            "req_json": json.dumps({"return_url": payload.get("return_url", True)}),
+        }
+
+        async def poll() -> Tuple[bool, Dict[str, Any]]:
+            decoder = self._decoder(decoders)
+            result = await self._make_request(
+                query,
+                action="CVSync2AsyncGetResult",
+                trace=trace,
+                deadline=deadline,
+                decoder=decoder
             )
+            status = (result.get("data") or {}).get("status")
+            if status == "done":
+                return True, result
+            if decoder is not None:
+                # Only the result of the finished task is used.
+                await self._discard([decoder])
+            if status in PENDING_TASK_STATUSES:
+                return False, result
+            raise ProviderError(f"Doubao task {task_id} failed with status: {status}")
+
+        poller = self._poller or default_poller()
+        async with deadline.total():
+            return await poller.wait(poll, key=task_id)
 
     @staticmethod
     def get_available_models() -> List[Dict[str, Any]]:
@@ -303,7 +581,7 @@ class DoubaoModel(AIModel):
         Returns:
             A list of dictionaries containing model information.
         """
-        return DOUBAO_MODELS
+        return doubao_models()
 
     @staticmethod
     def supports_streaming(model: str) -> bool:
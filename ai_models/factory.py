@@ -1,39 +1,216 @@
 """Model factory implementation."""
 
-from typing import Dict, Type
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple, Union, TYPE_CHECKING
 from .base import ModelFactory, ModelType, ModelConfig, AIModel
-from .openai_model import OpenAIModel
-from .doubao_model import DoubaoModel
+from .registry import ProviderRegistry, providers
+
+if TYPE_CHECKING:
+    from .catalog import CatalogRouter
+    from .circuit import BreakerRegistry, FailoverModel
+    from .credentials import CredentialPool
+    from .metrics import Instrumentation
+    from .transport import HTTPTransport, TransportConfig
+
+# A callable that wraps a model, e.g. ``lambda model: CachedModel(model, cache)``.
+ModelMiddleware = Callable[[AIModel], AIModel]
 
 class DefaultModelFactory(ModelFactory):
-    """Default implementation of the model factory."""
-    
-    def __init__(self):
-        """Initialize the model factory."""
-        self._model_classes: Dict[ModelType, Type[AIModel]] = {
-            ModelType.OPENAI: OpenAIModel,
-            ModelType.DOUBAO: DoubaoModel,
-            # Add other model implementations here
-        }
-    
-    def create_model(self, model_type: ModelType, config: ModelConfig) -> AIModel:
+    """Default implementation of the model factory.
+
+    Provider classes are resolved through a ``ProviderRegistry``, so a
+    provider module, and ``aiohttp``, is only imported once a model of that
+    provider is created; so are the modules behind failover, routing and
+    credential pools, on first use. The factory owns a pooled HTTP transport that is
+    shared by every model it creates, so connections to an upstream host are
+    reused across instances.
+    Optional middleware is applied to every created model, in order, so the
+    first middleware ends up innermost. With ``instrumentation``, every
+    created model records phase timings, including connection acquire times
+    of the shared transport. Wherever a ``ModelConfig`` is expected, a
+    ``CredentialPool`` may be given instead to spread requests over several
+    API keys; the middleware then wraps the ``PooledModel`` rather than the
+    model of each key, so retries and rate limits apply after the pool has
+    switched keys.
+    """
+
+    def __init__(
+        self,
+        transport_config: Optional["TransportConfig"] = None,
+        middleware: Optional[Sequence[ModelMiddleware]] = None,
+        instrumentation: Optional["Instrumentation"] = None,
+        registry: Optional[ProviderRegistry] = None,
+    ):
+        """Initialize the model factory.
+
+        Args:
+            transport_config: Optional configuration for the shared HTTP transport.
+            middleware: Optional wrappers applied to every created model.
+            instrumentation: Optional instrumentation attached to every created model.
+            registry: Optional provider registry. Defaults to the shared
+                ``ai_models.registry.providers``.
+        """
+        self.registry = registry or providers
+        self._transport_config = transport_config
+        self._transport: Optional["HTTPTransport"] = None
+        self._middleware = list(middleware or [])
+        self.instrumentation = instrumentation
+        self._breakers: Optional["BreakerRegistry"] = None
+
+    async def __aenter__(self) -> "DefaultModelFactory":
+        """Enter the factory context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the shared transport when exiting context."""
+        await self.close()
+
+    @property
+    def breakers(self) -> "BreakerRegistry":
+        """The circuit breakers shared by failover models, created on first use."""
+        if self._breakers is None:
+            from .circuit import BreakerRegistry
+
+            self._breakers = BreakerRegistry()
+        return self._breakers
+
+    @breakers.setter
+    def breakers(self, breakers: "BreakerRegistry") -> None:
+        self._breakers = breakers
+
+    @property
+    def transport(self) -> "HTTPTransport":
+        """The shared HTTP transport, created on first use."""
+        if self._transport is None or self._transport.closed:
+            from .transport import HTTPTransport
+
+            trace_configs = []
+            if self.instrumentation is not None:
+                trace_configs.append(self.instrumentation.trace_config())
+            self._transport = HTTPTransport(self._transport_config, trace_configs)
+        return self._transport
+
+    def create_model(
+        self,
+        model_type: Union[ModelType, str],
+        config: Union[ModelConfig, "CredentialPool"],
+        **options: Any
+    ) -> AIModel:
         """Create an AI model instance.
-        
+
         Args:
-            model_type: The type of model to create.
-            config: The model configuration.
-            
+            model_type: The type of model to create, or the name of a provider
+                registered with the factory's registry.
+            config: The model configuration, or a credential pool. With a
+                pool, one model is created per key and combined into a
+                ``PooledModel``, which the factory's middleware wraps. With
+                ``instrumentation``, the pool's per-key usage is exported to
+                its registry.
+            **options: Provider-specific options passed to the model class,
+                e.g. ``async_mode=True`` for Doubao.
+
         Returns:
             An instance of the requested model.
-            
+
         Raises:
             ValueError: If the model type is not supported.
         """
-        model_class = self._model_classes.get(model_type)
-        if not model_class:
-            raise ValueError(f"Unsupported model type: {model_type}")
-        
-        return model_class(config)
+        if not isinstance(config, ModelConfig):
+            from .credentials import PooledModel
+
+            if self.instrumentation is not None and config.registry is None:
+                config.instrument(self.instrumentation.registry)
+            model: AIModel = PooledModel(
+                [self._create_provider_model(model_type, key_config, options) for key_config in config.configs()],
+                config
+            )
+        else:
+            model = self._create_provider_model(model_type, config, options)
+        for wrap in self._middleware:
+            model = wrap(model)
+        return model
+
+    def _create_provider_model(
+        self,
+        model_type: Union[ModelType, str],
+        config: ModelConfig,
+        options: Mapping[str, Any]
+    ) -> AIModel:
+        """Create a provider model without middleware."""
+        model_class = self.registry.resolve(model_type)
+        model = model_class(config, transport=self.transport, **options)
+        if self.instrumentation is not None:
+            model.instrumentation = self.instrumentation
+        return model
+
+    def create_failover(
+        self,
+        chain: Sequence[Tuple[ModelType, str]],
+        configs: Mapping[ModelType, Union[ModelConfig, "CredentialPool"]]
+    ) -> "FailoverModel":
+        """Create a model that fails over along a chain of provider models.
+
+        Circuit breakers are shared through ``self.breakers`` so that their
+        state can be inspected and alerted on.
+
+        Args:
+            chain: ``(model type, model ID)`` pairs in order of preference,
+                e.g. ``[(ModelType.DOUBAO, "t2i_xl_sft"), (ModelType.OPENAI, "gpt-4o-image")]``.
+            configs: The configuration for each model type in the chain.
+
+        Returns:
+            A FailoverModel routing requests along the chain.
+
+        Raises:
+            ValueError: If a model type is unsupported or has no configuration.
+        """
+        from .circuit import FailoverModel, FailoverTarget
+
+        models: Dict[ModelType, AIModel] = {}
+        targets = []
+        for model_type, model_id in chain:
+            if model_type not in models:
+                if model_type not in configs:
+                    raise ValueError(f"No configuration for model type: {model_type}")
+                models[model_type] = self.create_model(model_type, configs[model_type])
+            targets.append(FailoverTarget(model=models[model_type], model_id=model_id))
+        return FailoverModel(targets, self.breakers)
+
+    def create_router(
+        self,
+        configs: Mapping[Union[ModelType, str], Union[ModelConfig, "CredentialPool"]],
+        default_model: Optional[str] = None,
+        options: Optional[Mapping[Union[ModelType, str], Mapping[str, Any]]] = None
+    ) -> "CatalogRouter":
+        """Create a single entry point for the models of several providers.
+
+        Requests are routed by ``request.model`` through a catalog built once
+        from the providers' model definitions.
+
+        Args:
+            configs: The configuration for each provider to include.
+            default_model: Optional model used for requests without ``model``.
+            options: Optional provider-specific options per provider.
+
+        Returns:
+            A CatalogRouter serving every model of the given providers.
+
+        Raises:
+            ValueError: If a model type is unsupported.
+        """
+        from .catalog import CatalogRouter
+
+        options = options or {}
+        models = [
+            self.create_model(model_type, config, **options.get(model_type, {}))
+            for model_type, config in configs.items()
+        ]
+        return CatalogRouter(models, default_model)
+
+    async def close(self) -> None:
+        """Close the shared HTTP transport and all pooled connections."""
+        if self._transport is not None:
+            await self._transport.close()
+            self._transport = None
 
 # Create a singleton instance
-model_factory = DefaultModelFactory() 
\ No newline at end of file
+model_factory = DefaultModelFactory()
@@ -0,0 +1,527 @@
+"""HTTP gateway serving generation requests to many clients.
+
+The gateway puts one process between browsers and the upstream providers,
+so connections, caches, rate limits and metrics are shared instead of being
+repeated in every client. It serves a model built by ``DefaultModelFactory``,
+usually a ``CatalogRouter`` over all configured providers:
+
+- ``POST /v1/generate``: one request, answered with the full response as JSON.
+- ``POST /v1/stream``: one request, answered as server-sent events: a
+  ``chunk`` event per content chunk, then ``complete`` or ``error``.
+  Identical concurrent streams share one upstream call (``SingleFlightModel``).
+- ``POST /v1/batch``: ``{"requests": [...]}``, answered with one response per
+  request, in order.
+- ``GET /v1/models``, ``GET /healthz`` and ``GET /metrics``.
+
+Admission is bounded: at most ``max_in_flight`` generations run at once and
+at most ``max_queue`` more wait for a slot. Requests beyond that, or waiting
+longer than ``queue_timeout``, are shed with 503 and ``Retry-After`` instead
+of piling up. On shutdown the gateway stops admitting and waits up to
+``drain_timeout`` for running generations before closing the upstreams.
+
+Usage:
+    python -m ai_models.gateway --config providers.json [--host H] [--port N]
+
+The config file maps provider names to ``ModelConfig`` fields; string values
+may reference environment variables, e.g. ``"api_key": "${PIAPI_KEY}"``::
+
+    {"providers": {"openai": {"api_key": "${PIAPI_KEY}"}},
+     "default_model": "gpt-4o-image"}
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import Any, AsyncIterator, Dict, Optional
+
+from aiohttp import web
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode
+)
+from .factory import DefaultModelFactory
+from .metrics import Instrumentation, MetricsRegistry
+from .serialization import chunk_to_dict, request_from_dict, response_to_dict
+from .singleflight import SingleFlightModel
+from .sse import json_dumps
+from .workers import build_router
+
+logger = logging.getLogger(__name__)
+
+# HTTP status of failed generations by error code; other codes map to 502.
+STATUS_FOR_ERROR: Dict[str, int] = {
+    ErrorCode.CLIENT_ERROR.value: 400,
+    ErrorCode.AUTH_ERROR.value: 502,
+    ErrorCode.RATE_LIMITED.value: 429,
+    ErrorCode.TIMEOUT.value: 504,
+    ErrorCode.CONNECT_TIMEOUT.value: 504,
+    ErrorCode.FIRST_BYTE_TIMEOUT.value: 504,
+    ErrorCode.IDLE_TIMEOUT.value: 504,
+    ErrorCode.DEADLINE_EXCEEDED.value: 504,
+    ErrorCode.CANCELLED.value: 499,
+    ErrorCode.CIRCUIT_OPEN.value: 503,
+    ErrorCode.OVERLOADED.value: 503,
+    ErrorCode.INTERNAL_ERROR.value: 500,
+}
+
+@dataclass
+class GatewayConfig:
+    """Configuration of the gateway.
+
+    Attributes:
+        max_in_flight: Maximum number of generations running at once.
+        max_queue: Maximum number of generations waiting for a slot.
+        queue_timeout: Maximum time a generation waits for a slot, in seconds.
+        retry_after: ``Retry-After`` sent with shed requests, in seconds.
+        drain_timeout: Time running generations get to finish on shutdown.
+        max_batch: Maximum number of requests in one batch.
+        batch_concurrency: Maximum number of requests of one batch in flight.
+        heartbeat: Interval of SSE keep-alive comments, in seconds, so that
+            proxies keep quiet streams open during long generations.
+        single_flight: Whether identical concurrent requests share one
+            upstream call.
+    """
+    max_in_flight: int = 64
+    max_queue: int = 256
+    queue_timeout: float = 10.0
+    retry_after: float = 1.0
+    drain_timeout: float = 30.0
+    max_batch: int = 32
+    batch_concurrency: int = 8
+    heartbeat: float = 15.0
+    single_flight: bool = True
+
+class Overloaded(Exception):
+    """Raised when a generation is not admitted.
+
+    Attributes:
+        reason: Why the generation was shed: ``queue_full``,
+            ``queue_timeout`` or ``draining``.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"Gateway overloaded: {reason}")
+        self.reason = reason
+
+class AdmissionController:
+    """Bounded admission of generations with a bounded wait queue."""
+
+    def __init__(self, config: GatewayConfig, registry: MetricsRegistry):
+        """Initialize the controller.
+
+        Args:
+            config: The gateway configuration.
+            registry: Registry receiving the admission metrics.
+        """
+        self.config = config
+        self.in_flight = 0
+        self.waiting = 0
+        self.draining = False
+        self._slots = asyncio.Semaphore(config.max_in_flight)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._in_flight_gauge = registry.gauge(
+            "gateway_in_flight", "Generations running in the gateway."
+        )
+        self._waiting_gauge = registry.gauge(
+            "gateway_queued", "Generations waiting for an admission slot."
+        )
+        self._wait_seconds = registry.histogram(
+            "gateway_queue_wait_seconds", "Time generations waited for admission."
+        )
+        self._shed = registry.counter(
+            "gateway_shed_total", "Generations rejected by admission control.", ("reason",)
+        )
+
+    def _reject(self, reason: str) -> Overloaded:
+        self._shed.inc(1, reason)
+        return Overloaded(reason)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold an admission slot for the duration of the context.
+
+        Raises:
+            Overloaded: If the gateway is draining, the queue is full or no
+                slot frees up within ``queue_timeout``.
+        """
+        if self.draining:
+            raise self._reject("draining")
+        if self._slots.locked() and self.waiting >= self.config.max_queue:
+            raise self._reject("queue_full")
+
+        started = time.perf_counter()
+        self.waiting += 1
+        self._waiting_gauge.set(self.waiting)
+        try:
+            async with asyncio.timeout(self.config.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            raise self._reject("queue_timeout") from None
+        finally:
+            self.waiting -= 1
+            self._waiting_gauge.set(self.waiting)
+        self._wait_seconds.observe(time.perf_counter() - started)
+
+        self.in_flight += 1
+        self._in_flight_gauge.set(self.in_flight)
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._in_flight_gauge.set(self.in_flight)
+            self._slots.release()
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting and wait for running generations to finish.
+
+        Args:
+            timeout: Maximum time to wait, in seconds.
+
+        Returns:
+            True if all generations finished in time.
+        """
+        self.draining = True
+        try:
+            async with asyncio.timeout(timeout):
+                await self._idle.wait()
+        except TimeoutError:
+            return False
+        return True
+
+class AdmittedModel(ModelWrapper):
+    """Model wrapper running every generation under admission control.
+
+    Shed generations are reported as failed responses with the
+    ``overloaded`` error code, so batches shed item by item.
+    """
+
+    def __init__(self, model: AIModel, admission: AdmissionController):
+        """Initialize the wrapper.
+
+        Args:
+            model: The model to wrap.
+            admission: The admission controller.
+        """
+        super().__init__(model)
+        self.admission = admission
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content once admitted."""
+        try:
+            async with self.admission.admit():
+                return await self.model.generate(request, callback)
+        except Overloaded as e:
+            return GenerationResponse(
+                success=False,
+                chunks=[],
+                error=str(e),
+                metadata={"retry_after": self.admission.config.retry_after},
+                error_code=ErrorCode.OVERLOADED.value
+            )
+
+def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event."""
+    return b"event: " + event.encode() + b"\ndata: " + json_dumps(data) + b"\n\n"
+
+class Gateway:
+    """aiohttp application serving a model over HTTP."""
+
+    def __init__(
+        self,
+        model: AIModel,
+        config: Optional[GatewayConfig] = None,
+        registry: Optional[MetricsRegistry] = None,
+        factory: Optional[DefaultModelFactory] = None
+    ):
+        """Initialize the gateway.
+
+        Args:
+            model: The model serving all requests, e.g. a ``CatalogRouter``.
+            config: Optional gateway configuration.
+            registry: Optional registry for the gateway metrics. Pass the
+                registry of the factory's instrumentation to expose both on
+                ``/metrics``.
+            factory: Optional factory that created ``model``; it is closed
+                with the gateway.
+        """
+        self.config = config or GatewayConfig()
+        self.registry = registry or MetricsRegistry()
+        self.factory = factory
+        self.admission = AdmissionController(self.config, self.registry)
+        self.model = AdmittedModel(
+            SingleFlightModel(model) if self.config.single_flight else model,
+            self.admission
+        )
+        self._responses = self.registry.counter(
+            "gateway_responses_total", "Gateway responses by endpoint and status.",
+            ("endpoint", "status"),
+        )
+        self._seconds = self.registry.histogram(
+            "gateway_request_seconds", "Gateway request duration by endpoint.", ("endpoint",)
+        )
+        self._disconnects = self.registry.counter(
+            "gateway_stream_disconnects_total", "Streams abandoned by the client."
+        )
+
+    def app(self) -> web.Application:
+        """Build the aiohttp application."""
+        app = web.Application(middlewares=[self._observe])
+        app.router.add_post("/v1/generate", self._generate)
+        app.router.add_post("/v1/stream", self._stream)
+        app.router.add_post("/v1/batch", self._batch)
+        app.router.add_get("/v1/models", self._models)
+        app.router.add_get("/healthz", self._health)
+        app.router.add_get("/metrics", self._metrics)
+        app.on_shutdown.append(self._drain)
+        app.on_cleanup.append(self._close)
+        return app
+
+    @web.middleware
+    async def _observe(self, request: web.Request, handler) -> web.StreamResponse:
+        """Record the status and duration of every response."""
+        started = time.perf_counter()
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else "unmatched"
+        try:
+            response = await handler(request)
+        except web.HTTPException as e:
+            self._responses.inc(1, endpoint, str(e.status))
+            raise
+        else:
+            self._responses.inc(1, endpoint, str(response.status))
+        finally:
+            self._seconds.observe(time.perf_counter() - started, endpoint)
+        return response
+
+    async def _drain(self, app: web.Application) -> None:
+        """Stop admitting new generations and wait for running ones."""
+        logger.info("Draining %d generations", self.admission.in_flight)
+        if not await self.admission.drain(self.config.drain_timeout):
+            logger.warning(
+                "Drain timed out with %d generations running", self.admission.in_flight
+            )
+
+    async def _close(self, app: web.Application) -> None:
+        """Close the model and the factory's upstream connections."""
+        await self.model.close()
+        if self.factory is not None:
+            await self.factory.close()
+
+    async def _read_request(self, request: web.Request) -> GenerationRequest:
+        """Parse a generation request body.
+
+        Raises:
+            web.HTTPBadRequest: If the body is not a valid request.
+        """
+        try:
+            data = await request.json()
+        except ValueError:
+            raise self._bad_request("Request body must be JSON") from None
+        return self._parse(data)
+
+    def _parse(self, data: Any) -> GenerationRequest:
+        if not isinstance(data, dict) or not isinstance(data.get("prompt"), str):
+            raise self._bad_request("Request must be an object with a prompt")
+        try:
+            return request_from_dict(data, strict=True)
+        except ValueError as e:
+            raise self._bad_request(str(e)) from None
+
+    @staticmethod
+    def _bad_request(message: str) -> web.HTTPBadRequest:
+        return web.HTTPBadRequest(
+            text=json.dumps({"error": message, "error_code": ErrorCode.CLIENT_ERROR.value}),
+            content_type="application/json",
+        )
+
+    def _json(self, data: Dict[str, Any], status: int = 200, retry_after: Optional[float] = None) -> web.Response:
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+        return web.Response(
+            body=json_dumps(data), status=status, headers=headers, content_type="application/json"
+        )
+
+    def _response(self, response: GenerationResponse) -> web.Response:
+        """Convert a generation response to an HTTP response."""
+        status = 200
+        if not response.success:
+            status = STATUS_FOR_ERROR.get(response.error_code or "", 502)
+        retry_after = (response.metadata or {}).get("retry_after") if status in (429, 503) else None
+        return self._json(response_to_dict(response), status, retry_after)
+
+    async def _generate(self, request: web.Request) -> web.Response:
+        """Serve ``POST /v1/generate``."""
+        generation = await self._read_request(request)
+        return self._response(await self.model.generate(generation))
+
+    async def _batch(self, request: web.Request) -> web.Response:
+        """Serve ``POST /v1/batch``."""
+        try:
+            data = await request.json()
+        except ValueError:
+            raise self._bad_request("Request body must be JSON") from None
+        items = data.get("requests") if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            raise self._bad_request("Batch must contain a non-empty requests list")
+        if len(items) > self.config.max_batch:
+            raise self._bad_request(f"Batch exceeds {self.config.max_batch} requests")
+        if self.admission.draining:
+            return self._json(
+                {"error": "Gateway is draining", "error_code": ErrorCode.OVERLOADED.value},
+                503, self.config.retry_after,
+            )
+
+        generations = [self._parse(item) for item in items]
+        for generation in generations:
+            generation.retain_chunks = True
+        responses = await self.model.generate_many(generations, self.config.batch_concurrency)
+        return self._json({"responses": [response_to_dict(response) for response in responses]})
+
+    async def _stream(self, request: web.Request) -> web.StreamResponse:
+        """Serve ``POST /v1/stream`` as server-sent events."""
+        generation = await self._read_request(request)
+        # Chunks go straight to the client; the final event only carries status.
+        generation.retain_chunks = False
+        stream = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
+        disconnected = False
+        task: Optional["asyncio.Task[GenerationResponse]"] = None
+
+        async def write(data: bytes) -> None:
+            nonlocal disconnected
+            if disconnected:
+                return
+            try:
+                if not stream.prepared:
+                    await stream.prepare(request)
+                await stream.write(data)
+            except ConnectionResetError:
+                # Stop the upstream call instead of generating for nobody.
+                disconnected = True
+                self._disconnects.inc()
+                if task is not None:
+                    task.cancel()
+
+        async def send(chunk: ContentChunk) -> None:
+            await write(_sse_event("chunk", chunk_to_dict(chunk)))
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(self.config.heartbeat)
+                await write(b": keep-alive\n\n")
+
+        task = asyncio.create_task(self.model.generate(generation, send))
+        beats = asyncio.create_task(heartbeat())
+        try:
+            response = await task
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+            return stream
+        finally:
+            beats.cancel()
+            if not task.done():
+                task.cancel()
+
+        if not response.success and not stream.prepared:
+            # Nothing was sent yet, so failures keep a meaningful status.
+            return self._response(response)
+        summary = response_to_dict(response)
+        del summary["chunks"]
+        await write(_sse_event("complete" if response.success else "error", summary))
+        if not disconnected:
+            await stream.write_eof()
+        return stream
+
+    async def _models(self, request: web.Request) -> web.Response:
+        """Serve ``GET /v1/models``."""
+        return self._json({"models": self.model.get_available_models()})
+
+    async def _health(self, request: web.Request) -> web.Response:
+        """Serve ``GET /healthz``; unhealthy while draining, so balancers move away."""
+        status = 503 if self.admission.draining else 200
+        return self._json({
+            "status": "draining" if self.admission.draining else "ok",
+            "in_flight": self.admission.in_flight,
+            "queued": self.admission.waiting,
+        }, status)
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        """Serve ``GET /metrics`` in the Prometheus text format."""
+        return web.Response(
+            text=self.registry.render_prometheus(),
+            content_type="text/plain",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+def create_gateway(settings: Dict[str, Any], config: Optional[GatewayConfig] = None) -> Gateway:
+    """Create a gateway routing to the providers of a config file.
+
+    Args:
+        settings: The parsed config file with ``providers``, and optionally
+            ``default_model`` and per-provider ``options``.
+        config: Optional gateway configuration.
+
+    Returns:
+        The gateway, owning an instrumented factory.
+
+    Raises:
+        ValueError: If no providers are configured or one is unsupported.
+    """
+    registry = MetricsRegistry()
+    factory = DefaultModelFactory(instrumentation=Instrumentation(registry))
+    router = build_router(
+        factory,
+        settings.get("providers") or {},
+        settings.get("default_model"),
+        settings.get("options"),
+    )
+    return Gateway(router, config, registry, factory)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--config", required=True, help="JSON file with the provider configs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    for name, default in asdict(GatewayConfig()).items():
+        if not isinstance(default, bool):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument("--no-single-flight", dest="single_flight", action="store_false")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    with open(args.config, encoding="utf-8") as f:
+        settings = json.load(f)
+    config = GatewayConfig(**{f.name: getattr(args, f.name) for f in fields(GatewayConfig)})
+    gateway = create_gateway(settings, config)
+    web.run_app(
+        gateway.app(),
+        host=args.host,
+        port=args.port,
+        shutdown_timeout=config.drain_timeout,
+        access_log=None,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,678 @@
+"""Durable, prioritized queue of generation jobs.
+
+``JobQueue`` stores ``GenerationRequest``s in a SQLite database in WAL mode,
+so submitted work and finished results survive restarts. Jobs are claimed
+in priority order under a lease: a worker that dies stops renewing its
+leases, and once they expire the jobs are claimed again, up to
+``max_attempts``. ``JobWorkerPool`` runs jobs concurrently against an
+``AIModel`` and persists every response.
+
+Interactive work is submitted with ``PRIORITY_INTERACTIVE`` and always runs
+before queued batch work (``PRIORITY_BATCH``), so bursts are absorbed by the
+queue without delaying users. Submitting with an idempotency key returns the
+existing job instead of creating a duplicate.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+from .base import AIModel, GenerationRequest, GenerationResponse, ErrorCode
+from .serialization import request_from_dict, request_to_dict, response_from_dict, response_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Lower values run first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+class JobState(str, Enum):
+    """Enumeration of job states."""
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+FINAL_STATES = frozenset({JobState.SUCCEEDED, JobState.FAILED, JobState.CANCELLED})
+
+@dataclass
+class JobQueueConfig:
+    """Configuration of the job queue.
+
+    Attributes:
+        path: The SQLite database file.
+        lease: Seconds a claimed job belongs to its worker without renewal.
+            Workers renew leases while a job runs; jobs whose lease expired
+            are treated as crashed and claimed again.
+        max_attempts: Maximum number of runs of a job, including runs lost
+            to crashes.
+        retry_backoff: Delay before the first retry, in seconds; doubled
+            for every further attempt.
+        max_retry_backoff: Upper bound of the retry delay, in seconds.
+        retry_codes: Error codes of failed responses that are retried.
+        busy_timeout: Seconds to wait for a database lock held by another
+            process.
+    """
+    path: str
+    lease: float = 300.0
+    max_attempts: int = 3
+    retry_backoff: float = 5.0
+    max_retry_backoff: float = 300.0
+    retry_codes: FrozenSet[str] = field(default_factory=lambda: frozenset({
+        ErrorCode.RATE_LIMITED.value,
+        ErrorCode.UPSTREAM_ERROR.value,
+        ErrorCode.NETWORK_ERROR.value,
+        ErrorCode.TIMEOUT.value,
+        ErrorCode.CONNECT_TIMEOUT.value,
+        ErrorCode.FIRST_BYTE_TIMEOUT.value,
+        ErrorCode.IDLE_TIMEOUT.value,
+        ErrorCode.CIRCUIT_OPEN.value,
+        ErrorCode.OVERLOADED.value,
+    }))
+    busy_timeout: float = 5.0
+
+@dataclass
+class Job:
+    """A generation job.
+
+    Attributes:
+        id: The job ID.
+        request: The generation request.
+        priority: The priority; lower values run first.
+        state: The job state.
+        attempts: Number of runs started so far.
+        idempotency_key: Optional caller-provided deduplication key.
+        response: The final response, once the job succeeded or failed.
+        created_at: Submission time, as a Unix timestamp.
+        updated_at: Time of the last state change, as a Unix timestamp.
+        worker: ID of the worker holding the job while it runs.
+    """
+    id: str
+    request: GenerationRequest
+    priority: int = PRIORITY_INTERACTIVE
+    state: JobState = JobState.PENDING
+    attempts: int = 0
+    idempotency_key: Optional[str] = None
+    response: Optional[GenerationResponse] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    worker: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether the job reached a final state."""
+        return self.state in FINAL_STATES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    idempotency_key TEXT UNIQUE,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    request TEXT NOT NULL,
+    response TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL,
+    lease_expires REAL,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority, not_before, created_at);
+"""
+
+COLUMNS = (
+    "id, idempotency_key, priority, state, request, response, attempts, "
+    "worker, created_at, updated_at"
+)
+
+class JobQueue:
+    """SQLite-backed queue of generation jobs.
+
+    The queue may be shared by several processes using the same database
+    file. All database work runs in a thread, so the event loop is never
+    blocked on disk I/O.
+    """
+
+    def __init__(self, config: JobQueueConfig, clock: Callable[[], float] = time.time):
+        """Open or create the queue.
+
+        Args:
+            config: The queue configuration.
+            clock: Wall clock; leases must compare across processes and restarts.
+        """
+        self.config = config
+        self._clock = clock
+        directory = os.path.dirname(os.path.abspath(config.path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(
+            config.path,
+            timeout=config.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+        # Called whenever new work becomes available in this process.
+        self.listeners: List[Callable[[], None]] = []
+        self._finished: Dict[str, List["asyncio.Future[Job]"]] = {}
+
+    async def __aenter__(self) -> "JobQueue":
+        """Enter the queue context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the database when exiting context."""
+        await self.close()
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run a database function in a thread, serialized with the others."""
+        def locked() -> Any:
+            with self._lock:
+                return function(*args)
+        return await asyncio.to_thread(locked)
+
+    def _transaction(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run a function in a write transaction; must hold ``_lock``."""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            result = function(*args)
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return result
+
+    def _row_to_job(self, row: Optional[tuple]) -> Optional[Job]:
+        if row is None:
+            return None
+        (job_id, key, priority, state, request, response, attempts,
+         worker, created_at, updated_at) = row
+        return Job(
+            id=job_id,
+            request=request_from_dict(json.loads(request)),
+            priority=priority,
+            state=JobState(state),
+            attempts=attempts,
+            idempotency_key=key,
+            response=response_from_dict(json.loads(response)) if response else None,
+            created_at=created_at,
+            updated_at=updated_at,
+            worker=worker,
+        )
+
+    def _notify(self) -> None:
+        for listener in self.listeners:
+            listener()
+
+    async def submit(
+        self,
+        request: GenerationRequest,
+        priority: int = PRIORITY_INTERACTIVE,
+        idempotency_key: Optional[str] = None
+    ) -> Job:
+        """Add a job to the queue.
+
+        Args:
+            request: The generation request.
+            priority: The priority; lower values run first.
+            idempotency_key: Optional deduplication key. If a job with the
+                same key exists, in any state, it is returned instead.
+
+        Returns:
+            The new or existing job.
+        """
+        job_id = uuid.uuid4().hex
+        payload = json.dumps(request_to_dict(request), ensure_ascii=False)
+
+        def insert() -> Optional[tuple]:
+            now = self._clock()
+            self._db.execute(
+                "INSERT INTO jobs (id, idempotency_key, priority, state, request, "
+                "not_before, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (idempotency_key) DO NOTHING",
+                (job_id, idempotency_key, priority, JobState.PENDING.value, payload, now, now, now),
+            )
+            column, value = ("idempotency_key", idempotency_key) if idempotency_key else ("id", job_id)
+            return self._db.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE {column} = ?", (value,)
+            ).fetchone()
+
+        job = self._row_to_job(await self._run(self._transaction, insert))
+        if job.id == job_id:
+            self._notify()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by ID.
+
+        Args:
+            job_id: The job ID.
+
+        Returns:
+            The job, or None if it does not exist.
+        """
+        def select() -> Optional[tuple]:
+            return self._db.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(await self._run(select))
+
+    async def claim(self, worker: str, limit: int = 1) -> List[Job]:
+        """Claim the most urgent runnable jobs.
+
+        Jobs whose lease expired are claimed again, or failed if they used
+        up their attempts.
+
+        Args:
+            worker: ID of the claiming worker.
+            limit: Maximum number of jobs to claim.
+
+        Returns:
+            The claimed jobs, most urgent first. Their ``attempts`` include
+            the run that starts now.
+        """
+        def claim() -> List[tuple]:
+            now = self._clock()
+            self._fail_exhausted(now)
+            ids = [row[0] for row in self._db.execute(
+                "SELECT id FROM jobs WHERE (state = ? AND not_before <= ?) "
+                "OR (state = ? AND lease_expires <= ?) "
+                "ORDER BY priority, created_at LIMIT ?",
+                (JobState.PENDING.value, now, JobState.RUNNING.value, now, limit),
+            )]
+            if not ids:
+                return []
+            marks = ", ".join("?" * len(ids))
+            self._db.execute(
+                f"UPDATE jobs SET state = ?, attempts = attempts + 1, lease_expires = ?, "
+                f"worker = ?, updated_at = ? WHERE id IN ({marks})",
+                (JobState.RUNNING.value, now + self.config.lease, worker, now, *ids),
+            )
+            return self._db.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE id IN ({marks}) ORDER BY priority, created_at",
+                ids,
+            ).fetchall()
+
+        rows = await self._run(self._transaction, claim)
+        return [self._row_to_job(row) for row in rows]
+
+    def _fail_exhausted(self, now: float) -> None:
+        """Fail expired jobs without attempts left; runs inside a transaction."""
+        response = json.dumps(response_to_dict(GenerationResponse(
+            success=False,
+            chunks=[],
+            error="Job was lost by its worker too many times",
+            error_code=ErrorCode.INTERNAL_ERROR.value,
+        )))
+        rows = self._db.execute(
+            "UPDATE jobs SET state = ?, response = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE state = ? AND lease_expires <= ? AND attempts >= ? RETURNING id",
+            (JobState.FAILED.value, response, now, JobState.RUNNING.value, now,
+             self.config.max_attempts),
+        ).fetchall()
+        for (job_id,) in rows:
+            logger.warning("Job %s failed after %d lost attempts", job_id, self.config.max_attempts)
+
+    async def renew(self, job_ids: List[str], worker: str) -> int:
+        """Extend the leases of running jobs.
+
+        Args:
+            job_ids: The jobs to renew.
+            worker: ID of the worker holding them.
+
+        Returns:
+            Number of leases renewed; jobs reclaimed by others are skipped.
+        """
+        if not job_ids:
+            return 0
+
+        def renew() -> int:
+            marks = ", ".join("?" * len(job_ids))
+            return self._db.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE state = ? AND worker = ? "
+                f"AND id IN ({marks})",
+                (self._clock() + self.config.lease, JobState.RUNNING.value, worker, *job_ids),
+            ).rowcount
+        return await self._run(renew)
+
+    async def complete(self, job: Job, response: GenerationResponse, worker: str) -> Job:
+        """Record the response of a run.
+
+        Failed runs with a retryable error code and attempts left go back to
+        the queue with exponential backoff; all others are final.
+
+        Args:
+            job: The job, as claimed.
+            response: The response of the run.
+            worker: ID of the worker that ran the job.
+
+        Returns:
+            The updated job. If the lease was lost to another worker, the
+            job is returned unchanged from the database.
+        """
+        retry = (
+            not response.success
+            and response.error_code in self.config.retry_codes
+            and job.attempts < self.config.max_attempts
+        )
+        payload = None if retry else json.dumps(response_to_dict(response), ensure_ascii=False)
+
+        def complete() -> Optional[tuple]:
+            now = self._clock()
+            if retry:
+                delay = min(
+                    self.config.retry_backoff * 2 ** (job.attempts - 1),
+                    self.config.max_retry_backoff,
+                )
+                retry_after = (response.metadata or {}).get("retry_after")
+                if isinstance(retry_after, (int, float)):
+                    delay = max(delay, retry_after)
+                state, not_before = JobState.PENDING, now + delay
+            else:
+                state = JobState.SUCCEEDED if response.success else JobState.FAILED
+                not_before = now
+            self._db.execute(
+                "UPDATE jobs SET state = ?, response = ?, not_before = ?, lease_expires = NULL, "
+                "worker = NULL, updated_at = ? WHERE id = ? AND state = ? AND worker = ?",
+                (state.value, payload, not_before, now, job.id, JobState.RUNNING.value, worker),
+            )
+            return self._db.execute(
+                f"SELECT {COLUMNS} FROM jobs WHERE id = ?", (job.id,)
+            ).fetchone()
+
+        updated = self._row_to_job(await self._run(self._transaction, complete))
+        if updated.done:
+            self._resolve(updated)
+        return updated
+
+    async def release(self, job: Job, worker: str) -> None:
+        """Return a claimed job to the queue without counting the attempt.
+
+        Args:
+            job: The job, as claimed.
+            worker: ID of the worker holding the job.
+        """
+        def release() -> None:
+            self._db.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), lease_expires = NULL, "
+                "worker = NULL, updated_at = ? WHERE id = ? AND state = ? AND worker = ?",
+                (JobState.PENDING.value, self._clock(), job.id, JobState.RUNNING.value, worker),
+            )
+        await self._run(release)
+        self._notify()
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started.
+
+        Args:
+            job_id: The job ID.
+
+        Returns:
+            True if the job was pending and is now cancelled.
+        """
+        def cancel() -> bool:
+            return self._db.execute(
+                "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?",
+                (JobState.CANCELLED.value, self._clock(), job_id, JobState.PENDING.value),
+            ).rowcount > 0
+
+        cancelled = await self._run(cancel)
+        if cancelled:
+            self._resolve(await self.get(job_id))
+        return cancelled
+
+    async def recover(self, worker: Optional[str] = None) -> int:
+        """Return running jobs to the queue at once, without waiting for their leases.
+
+        Call this on startup when no other process uses the queue, or with
+        the ID of a worker known to be dead. The interrupted run still
+        counts as an attempt.
+
+        Args:
+            worker: Optional worker whose jobs are recovered. Defaults to all.
+
+        Returns:
+            Number of recovered jobs.
+        """
+        def recover() -> int:
+            query = "UPDATE jobs SET lease_expires = ? WHERE state = ?"
+            args: List[Any] = [self._clock(), JobState.RUNNING.value]
+            if worker is not None:
+                query += " AND worker = ?"
+                args.append(worker)
+            return self._db.execute(query, args).rowcount
+
+        recovered = await self._run(recover)
+        if recovered:
+            logger.info("Recovered %d interrupted jobs", recovered)
+            self._notify()
+        return recovered
+
+    async def counts(self) -> Dict[str, int]:
+        """Get the number of jobs per state."""
+        def counts() -> Dict[str, int]:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+        return await self._run(counts)
+
+    async def purge(self, older_than: float) -> int:
+        """Delete finished jobs.
+
+        Args:
+            older_than: Age in seconds a finished job must have reached.
+
+        Returns:
+            Number of deleted jobs.
+        """
+        states = [state.value for state in FINAL_STATES]
+
+        def purge() -> int:
+            return self._db.execute(
+                f"DELETE FROM jobs WHERE state IN ({', '.join('?' * len(states))}) "
+                "AND updated_at <= ?",
+                (*states, self._clock() - older_than),
+            ).rowcount
+        return await self._run(purge)
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None, poll_interval: float = 1.0) -> Job:
+        """Wait for a job to finish.
+
+        Jobs finished by this process resolve at once; jobs run by other
+        processes are noticed by polling.
+
+        Args:
+            job_id: The job ID.
+            timeout: Optional maximum time to wait, in seconds.
+            poll_interval: Seconds between checks of the database.
+
+        Returns:
+            The finished job.
+
+        Raises:
+            KeyError: If the job does not exist.
+            TimeoutError: If the job does not finish in time.
+        """
+        future: "asyncio.Future[Job]" = asyncio.get_running_loop().create_future()
+        self._finished.setdefault(job_id, []).append(future)
+        try:
+            async with asyncio.timeout(timeout):
+                while True:
+                    job = await self.get(job_id)
+                    if job is None:
+                        raise KeyError(job_id)
+                    if job.done:
+                        return job
+                    await asyncio.wait((future,), timeout=poll_interval)
+                    if future.done():
+                        return future.result()
+        finally:
+            waiters = self._finished.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._finished.pop(job_id, None)
+
+    def _resolve(self, job: Job) -> None:
+        for future in self._finished.pop(job.id, []):
+            if not future.done():
+                future.set_result(job)
+
+    async def close(self) -> None:
+        """Close the database."""
+        await self._run(self._db.close)
+
+@dataclass
+class WorkerPoolConfig:
+    """Configuration of a job worker pool.
+
+    Attributes:
+        concurrency: Number of jobs run at once.
+        poll_interval: Seconds between queue checks when it is idle; work
+            submitted by this process wakes the workers at once.
+        drain_timeout: Seconds running jobs get to finish on ``stop``.
+            Jobs still running after that are returned to the queue.
+    """
+    concurrency: int = 8
+    poll_interval: float = 1.0
+    drain_timeout: float = 30.0
+
+class JobWorkerPool:
+    """Concurrent workers running queued jobs against a model."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        model: AIModel,
+        config: Optional[WorkerPoolConfig] = None,
+        worker_id: Optional[str] = None
+    ):
+        """Initialize the pool.
+
+        Args:
+            queue: The job queue.
+            model: The model running the jobs, e.g. a ``CatalogRouter``.
+            config: Optional pool configuration.
+            worker_id: Optional ID of the pool in the queue. Defaults to a
+                unique ID per pool.
+        """
+        self.queue = queue
+        self.model = model
+        self.config = config or WorkerPoolConfig()
+        self.worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.completed = 0
+        self._running: Dict[str, Job] = {}
+        self._workers: List["asyncio.Task[None]"] = []
+        self._renewer: Optional["asyncio.Task[None]"] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> int:
+        """Number of jobs currently running in this pool."""
+        return len(self._running)
+
+    async def __aenter__(self) -> "JobWorkerPool":
+        """Start the pool when entering context."""
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Stop the pool when exiting context."""
+        await self.stop()
+
+    def start(self) -> None:
+        """Start the workers and the lease renewal."""
+        if self._workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self.queue.listeners.append(self._wakeup.set)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.config.concurrency)]
+        self._renewer = asyncio.create_task(self._renew_leases())
+
+    async def stop(self) -> None:
+        """Stop claiming jobs and wait for running ones.
+
+        Jobs still running after ``drain_timeout`` are cancelled and
+        returned to the queue.
+        """
+        if not self._workers:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self.queue.listeners.remove(self._wakeup.set)
+
+        workers, self._workers = self._workers, []
+        _, pending = await asyncio.wait(workers, timeout=self.config.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._renewer.cancel()
+        await asyncio.gather(self._renewer, return_exceptions=True)
+
+    async def _work(self) -> None:
+        """Worker loop: claim a job, run it, persist the result."""
+        while not self._stopping:
+            jobs = await self.queue.claim(self.worker_id)
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    async with asyncio.timeout(self.config.poll_interval):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            await self._run_job(jobs[0])
+        # Another idle worker may still be waiting; let it see the stop.
+        self._wakeup.set()
+
+    async def _run_job(self, job: Job) -> None:
+        self._running[job.id] = job
+        try:
+            job.request.retain_chunks = True
+            try:
+                response = await self.model.generate(job.request)
+            except asyncio.CancelledError:
+                await asyncio.shield(self.queue.release(job, self.worker_id))
+                raise
+            except Exception as e:
+                logger.exception("Job %s raised", job.id)
+                response = GenerationResponse(
+                    success=False,
+                    chunks=[],
+                    error=str(e),
+                    error_code=ErrorCode.INTERNAL_ERROR.value
+                )
+            updated = await self.queue.complete(job, response, self.worker_id)
+            self.completed += 1
+            if updated.state is JobState.PENDING:
+                logger.info("Job %s will be retried (attempt %d failed: %s)",
+                            job.id, job.attempts, response.error_code)
+        finally:
+            self._running.pop(job.id, None)
+
+    async def _renew_leases(self) -> None:
+        """Renew the leases of running jobs well before they expire.
+
+        Renewal goes on while ``stop`` drains the pool, until the last
+        running job has finished.
+        """
+        interval = self.queue.config.lease / 3
+        while not self._stopping or self._running:
+            await asyncio.sleep(interval)
+            try:
+                await self.queue.renew(list(self._running), self.worker_id)
+            except sqlite3.Error:
+                logger.exception("Failed to renew job leases")
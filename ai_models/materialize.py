@@ -0,0 +1,399 @@
+"""Materialization of generated images into a local content-addressed store.
+
+Provider image URLs are temporary. ``ImagePipeline`` downloads every image
+chunk of a response concurrently, streaming each body straight to disk
+while hashing it, and stores it under its SHA-256 so duplicates are kept
+once. Local ``file://`` images, such as inline images decoded by a
+provider, are hashed and linked or copied into the store; the source file
+is left in place. File operations run in worker threads and resized
+variants such as thumbnails are rendered in a process pool, so the event
+loop is never blocked. The local paths are added to the chunk metadata.
+
+Variants require Pillow; without it only the originals are stored.
+"""
+
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import BinaryIO, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ContentType
+)
+from .transport import HTTPTransport
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class MaterializeConfig:
+    """Configuration of the image pipeline.
+
+    Attributes:
+        root: Directory of the content-addressed store.
+        concurrency: Maximum number of concurrent downloads.
+        chunk_size: Bytes read from the network per write.
+        max_bytes: Optional upper bound of a single image, in bytes.
+        variants: Named variants to render, mapping a name to the
+            maximum ``(width, height)`` of the variant.
+        variant_format: Image format of rendered variants.
+        max_workers: Optional size of the variant process pool.
+    """
+    root: str
+    concurrency: int = 8
+    chunk_size: int = 64 * 1024
+    max_bytes: Optional[int] = 64 * 1024 * 1024
+    variants: Dict[str, Tuple[int, int]] = field(default_factory=lambda: {"thumb": (256, 256)})
+    variant_format: str = "WEBP"
+    max_workers: Optional[int] = None
+
+def _render_variant(source: str, target: str, size: Tuple[int, int], image_format: str) -> str:
+    """Render a resized copy of an image. Runs in a worker process."""
+    from PIL import Image
+
+    if os.path.exists(target):
+        return target
+    with Image.open(source) as image:
+        image.thumbnail(size)
+        directory = os.path.dirname(target)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            image.save(tmp_path, format=image_format)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return target
+
+class ImageStore:
+    """Content-addressed file store for images."""
+
+    def __init__(self, root: str):
+        """Initialize the store.
+
+        Args:
+            root: The store directory.
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def path_for(self, digest: str, extension: str) -> str:
+        """Get the path of an original image.
+
+        Args:
+            digest: The SHA-256 hex digest of the image.
+            extension: The file extension, including the dot.
+
+        Returns:
+            The file path.
+        """
+        return os.path.join(self.root, digest[:2], f"{digest}{extension}")
+
+    def variant_path(self, digest: str, name: str, image_format: str) -> str:
+        """Get the path of a rendered variant.
+
+        Args:
+            digest: The SHA-256 hex digest of the original.
+            name: The variant name.
+            image_format: The variant image format.
+
+        Returns:
+            The file path.
+        """
+        return os.path.join(self.root, digest[:2], f"{digest}.{name}.{image_format.lower()}")
+
+    def temp_file(self) -> Tuple[int, str]:
+        """Create a temporary file inside the store."""
+        return tempfile.mkstemp(dir=os.path.join(self.root, "tmp"), suffix=".part")
+
+    def commit(self, tmp_path: str, digest: str, extension: str) -> Tuple[str, bool]:
+        """Move a downloaded file to its content address.
+
+        Args:
+            tmp_path: The temporary file.
+            digest: The SHA-256 hex digest of its content.
+            extension: The file extension.
+
+        Returns:
+            The final path and whether the content was already stored.
+        """
+        path = self.path_for(digest, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Linking fails if the path exists, so concurrent commits of the
+            # same content agree on which one stored it.
+            os.link(tmp_path, path)
+            existed = False
+        except FileExistsError:
+            existed = True
+        except OSError:
+            # No hard links on this file system.
+            existed = os.path.exists(path)
+            if not existed:
+                os.replace(tmp_path, path)
+                return path, False
+        os.remove(tmp_path)
+        return path, existed
+
+    def add_file(self, source: str, digest: str, extension: str) -> Tuple[str, bool]:
+        """Store a copy of a local file at its content address.
+
+        The file is hard-linked into the store when possible and copied
+        otherwise. The source is left in place.
+
+        Args:
+            source: The file.
+            digest: The SHA-256 hex digest of its content.
+            extension: The file extension.
+
+        Returns:
+            The final path and whether the content was already stored.
+        """
+        path = self.path_for(digest, extension)
+        if os.path.exists(path):
+            return path, True
+        fd, tmp_path = self.temp_file()
+        os.close(fd)
+        try:
+            os.remove(tmp_path)
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                # E.g. another file system.
+                shutil.copyfile(source, tmp_path)
+            return self.commit(tmp_path, digest, extension)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+
+    @staticmethod
+    def discard(tmp_path: str, file: Optional[BinaryIO] = None) -> None:
+        """Close and delete a temporary file, if it exists."""
+        if file is not None:
+            file.close()
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+class ImagePipeline:
+    """Downloads image chunks into an ``ImageStore`` and renders variants."""
+
+    def __init__(
+        self,
+        config: MaterializeConfig,
+        transport: Optional[HTTPTransport] = None,
+        executor: Optional[Executor] = None
+    ):
+        """Initialize the pipeline.
+
+        Args:
+            config: The pipeline configuration.
+            transport: Optional shared HTTP transport.
+            executor: Optional executor for variant rendering. Defaults to a
+                process pool created on first use.
+        """
+        self.config = config
+        self.store = ImageStore(config.root)
+        self._owns_transport = transport is None
+        self._transport = transport or HTTPTransport()
+        self._owns_executor = executor is None
+        self._executor = executor
+        self._limit: Optional[asyncio.Semaphore] = None
+        self._variants_enabled = bool(config.variants)
+        if self._variants_enabled:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                logger.warning("Pillow is not installed; image variants are disabled")
+                self._variants_enabled = False
+
+    async def __aenter__(self) -> "ImagePipeline":
+        """Enter the pipeline context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Release resources when exiting context."""
+        await self.close()
+
+    async def close(self) -> None:
+        """Shut down the owned transport and process pool."""
+        if self._owns_transport:
+            await self._transport.close()
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def materialize(self, response: GenerationResponse) -> GenerationResponse:
+        """Store all images of a response locally.
+
+        Image chunks are replaced by copies whose metadata contains
+        ``local_path``, ``sha256``, ``size`` and, if rendered, ``variants``.
+        Chunks that fail to download keep their URL and get an
+        ``materialize_error`` entry instead.
+
+        Args:
+            response: A generation response.
+
+        Returns:
+            The response with materialized image chunks.
+        """
+        if not response.success:
+            return response
+        chunks = await asyncio.gather(*(self.materialize_chunk(chunk) for chunk in response.chunks))
+        return replace(response, chunks=list(chunks))
+
+    async def materialize_chunk(self, chunk: ContentChunk) -> ContentChunk:
+        """Store one image chunk locally.
+
+        Args:
+            chunk: A content chunk. Non-image chunks are returned unchanged.
+
+        Returns:
+            The chunk with local file information in its metadata.
+        """
+        if chunk.type is not ContentType.IMAGE:
+            return chunk
+
+        metadata = dict(chunk.metadata or {})
+        try:
+            if chunk.content.startswith("file:"):
+                path, digest, size, existed = await self._import(chunk.content)
+            else:
+                path, digest, size, existed = await self._download(chunk.content)
+            metadata.update(local_path=path, sha256=digest, size=size, deduplicated=existed)
+            if self._variants_enabled:
+                metadata["variants"] = await self._render_variants(path, digest)
+        except Exception as e:
+            logger.warning("Failed to materialize %s: %s", chunk.content, e)
+            metadata["materialize_error"] = str(e)
+        return replace(chunk, metadata=metadata)
+
+    async def _download(self, url: str) -> Tuple[str, str, int, bool]:
+        """Stream a URL to the store while hashing it."""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.config.concurrency)
+
+        async with self._limit:
+            session = await self._transport.session_for(url)
+            fd, tmp_path = await asyncio.to_thread(self.store.temp_file)
+            f = os.fdopen(fd, "wb")
+            digest = hashlib.sha256()
+            size = 0
+
+            def write(data: bytes) -> None:
+                digest.update(data)
+                f.write(data)
+
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    extension = self._extension(response.content_type, url)
+                    async for data in response.content.iter_chunked(self.config.chunk_size):
+                        size += len(data)
+                        if self.config.max_bytes is not None and size > self.config.max_bytes:
+                            raise ValueError(f"Image exceeds {self.config.max_bytes} bytes")
+                        await asyncio.to_thread(write, data)
+                await asyncio.to_thread(f.close)
+                hex_digest = digest.hexdigest()
+                path, existed = await asyncio.to_thread(self.store.commit, tmp_path, hex_digest, extension)
+            except BaseException:
+                await asyncio.shield(asyncio.to_thread(self.store.discard, tmp_path, f))
+                raise
+        return path, hex_digest, size, existed
+
+    async def _import(self, url: str) -> Tuple[str, str, int, bool]:
+        """Hash a local ``file://`` image and add it to the store."""
+        source = url2pathname(urlsplit(url).path)
+        return await asyncio.to_thread(self._import_file, source)
+
+    def _import_file(self, source: str) -> Tuple[str, str, int, bool]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(source, "rb") as f:
+            while data := f.read(self.config.chunk_size):
+                size += len(data)
+                if self.config.max_bytes is not None and size > self.config.max_bytes:
+                    raise ValueError(f"Image exceeds {self.config.max_bytes} bytes")
+                digest.update(data)
+        hex_digest = digest.hexdigest()
+        _, extension = os.path.splitext(source)
+        path, existed = self.store.add_file(source, hex_digest, extension or ".bin")
+        return path, hex_digest, size, existed
+
+    async def _render_variants(self, path: str, digest: str) -> Dict[str, str]:
+        """Render all configured variants of a stored image."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.config.max_workers)
+        loop = asyncio.get_running_loop()
+        names = list(self.config.variants)
+        paths = await asyncio.gather(*(
+            loop.run_in_executor(
+                self._executor,
+                _render_variant,
+                path,
+                self.store.variant_path(digest, name, self.config.variant_format),
+                self.config.variants[name],
+                self.config.variant_format,
+            )
+            for name in names
+        ))
+        return dict(zip(names, paths))
+
+    @staticmethod
+    def _extension(content_type: str, url: str) -> str:
+        """Choose a file extension from the content type or URL."""
+        extension = mimetypes.guess_extension(content_type or "")
+        if extension:
+            return ".jpg" if extension == ".jpe" else extension
+        _, extension = os.path.splitext(url.split("?", 1)[0])
+        return extension if 1 < len(extension) <= 5 else ".bin"
+
+class MaterializingModel(ModelWrapper):
+    """Model wrapper that stores the images of successful responses locally.
+
+    Chunks passed to the callback still carry the provider URLs; the
+    returned response carries the local paths.
+    """
+
+    def __init__(self, model: AIModel, pipeline: ImagePipeline):
+        """Initialize the materializing model.
+
+        Args:
+            model: The model to wrap.
+            pipeline: The pipeline storing the images, possibly shared.
+        """
+        super().__init__(model)
+        self.pipeline = pipeline
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content and materialize its images.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse whose image chunks reference local files.
+        """
+        response = await self.model.generate(request, callback)
+        return await self.pipeline.materialize(response)
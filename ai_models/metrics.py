@@ -0,0 +1,571 @@
+"""Phase-level latency instrumentation and Prometheus metrics.
+
+Models with an ``Instrumentation`` attached start a ``RequestTrace`` per
+upstream call and mark its phases: request build and signing, connection
+acquire, first byte, first chunk, first image and total. Finished traces
+are aggregated into histograms and counters labelled by provider and model,
+which ``MetricsRegistry.render_prometheus`` exposes in the Prometheus text
+format. Connection acquire times come from an ``aiohttp`` trace config; see
+``Instrumentation.trace_config``.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .base import ContentChunk, ContentType, ProviderError
+
+logger = logging.getLogger(__name__)
+
+# Phases of a request. Build and connect are durations, summed over all
+# upstream calls of a request; the others are offsets from its start.
+PHASE_BUILD = "build"
+PHASE_CONNECT = "connect"
+PHASE_FIRST_BYTE = "first_byte"
+PHASE_FIRST_CHUNK = "first_chunk"
+PHASE_FIRST_IMAGE = "first_image"
+PHASE_TOTAL = "total"
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Format a label set, optionally followed by an extra preformatted label."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        """Initialize the counter.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The label names.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        """Increase the counter.
+
+        Args:
+            amount: The non-negative increment.
+            *labels: The label values, in the order of the label names.
+        """
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Get the value of one series."""
+        return self._values.get(labels, 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the JSON-compatible state of the counter, for ``MetricsRegistry.merge``."""
+        return {
+            "kind": self.kind,
+            "documentation": self.documentation,
+            "labels": list(self.labels),
+            "series": [[list(labels), value] for labels, value in self._values.items()],
+        }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Add the series of a snapshot to this metric."""
+        for labels, value in snapshot["series"]:
+            self.inc(value, *labels)
+
+    def render(self) -> List[str]:
+        """Render the counter in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+class Gauge(Counter):
+    """Value with labels that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the value of one series.
+
+        Args:
+            value: The new value.
+            *labels: The label values, in the order of the label names.
+        """
+        self._values[labels] = value
+
+    def dec(self, amount: float = 1.0, *labels: str) -> None:
+        """Decrease the value of one series."""
+        self.inc(-amount, *labels)
+
+    def render(self) -> List[str]:
+        """Render the gauge in the Prometheus text format."""
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    """Cumulative histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        """Initialize the histogram.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The label names.
+            buckets: Sorted upper bounds of the buckets, without ``+Inf``.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: bucket counts (plus one overflow bucket), sum and count.
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation.
+
+        Args:
+            value: The observed value.
+            *labels: The label values, in the order of the label names.
+        """
+        series = self._series.get(labels)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._series[labels] = series
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        """Get the number of observations of one series."""
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the JSON-compatible state of the histogram, for ``MetricsRegistry.merge``."""
+        return {
+            "kind": self.kind,
+            "documentation": self.documentation,
+            "labels": list(self.labels),
+            "buckets": list(self.buckets),
+            "series": [[list(labels), *series] for labels, series in self._series.items()],
+        }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Add the series of a snapshot with the same buckets to this metric."""
+        if tuple(snapshot["buckets"]) != self.buckets:
+            raise ValueError(f"Cannot merge histogram {self.name} with different buckets")
+        for labels, counts, total, count in snapshot["series"]:
+            series = self._series.setdefault(
+                tuple(labels), [[0] * (len(self.buckets) + 1), 0.0, 0]
+            )
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+            series[2] += count
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+                )
+            label_text = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        """Get or create a counter.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The label names.
+
+        Returns:
+            The counter registered under ``name``.
+        """
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The label names.
+
+        Returns:
+            The gauge registered under ``name``.
+        """
+        return self._get_or_create(Gauge, name, documentation, labels)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Get or create a histogram.
+
+        Args:
+            name: The metric name.
+            documentation: The help text.
+            labels: The label names.
+            buckets: The bucket upper bounds.
+
+        Returns:
+            The histogram registered under ``name``.
+        """
+        return self._get_or_create(Histogram, name, documentation, labels, buckets=buckets)
+
+    def _get_or_create(self, cls, name: str, documentation: str, labels: Sequence[str], **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = cls(name, documentation, labels, **kwargs)
+            self._metrics[name] = metric
+        elif type(metric) is not cls:
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the JSON-compatible state of all metrics.
+
+        Snapshots let processes ship their metrics to one registry that
+        renders them together; see ``merge``.
+
+        Returns:
+            The state of each metric, by name.
+        """
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def merge(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
+        """Add the metrics of a snapshot to this registry.
+
+        Counters, gauges and histograms are summed series by series, so
+        merging the snapshots of several processes yields the totals.
+
+        Args:
+            snapshot: A snapshot returned by ``snapshot``.
+        """
+        kinds = {cls.kind: cls for cls in (Counter, Gauge, Histogram)}
+        for name, state in snapshot.items():
+            kwargs = {"buckets": state["buckets"]} if "buckets" in state else {}
+            metric = self._get_or_create(
+                kinds[state["kind"]], name, state["documentation"], state["labels"], **kwargs
+            )
+            metric.merge(state)
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics text.
+        """
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+@dataclass
+class Span:
+    """A timed phase of one request, relative to the request start.
+
+    Attributes:
+        name: The phase name.
+        start: Start offset in seconds.
+        end: End offset in seconds.
+    """
+    name: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        """Length of the span in seconds."""
+        return self.end - self.start
+
+class RequestTrace:
+    """Timings and counters of one generation request."""
+
+    def __init__(
+        self,
+        instrumentation: Optional["Instrumentation"],
+        provider: str,
+        model: str,
+        record_spans: bool = False
+    ):
+        """Initialize the trace. Use ``Instrumentation.start`` instead.
+
+        Args:
+            instrumentation: The instrumentation receiving the finished trace.
+            provider: The provider name.
+            model: The model ID.
+            record_spans: Whether to keep individual spans.
+        """
+        self.instrumentation = instrumentation
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.durations: Dict[str, float] = {}
+        self.spans: Optional[List[Span]] = [] if record_spans else None
+        self.bytes = 0
+        self.chunks = 0
+        self.outcome: Optional[str] = None
+
+    def elapsed(self) -> float:
+        """Seconds since the start of the request."""
+        return time.perf_counter() - self.started
+
+    def mark(self, phase: str) -> None:
+        """Record the first time a phase is reached.
+
+        Args:
+            phase: The phase name.
+        """
+        if phase not in self.marks:
+            self.marks[phase] = self.elapsed()
+
+    def add_duration(self, phase: str, start: float, end: float) -> None:
+        """Add a timed interval to a duration phase.
+
+        Args:
+            phase: The phase name.
+            start: Start offset in seconds.
+            end: End offset in seconds.
+        """
+        self.durations[phase] = self.durations.get(phase, 0.0) + (end - start)
+        if self.spans is not None:
+            self.spans.append(Span(phase, start, end))
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        """Time a block of code as a duration phase.
+
+        Args:
+            phase: The phase name.
+        """
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            self.add_duration(phase, start, self.elapsed())
+
+    def add_bytes(self, count: int) -> None:
+        """Count bytes received from the upstream."""
+        self.bytes += count
+
+    def add_chunk(self, chunk: ContentChunk) -> None:
+        """Count a content chunk and mark the first chunk and image phases."""
+        self.chunks += 1
+        self.mark(PHASE_FIRST_CHUNK)
+        if chunk.type is ContentType.IMAGE:
+            self.mark(PHASE_FIRST_IMAGE)
+
+    def finish(self, error: Optional[BaseException] = None, error_code: Optional[str] = None) -> None:
+        """Complete the trace and report it. Further calls are ignored.
+
+        Args:
+            error: The exception that ended the request, if any.
+            error_code: The error code of a failed request, if known.
+        """
+        if self.outcome is not None:
+            return
+        self.mark(PHASE_TOTAL)
+        if error_code is None and error is not None:
+            error_code = _classify(error)
+        self.outcome = error_code or "ok"
+        if self.spans is not None:
+            self.spans.append(Span(PHASE_TOTAL, 0.0, self.marks[PHASE_TOTAL]))
+        if self.instrumentation is not None:
+            self.instrumentation.record(self)
+
+class _NullTrace(RequestTrace):
+    """Trace used when a model has no instrumentation; records nothing."""
+
+    def __init__(self):
+        super().__init__(None, "", "")
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def add_duration(self, phase: str, start: float, end: float) -> None:
+        pass
+
+    @contextmanager
+    def span(self, phase: str) -> Iterator[None]:
+        yield
+
+    def add_bytes(self, count: int) -> None:
+        pass
+
+    def add_chunk(self, chunk: ContentChunk) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None, error_code: Optional[str] = None) -> None:
+        pass
+
+NULL_TRACE: RequestTrace = _NullTrace()
+
+def _classify(error: BaseException) -> str:
+    """Get the outcome label of a request that ended with an exception."""
+    if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+        return "cancelled"
+    if isinstance(error, ProviderError):
+        return error.code.value
+    from .transport import error_code_for
+    return error_code_for(error).value
+
+# Called with every finished trace, e.g. to export spans.
+TraceListener = Callable[[RequestTrace], None]
+
+class Instrumentation:
+    """Aggregates request traces into a metrics registry."""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, record_spans: bool = False):
+        """Initialize the instrumentation.
+
+        Args:
+            registry: Optional registry for the metrics. A new one is created
+                if omitted.
+            record_spans: Whether traces keep individual spans for listeners.
+        """
+        self.registry = registry or MetricsRegistry()
+        self.record_spans = record_spans
+        self.listeners: List[TraceListener] = []
+        self.phase_seconds = self.registry.histogram(
+            "ai_model_phase_seconds",
+            "Latency of generation request phases.",
+            ("provider", "model", "phase"),
+        )
+        self.requests = self.registry.counter(
+            "ai_model_requests_total",
+            "Generation requests by outcome.",
+            ("provider", "model", "outcome"),
+        )
+        self.received_bytes = self.registry.counter(
+            "ai_model_received_bytes_total",
+            "Bytes received from upstreams.",
+            ("provider", "model"),
+        )
+        self.received_chunks = self.registry.counter(
+            "ai_model_chunks_total",
+            "Content chunks produced.",
+            ("provider", "model"),
+        )
+
+    def start(self, provider: str, model: str) -> RequestTrace:
+        """Start tracing a request.
+
+        Args:
+            provider: The provider name.
+            model: The model ID.
+
+        Returns:
+            The trace; pass it as ``trace_request_ctx`` to ``aiohttp`` calls.
+        """
+        return RequestTrace(self, provider, model, self.record_spans)
+
+    def record(self, trace: RequestTrace) -> None:
+        """Aggregate a finished trace.
+
+        Args:
+            trace: The finished trace.
+        """
+        provider, model = trace.provider, trace.model
+        for phase, seconds in trace.durations.items():
+            self.phase_seconds.observe(seconds, provider, model, phase)
+        for phase, seconds in trace.marks.items():
+            self.phase_seconds.observe(seconds, provider, model, phase)
+        self.requests.inc(1, provider, model, trace.outcome or "ok")
+        self.received_bytes.inc(trace.bytes, provider, model)
+        self.received_chunks.inc(trace.chunks, provider, model)
+        for listener in self.listeners:
+            try:
+                listener(trace)
+            except Exception:
+                logger.exception("Trace listener failed")
+
+    def trace_config(self):
+        """Create an ``aiohttp`` trace config recording connection acquire times.
+
+        Pass it to ``HTTPTransport(trace_configs=[...])``. Requests made with
+        a ``RequestTrace`` as ``trace_request_ctx`` get a ``connect`` phase
+        covering the wait for a pooled or new connection.
+
+        Returns:
+            The ``aiohttp.TraceConfig``.
+        """
+        import aiohttp
+
+        def trace_of(context) -> Optional[RequestTrace]:
+            trace = getattr(context, "trace_request_ctx", None)
+            return trace if isinstance(trace, RequestTrace) else None
+
+        async def on_request_start(session, context, params) -> None:
+            trace = trace_of(context)
+            if trace is not None:
+                context.connect_started = trace.elapsed()
+
+        async def on_connection_acquired(session, context, params) -> None:
+            trace = trace_of(context)
+            started = getattr(context, "connect_started", None)
+            if trace is not None and started is not None:
+                trace.add_duration(PHASE_CONNECT, started, trace.elapsed())
+                context.connect_started = None
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(on_request_start)
+        config.on_connection_create_end.append(on_connection_acquired)
+        config.on_connection_reuseconn.append(on_connection_acquired)
+        return config
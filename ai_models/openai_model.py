@@ -1,8 +1,10 @@
 """OpenAI model implementation."""
 
-import json
+import asyncio
 import logging
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
+from functools import partial
+from typing import Optional, List, Dict, Any, AsyncIterator
 import aiohttp
 from .base import (
     AIModel,
@@ -11,33 +13,109 @@ from .base import (
     GenerationResponse,
     ContentChunk,
     ContentType,
-    ContentCallback
+    ContentCallback,
+    ErrorCode,
+    ProviderError
 )
+from .deadline import NO_DEADLINE, Deadline
+from .metrics import NULL_TRACE, PHASE_BUILD, PHASE_FIRST_BYTE, RequestTrace
+from .sse import SSEDecoder, SSEEvent, IMAGE_URL_PATTERN, json_dumps, json_loads
+from .transport import HTTPTransport, error_code_for, provider_error_from, request_timeout
 
 logger = logging.getLogger(__name__)
 
+IMAGE_URL_PREFIX = "https://storage.theapi.app/image/"
+
+# OpenAI model definitions
+OPENAI_MODELS: List[Dict[str, Any]] = [
+    {
+        "id": "gpt-4o-image",
+        "name": "GPT-4 with Image Generation",
+        "description": "Advanced model with image generation capabilities",
+        "max_images": 1,
+        "category": "OpenAI",
+        "img2img": True,
+    }
+]
+
+@dataclass
+class CoalesceConfig:
+    """Coalescing of streamed text deltas into fewer, larger chunks.
+
+    The first delta is emitted at once, so time to first chunk does not
+    change. Later text is buffered and emitted when it reaches
+    ``max_chars``, when it is older than ``flush_interval``, before an image
+    chunk and at the end of the stream, so chunk order is preserved.
+
+    Attributes:
+        max_chars: Emit the buffered text once it has this many characters.
+        flush_interval: Maximum seconds text is held back, or 0 to only
+            coalesce deltas that arrive in the same network read.
+    """
+    max_chars: int = 256
+    flush_interval: float = 0.05
+
+class _TextBuffer:
+    """Text deltas waiting to be emitted as one chunk."""
+
+    __slots__ = ("parts", "size", "started")
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.size = 0
+        self.started = 0.0
+
+    def add(self, text: str, now: float) -> None:
+        if not self.parts:
+            self.started = now
+        self.parts.append(text)
+        self.size += len(text)
+
+    def take(self) -> ContentChunk:
+        text = self.parts[0] if len(self.parts) == 1 else "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return ContentChunk(type=ContentType.TEXT, content=text)
+
 class OpenAIModel(AIModel):
     """OpenAI model implementation."""
+
+    provider = "openai"
     
-    def __init__(self, config: ModelConfig):
+    def __init__(
+        self,
+        config: ModelConfig,
+        transport: Optional[HTTPTransport] = None,
+        coalesce: Optional[CoalesceConfig] = None
+    ):
         """Initialize OpenAI model.
         
         Args:
             config: The model configuration.
+            transport: Optional shared HTTP transport. When omitted the model
+                owns a private transport that is closed by ``close()``.
+            coalesce: Optional coalescing of streamed text deltas. By default
+                every delta becomes its own chunk.
         """
         self.config = config
+        self.coalesce = coalesce
         self.endpoint = config.endpoint or "https://api.piapi.ai/v1/chat/completions"
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.default_model = config.default_model or "gpt-4o-image"
+        self._owns_transport = transport is None
+        self._transport = transport or HTTPTransport()
 
     async def __aenter__(self) -> "OpenAIModel":
-        """Create aiohttp session when entering context."""
-        self._session = aiohttp.ClientSession()
+        """Enter the model context."""
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
-        """Close aiohttp session when exiting context."""
-        if self._session:
-            await self._session.close()
+        """Release the HTTP transport when exiting context."""
+        await self.close()
+
+    async def close(self) -> None:
+        """Close the HTTP transport if it is owned by this model."""
+        if self._owns_transport:
+            await self._transport.close()
 
     async def generate(
         self,
@@ -54,104 +132,342 @@ class OpenAIModel(AIModel):
             A GenerationResponse containing the generation results.
         """
         try:
-            if not self._session:
-                self._session = aiohttp.ClientSession()
+            if callback:
+                return await self._generate_from_stream(request, callback)
 
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.config.api_key}"
-            }
-            
-            payload = {
-                "model": request.model or "gpt-4o-image",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": request.prompt
-                            }
-                        ]
-                    }
-                ],
-                "stream": callback is not None
-            }
-
-            async with self._session.post(self.endpoint, headers=headers, json=payload) as response:
-                if not response.ok:
-                    error_data = await response.json()
-                    logger.error(f"OpenAI API error: {error_data}")
-                    return GenerationResponse(
-                        success=False,
-                        chunks=[],
-                        error=error_data.get("message", f"API error: {response.status}")
-                    )
-
-                if callback:
-                    return await self._handle_stream(response, callback)
-                else:
-                    data = await response.json()
-                    return self._process_response(data)
+            trace = self._start_trace(self._model_id(request))
+            try:
+                deadline = Deadline(request)
+                deadline.check()
+                with trace.span(PHASE_BUILD):
+                    headers = self._headers()
+                    body = json_dumps(self._build_payload(request, stream=False))
+                response = await self._post(request, deadline, headers, body, trace)
+                try:
+                    async with deadline.idle():
+                        await self._check_response(response)
+                        raw = await response.read()
+                except BaseException:
+                    response.close()
+                    raise
+                finally:
+                    response.release()
+                trace.add_bytes(len(raw))
+                result = self._process_response(json_loads(raw))
+                for chunk in result.chunks:
+                    trace.add_chunk(chunk)
+                trace.finish(error_code=result.error_code)
+                return result
+            except BaseException as e:
+                trace.finish(e)
+                raise
 
+        except ProviderError as e:
+            logger.error("OpenAI API error: %s", e)
+            return e.to_response()
         except Exception as e:
             logger.exception("Error in OpenAI generation")
             return GenerationResponse(
                 success=False,
                 chunks=[],
-                error=str(e)
+                error=str(e),
+                error_code=error_code_for(e).value
             )
 
-    async def _handle_stream(
+    async def _iter_content(self, request: GenerationRequest) -> AsyncIterator[ContentChunk]:
+        """Stream content chunks from OpenAI.
+        
+        Args:
+            request: The generation request parameters.
+            
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the API returns an error.
+        """
+        trace = self._start_trace(self._model_id(request))
+        try:
+            deadline = Deadline(request)
+            deadline.check()
+            with trace.span(PHASE_BUILD):
+                headers = self._headers()
+                body = json_dumps(self._build_payload(request, stream=True))
+            response = await self._post(request, deadline, headers, body, trace)
+            try:
+                async with deadline.idle():
+                    await self._check_response(response)
+                async for chunk in self._iter_stream(response, trace, deadline):
+                    trace.add_chunk(chunk)
+                    yield chunk
+            except BaseException:
+                # Failed, cancelled or closed early by the consumer: drop the
+                # connection now instead of reading the rest of the stream.
+                response.close()
+                raise
+            finally:
+                response.release()
+        except BaseException as e:
+            trace.finish(e)
+            raise
+        trace.finish()
+
+    async def _post(
+        self,
+        request: GenerationRequest,
+        deadline: Deadline,
+        headers: Dict[str, str],
+        body: bytes,
+        trace: RequestTrace
+    ) -> aiohttp.ClientResponse:
+        """Send a completion request and wait for the response headers.
+
+        Args:
+            request: The generation request, carrying the connect timeout.
+            deadline: The deadline bounding the wait.
+            headers: The request headers.
+            body: The serialized payload.
+            trace: The trace of the request.
+
+        Returns:
+            The response; the caller must release or close it.
+
+        Raises:
+            ProviderError: If the first byte or overall deadline is exceeded.
+        """
+        session = await self._transport.session_for(self.endpoint)
+        async with deadline.first_byte():
+            response = await session.post(
+                self.endpoint,
+                headers=headers,
+                data=body,
+                timeout=request_timeout(session, deadline.connect_timeout),
+                trace_request_ctx=trace
+            )
+        trace.mark(PHASE_FIRST_BYTE)
+        return response
+
+    def _model_id(self, request: GenerationRequest) -> str:
+        """Get the model ID used for a request."""
+        return request.model or self.default_model
+
+    def _headers(self) -> Dict[str, str]:
+        """Build the request headers."""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.config.api_key}"
+        }
+
+    def _build_payload(self, request: GenerationRequest, stream: bool) -> Dict[str, Any]:
+        """Build the chat completion payload for a request.
+        
+        Args:
+            request: The generation request parameters.
+            stream: Whether to request a streaming response.
+            
+        Returns:
+            The JSON payload.
+        """
+        content: List[Dict[str, Any]] = [
+            {
+                "type": "text",
+                "text": request.prompt
+            }
+        ]
+        if request.image_url:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": request.image_url}
+            })
+        return {
+            "model": self._model_id(request),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "stream": stream
+        }
+
+    async def _check_response(self, response: aiohttp.ClientResponse) -> None:
+        """Raise a ProviderError if the response is not successful.
+        
+        Args:
+            response: The HTTP response.
+
+        Raises:
+            ProviderError: If the response status is not OK.
+        """
+        if not response.ok:
+            raise await provider_error_from(response, f"API error: {response.status}")
+
+    async def _iter_stream(
         self,
         response: aiohttp.ClientResponse,
-        callback: ContentCallback
-    ) -> GenerationResponse:
-        """Handle streaming response from OpenAI.
+        trace: RequestTrace = NULL_TRACE,
+        deadline: Deadline = NO_DEADLINE
+    ) -> AsyncIterator[ContentChunk]:
+        """Parse a streaming response from OpenAI.
         
         Args:
             response: The HTTP response.
-            callback: The callback for streaming content.
+            trace: Optional trace counting the received bytes.
+            deadline: Optional deadline bounding each read.
             
-        Returns:
-            A GenerationResponse containing the generation results.
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the idle timeout or deadline is exceeded.
         """
-        chunks: List[ContentChunk] = []
+        if self.coalesce is not None:
+            async for chunk in self._iter_coalesced(response, trace, deadline):
+                yield chunk
+            return
+
+        decoder = SSEDecoder()
+        if deadline.bounds_reads:
+            reads = deadline.iter_reads(response.content)
+        else:
+            reads = response.content.iter_any()
+        async for data in reads:
+            trace.add_bytes(len(data))
+            for event in decoder.feed(data):
+                if event.data == "[DONE]":
+                    return
+                for chunk in self._parse_event(event):
+                    yield chunk
+
+        for event in decoder.flush():
+            if event.data == "[DONE]":
+                return
+            for chunk in self._parse_event(event):
+                yield chunk
+
+    async def _iter_coalesced(
+        self,
+        response: aiohttp.ClientResponse,
+        trace: RequestTrace,
+        deadline: Deadline = NO_DEADLINE
+    ) -> AsyncIterator[ContentChunk]:
+        """Parse a streaming response, coalescing text deltas.
         
-        async for line in response.content:
-            if line.startswith(b"data: "):
-                data = line[6:].decode()
-                if data == "[DONE]":
+        Args:
+            response: The HTTP response.
+            trace: Trace counting the received bytes.
+            deadline: Optional deadline bounding each read.
+            
+        Yields:
+            The generated content chunks.
+
+        Raises:
+            ProviderError: If the idle timeout or deadline is exceeded.
+        """
+        loop = asyncio.get_running_loop()
+        max_chars = self.coalesce.max_chars
+        flush_interval = self.coalesce.flush_interval
+        stream = response.content
+        if deadline.bounds_reads:
+            read = partial(deadline.read, stream)
+        else:
+            read = stream.readany
+        decoder = SSEDecoder()
+        buffer = _TextBuffer()
+        first = True
+        done = False
+
+        while not done:
+            if buffer.parts:
+                remaining = buffer.started + flush_interval - loop.time()
+                if remaining <= 0:
+                    yield buffer.take()
+                    continue
+                data = stream.read_nowait()
+                if not data and not stream.at_eof():
+                    try:
+                        # Cancelling a pending read leaves the stream intact.
+                        async with asyncio.timeout(remaining):
+                            data = await read()
+                    except TimeoutError:
+                        yield buffer.take()
+                        continue
+            else:
+                data = await read()
+
+            if data:
+                trace.add_bytes(len(data))
+                events = decoder.feed(data)
+            else:
+                events = decoder.flush()
+                done = True
+
+            for event in events:
+                if event.data == "[DONE]":
+                    done = True
                     break
-                
-                try:
-                    parsed = json.loads(data)
-                    if parsed["choices"][0]["delta"]["content"]:
-                        content = parsed["choices"][0]["delta"]["content"]
-                        
-                        if "https://storage.theapi.app/image/" in content:
-                            image_match = content.match(r"https://storage\.theapi\.app/image/[^)]+")
-                            if image_match:
-                                chunk = ContentChunk(
-                                    type=ContentType.IMAGE,
-                                    content=image_match[0]
-                                )
-                                chunks.append(chunk)
-                                await callback(chunk)
-                        else:
-                            chunk = ContentChunk(
-                                type=ContentType.TEXT,
-                                content=content
-                            )
-                            chunks.append(chunk)
-                            await callback(chunk)
-                except Exception as e:
-                    logger.error(f"Error parsing chunk: {e}")
+                content = self._event_content(event)
+                if not content:
+                    continue
+                if IMAGE_URL_PREFIX in content:
+                    if buffer.parts:
+                        yield buffer.take()
+                    for chunk in self._content_chunks(content):
+                        yield chunk
+                    continue
+                buffer.add(content, loop.time())
+                if first or buffer.size >= max_chars:
+                    first = False
+                    yield buffer.take()
 
-        return GenerationResponse(
-            success=True,
-            chunks=chunks
-        )
+        if buffer.parts:
+            yield buffer.take()
+
+    def _parse_event(self, event: SSEEvent) -> List[ContentChunk]:
+        """Convert one streamed completion event to content chunks.
+        
+        Args:
+            event: The decoded SSE event.
+            
+        Returns:
+            An image chunk per image URL in the delta, or a single text chunk.
+        """
+        content = self._event_content(event)
+        if not content:
+            return []
+        return self._content_chunks(content)
+
+    def _event_content(self, event: SSEEvent) -> Optional[str]:
+        """Extract the delta content of one streamed completion event.
+        
+        Args:
+            event: The decoded SSE event.
+            
+        Returns:
+            The content, or None if the event has none or cannot be parsed.
+        """
+        try:
+            parsed = json_loads(event.data)
+            return parsed["choices"][0]["delta"].get("content")
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            logger.error(f"Error parsing chunk: {e}")
+            return None
+
+    def _content_chunks(self, content: str) -> List[ContentChunk]:
+        """Convert delta content to content chunks.
+        
+        Args:
+            content: The delta content.
+            
+        Returns:
+            An image chunk per image URL in the content, or a single text chunk.
+        """
+        if IMAGE_URL_PREFIX in content:
+            return [
+                ContentChunk(type=ContentType.IMAGE, content=url)
+                for url in IMAGE_URL_PATTERN.findall(content)
+            ]
+        return [ContentChunk(type=ContentType.TEXT, content=content)]
 
     def _process_response(self, data: Dict[str, Any]) -> GenerationResponse:
         """Process non-streaming response from OpenAI.
@@ -176,26 +492,21 @@ class OpenAIModel(AIModel):
         return GenerationResponse(
             success=False,
             chunks=[],
-            error="Invalid response format"
+            error="Invalid response format",
+            error_code=ErrorCode.UPSTREAM_ERROR.value
         )
 
-    def get_available_models(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    def get_available_models() -> List[Dict[str, Any]]:
         """Get list of available OpenAI models.
         
         Returns:
             A list of dictionaries containing model information.
         """
-        return [
-            {
-                "id": "gpt-4o-image",
-                "name": "GPT-4 with Image Generation",
-                "description": "Advanced model with image generation capabilities",
-                "max_images": 1,
-                "category": "OpenAI"
-            }
-        ]
+        return OPENAI_MODELS
 
-    def supports_streaming(self, model: str) -> bool:
+    @staticmethod
+    def supports_streaming(model: str) -> bool:
         """Check if the specified model supports streaming.
         
         Args:
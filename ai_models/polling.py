@@ -0,0 +1,216 @@
+"""Shared scheduler for polling asynchronous upstream tasks.
+
+Providers that support submit/poll workflows register a poll function per
+task with a ``TaskPoller``. One scheduler coroutine polls every task that
+is due in a batch, with bounded concurrency, and backs each task off
+exponentially while it is still pending. Callers simply await the result,
+so no connection is held while an upstream job renders.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from .base import ErrorCode, ProviderError
+
+logger = logging.getLogger(__name__)
+
+# A poll function returns ``(done, result)``; it raises to fail the task.
+PollFunction = Callable[[], Awaitable[Tuple[bool, Any]]]
+
+@dataclass
+class PollConfig:
+    """Configuration of the task poller.
+
+    Attributes:
+        initial_interval: Seconds before the first poll of a task.
+        max_interval: Upper bound of the interval between polls of a task.
+        backoff: Factor applied to a task's interval after each pending poll.
+        max_concurrency: Maximum number of polls in flight at once.
+        task_timeout: Seconds after which a pending task fails.
+    """
+    initial_interval: float = 0.5
+    max_interval: float = 5.0
+    backoff: float = 1.5
+    max_concurrency: int = 16
+    task_timeout: float = 300.0
+
+class _PendingTask:
+    """A task registered with the poller."""
+
+    __slots__ = ("key", "poll", "future", "interval", "deadline", "polls", "polling")
+
+    def __init__(self, key: str, poll: PollFunction, future: "asyncio.Future[Any]",
+                 interval: float, deadline: float):
+        self.key = key
+        self.poll = poll
+        self.future = future
+        self.interval = interval
+        self.deadline = deadline
+        self.polls = 0
+        # The poll in flight, if any.
+        self.polling: Optional["asyncio.Task[None]"] = None
+
+class TaskPoller:
+    """Batched, adaptive poller for many outstanding upstream tasks."""
+
+    def __init__(self, config: Optional[PollConfig] = None):
+        """Initialize the poller.
+
+        Args:
+            config: Optional poller configuration.
+        """
+        self.config = config or PollConfig()
+        self._queue: List[Tuple[float, int, _PendingTask]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional["asyncio.Task[None]"] = None
+        self.polls_total = 0
+        self._outstanding = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of tasks still waiting for a result."""
+        return self._outstanding
+
+    async def wait(self, poll: PollFunction, key: str = "") -> Any:
+        """Register a task and wait for its result.
+
+        Args:
+            poll: Function polling the task once.
+            key: Optional task identifier used in logs and errors.
+
+        Returns:
+            The result returned by ``poll`` once it reports done.
+
+        Raises:
+            ProviderError: If the task times out.
+            Exception: Any exception raised by ``poll``.
+
+        If the caller is cancelled, a poll in flight is cancelled as well.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        task = _PendingTask(
+            key,
+            poll,
+            loop.create_future(),
+            self.config.initial_interval,
+            now + self.config.task_timeout,
+        )
+        self._schedule(task, now + task.interval)
+        self._ensure_running()
+        self._outstanding += 1
+        try:
+            return await task.future
+        finally:
+            self._outstanding -= 1
+            if not task.future.done():
+                task.future.cancel()
+            polling = task.polling
+            if task.future.cancelled() and polling is not None and not polling.done():
+                polling.cancel()
+                await asyncio.gather(polling, return_exceptions=True)
+
+    def _schedule(self, task: _PendingTask, due: float) -> None:
+        heapq.heappush(self._queue, (due, next(self._counter), task))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Scheduler loop; exits once no tasks are left."""
+        loop = asyncio.get_running_loop()
+        limit = asyncio.Semaphore(self.config.max_concurrency)
+        in_flight: Set["asyncio.Task[None]"] = set()
+
+        def finished(poll_task: "asyncio.Task[None]") -> None:
+            in_flight.discard(poll_task)
+            self._wakeup.set()
+
+        try:
+            while self._queue or in_flight:
+                self._wakeup.clear()
+                now = loop.time()
+                while self._queue and self._queue[0][0] <= now:
+                    _, _, task = heapq.heappop(self._queue)
+                    if not task.future.done():
+                        poll_task = asyncio.create_task(self._poll(task, limit))
+                        task.polling = poll_task
+                        in_flight.add(poll_task)
+                        poll_task.add_done_callback(finished)
+
+                timeout = self._queue[0][0] - now if self._queue else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for poll_task in list(in_flight):
+                poll_task.cancel()
+
+    async def _poll(self, task: _PendingTask, limit: asyncio.Semaphore) -> None:
+        """Poll one task and resolve or reschedule it."""
+        loop = asyncio.get_running_loop()
+        async with limit:
+            if task.future.done():
+                return
+            task.polls += 1
+            self.polls_total += 1
+            try:
+                done, result = await task.poll()
+            except Exception as e:
+                if not task.future.done():
+                    task.future.set_exception(e)
+                return
+
+        if task.future.done():
+            return
+        if done:
+            task.future.set_result(result)
+            return
+
+        now = loop.time()
+        if now >= task.deadline:
+            task.future.set_exception(ProviderError(
+                f"Task {task.key} did not finish within {self.config.task_timeout}s",
+                code=ErrorCode.TIMEOUT
+            ))
+            return
+        task.interval = min(self.config.max_interval, task.interval * self.config.backoff)
+        self._schedule(task, min(now + task.interval, task.deadline))
+
+    async def close(self) -> None:
+        """Cancel all outstanding tasks and stop the scheduler."""
+        for _, _, task in self._queue:
+            if not task.future.done():
+                task.future.cancel()
+        self._queue.clear()
+        if self._runner is not None and not self._runner.done():
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+
+_default_pollers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TaskPoller]" = (
+    weakref.WeakKeyDictionary()
+)
+
+def default_poller() -> TaskPoller:
+    """Get the poller shared by all models on the running event loop.
+
+    Returns:
+        The shared TaskPoller.
+    """
+    loop = asyncio.get_running_loop()
+    poller = _default_pollers.get(loop)
+    if poller is None:
+        poller = TaskPoller()
+        _default_pollers[loop] = poller
+    return poller
@@ -0,0 +1,386 @@
+"""Per-provider, per-key rate limiting with adaptive concurrency.
+
+Each limiter combines a token bucket, which caps the request rate, with an
+additive-increase/multiplicative-decrease (AIMD) concurrency window, which
+shrinks when the upstream throttles or fails and grows again on success.
+Limiters are keyed by provider and API key, so models sharing a key share
+its limits. Wrap a model with ``RateLimitedModel`` to apply them.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, FrozenSet, Optional, Tuple, Any
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentCallback,
+    ErrorCode
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RateLimitConfig:
+    """Configuration of one rate limiter.
+
+    Attributes:
+        rate: Sustained requests per second.
+        burst: Maximum number of requests that may start at once.
+        initial_concurrency: Starting size of the concurrency window.
+        min_concurrency: Lower bound of the concurrency window.
+        max_concurrency: Upper bound of the concurrency window.
+        increase: Window growth per full window of successful requests.
+        decrease: Factor applied to the window when the upstream pushes back.
+            Requests that started before the last decrease do not shrink the
+            window again, so one burst of failures only counts once.
+        throttle_codes: Error codes that count as upstream push-back.
+    """
+    rate: float = 10.0
+    burst: int = 10
+    initial_concurrency: int = 4
+    min_concurrency: int = 1
+    max_concurrency: int = 64
+    increase: float = 1.0
+    decrease: float = 0.5
+    throttle_codes: FrozenSet[str] = field(default_factory=lambda: frozenset({
+        ErrorCode.RATE_LIMITED.value,
+        ErrorCode.UPSTREAM_ERROR.value,
+    }))
+
+class TokenBucket:
+    """Token bucket limiting the rate at which requests start."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        """Initialize the bucket.
+
+        Args:
+            rate: Tokens added per second.
+            burst: Bucket capacity.
+            clock: Monotonic clock used for refills.
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def tokens(self) -> float:
+        """Number of tokens currently available."""
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a while, e.g. after ``Retry-After``.
+
+        Args:
+            seconds: How long to pause.
+        """
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # Waiters are served in FIFO order by the lock.
+        async with self._lock:
+            while True:
+                now = self._clock()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+class AIMDWindow:
+    """Concurrency window with additive increase and multiplicative decrease."""
+
+    def __init__(self, config: RateLimitConfig, clock: Callable[[], float] = time.monotonic):
+        """Initialize the window.
+
+        Args:
+            config: The rate limit configuration.
+            clock: Monotonic clock used to order requests and decreases.
+        """
+        self.config = config
+        self.size = float(config.initial_concurrency)
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._waiters: "Deque[asyncio.Future[None]]" = deque()
+
+    @property
+    def limit(self) -> int:
+        """Current number of requests allowed in flight."""
+        return max(self.config.min_concurrency, int(self.size))
+
+    async def acquire(self) -> float:
+        """Wait for a free slot in the window and take it.
+
+        Returns:
+            The time the slot was granted, to be passed to ``release``.
+        """
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return self._clock()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation.
+                self.in_flight -= 1
+                self._wake()
+            elif waiter in self._waiters:
+                # ``_wake`` may already have dropped the cancelled waiter.
+                self._waiters.remove(waiter)
+            raise
+        return self._clock()
+
+    def release(self, started: float, throttled: bool, succeeded: bool) -> None:
+        """Return a slot and adapt the window.
+
+        Args:
+            started: The value returned by ``acquire``.
+            throttled: Whether the upstream pushed back on the request.
+            succeeded: Whether the request succeeded.
+        """
+        config = self.config
+        if throttled:
+            if started >= self._last_decrease:
+                self.size = max(config.min_concurrency, self.size * config.decrease)
+                self._last_decrease = self._clock()
+        elif succeeded:
+            self.size = min(config.max_concurrency, self.size + config.increase / self.size)
+
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Hand free slots to waiters in FIFO order."""
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+class RateLimiter:
+    """Token bucket plus AIMD window, with queue-wait metrics."""
+
+    def __init__(self, config: Optional[RateLimitConfig] = None):
+        """Initialize the limiter.
+
+        Args:
+            config: Optional rate limit configuration.
+        """
+        self.config = config or RateLimitConfig()
+        self.bucket = TokenBucket(self.config.rate, self.config.burst)
+        self.window = AIMDWindow(self.config)
+        self.waiting = 0
+        self.acquired_total = 0
+        self.throttled_total = 0
+        self.expired_total = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """Wait for permission to send a request.
+
+        Args:
+            timeout: Optional maximum seconds to wait, e.g. the time left
+                until the request's deadline.
+
+        Returns:
+            A permit to pass to ``release`` once the request is done.
+
+        Raises:
+            TimeoutError: If no permission was granted within ``timeout``.
+        """
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            async with asyncio.timeout(timeout):
+                permit = await self.window.acquire()
+                try:
+                    await self.bucket.acquire()
+                except BaseException:
+                    self.window.release(permit, throttled=False, succeeded=False)
+                    raise
+        except TimeoutError:
+            self.expired_total += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.monotonic() - start
+        self.acquired_total += 1
+        self.wait_seconds_total += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return permit
+
+    def release(self, permit: float, response: Optional[GenerationResponse]) -> None:
+        """Report the outcome of a request started with ``acquire``.
+
+        Args:
+            permit: The value returned by ``acquire``.
+            response: The response, or None if the request was aborted.
+        """
+        throttled = bool(
+            response is not None
+            and not response.success
+            and response.error_code in self.config.throttle_codes
+        )
+        if throttled:
+            self.throttled_total += 1
+            retry_after = (response.metadata or {}).get("retry_after")
+            if retry_after:
+                self.bucket.pause(float(retry_after))
+        self.window.release(
+            permit,
+            throttled=throttled,
+            succeeded=response is not None and response.success,
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the current limiter metrics.
+
+        Returns:
+            A dict of gauges and counters.
+        """
+        acquired = self.acquired_total
+        return {
+            "window": self.window.limit,
+            "in_flight": self.window.in_flight,
+            "waiting": self.waiting,
+            "tokens": round(self.bucket.tokens, 3),
+            "acquired_total": acquired,
+            "throttled_total": self.throttled_total,
+            "expired_total": self.expired_total,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_avg": self.wait_seconds_total / acquired if acquired else 0.0,
+            "wait_seconds_max": self.max_wait_seconds,
+        }
+
+class RateLimiterRegistry:
+    """Registry of rate limiters keyed by provider and API key."""
+
+    def __init__(
+        self,
+        default_config: Optional[RateLimitConfig] = None,
+        provider_configs: Optional[Dict[str, RateLimitConfig]] = None
+    ):
+        """Initialize the registry.
+
+        Args:
+            default_config: Configuration for providers without their own.
+            provider_configs: Optional per-provider configurations.
+        """
+        self.default_config = default_config or RateLimitConfig()
+        self.provider_configs = dict(provider_configs or {})
+        self._limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+    @staticmethod
+    def key_id(api_key: Optional[str]) -> str:
+        """Get a short, non-secret identifier for an API key."""
+        return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+    def get(self, provider: str, api_key: Optional[str]) -> RateLimiter:
+        """Get the limiter for a provider and API key, creating it if needed.
+
+        Args:
+            provider: The provider name.
+            api_key: The API key, if any.
+
+        Returns:
+            The shared rate limiter.
+        """
+        key = (provider, self.key_id(api_key))
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(self.provider_configs.get(provider, self.default_config))
+            self._limiters[key] = limiter
+        return limiter
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get the metrics of all limiters.
+
+        Returns:
+            A dict mapping ``provider:key_id`` to limiter metrics.
+        """
+        return {
+            f"{provider}:{key_id}": limiter.snapshot()
+            for (provider, key_id), limiter in self._limiters.items()
+        }
+
+class RateLimitedModel(ModelWrapper):
+    """Model wrapper that applies the rate limiter of its provider and key."""
+
+    def __init__(self, model: AIModel, registry: RateLimiterRegistry):
+        """Initialize the rate-limited model.
+
+        Args:
+            model: The model to wrap.
+            registry: The registry providing shared limiters.
+        """
+        super().__init__(model)
+        self.registry = registry
+
+    @property
+    def limiter(self) -> RateLimiter:
+        """The limiter for this model's provider and API key."""
+        config = self.config
+        return self.registry.get(self.provider, config.api_key if config else None)
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content once the rate limiter allows it.
+
+        The wait for the limiter ends at the request's deadline. A request
+        that could not start in time fails with ``rate_limited``.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        limiter = self.limiter
+        try:
+            permit = await limiter.acquire(request.remaining())
+        except TimeoutError:
+            return GenerationResponse(
+                success=False,
+                chunks=[],
+                error="Rate limit did not allow the request before its deadline",
+                error_code=ErrorCode.RATE_LIMITED.value
+            )
+        response: Optional[GenerationResponse] = None
+        try:
+            response = await self.model.generate(request, callback)
+            return response
+        finally:
+            limiter.release(permit, response)
@@ -0,0 +1,146 @@
+"""Lazy registry of provider implementations.
+
+Providers are registered by name with either a class or a dotted path such
+as ``"ai_models.openai_model:OpenAIModel"``. Dotted paths are imported only
+when a provider is first resolved, so importing the factory does not pull
+in provider modules or ``aiohttp``. Third-party packages can register
+providers without touching this package by declaring an entry point in the
+``ai_models.providers`` group::
+
+    [project.entry-points."ai_models.providers"]
+    stable_diffusion = "my_package.sd:StableDiffusionModel"
+"""
+
+import importlib
+import logging
+from typing import Dict, List, Optional, Type, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .base import AIModel
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "ai_models.providers"
+
+# A provider class, or the dotted path of one as ``module:attribute``.
+ProviderTarget = Union[str, Type["AIModel"]]
+
+BUILTIN_PROVIDERS: Dict[str, str] = {
+    "openai": f"{__package__}.openai_model:OpenAIModel",
+    "doubao": f"{__package__}.doubao_model:DoubaoModel",
+}
+
+def import_target(path: str) -> object:
+    """Import an object from a dotted path.
+
+    Args:
+        path: ``package.module:attribute`` or ``package.module.attribute``.
+
+    Returns:
+        The imported object.
+
+    Raises:
+        ImportError: If the module or attribute does not exist.
+    """
+    module_name, sep, attribute = path.partition(":")
+    if not sep:
+        module_name, _, attribute = path.rpartition(".")
+    module = importlib.import_module(module_name)
+    try:
+        return getattr(module, attribute)
+    except AttributeError:
+        raise ImportError(f"Module {module_name} has no attribute {attribute}") from None
+
+class ProviderRegistry:
+    """Mapping of provider names to lazily imported model classes."""
+
+    def __init__(self, providers: Optional[Dict[str, ProviderTarget]] = None, entry_points: bool = True):
+        """Initialize the registry.
+
+        Args:
+            providers: Initial providers. Defaults to the built-in providers.
+            entry_points: Whether to look up unknown providers in the
+                ``ai_models.providers`` entry point group.
+        """
+        self._targets: Dict[str, ProviderTarget] = dict(
+            BUILTIN_PROVIDERS if providers is None else providers
+        )
+        self._classes: Dict[str, Type["AIModel"]] = {}
+        self._use_entry_points = entry_points
+        self._entry_points_loaded = False
+
+    @staticmethod
+    def _name(provider: object) -> str:
+        """Normalize a provider name or ``ModelType``."""
+        return str(getattr(provider, "value", provider))
+
+    def register(self, provider: object, target: ProviderTarget) -> None:
+        """Register or replace a provider.
+
+        Args:
+            provider: The provider name or ``ModelType``.
+            target: The model class, or its dotted path.
+        """
+        name = self._name(provider)
+        self._targets[name] = target
+        self._classes.pop(name, None)
+
+    def resolve(self, provider: object) -> Type["AIModel"]:
+        """Get the model class of a provider, importing it if needed.
+
+        Args:
+            provider: The provider name or ``ModelType``.
+
+        Returns:
+            The model class.
+
+        Raises:
+            ValueError: If no implementation is registered for the provider.
+            ImportError: If the registered implementation cannot be imported.
+        """
+        name = self._name(provider)
+        model_class = self._classes.get(name)
+        if model_class is not None:
+            return model_class
+
+        target = self._targets.get(name)
+        if target is None and self._load_entry_points():
+            target = self._targets.get(name)
+        if target is None:
+            raise ValueError(f"Unsupported model type: {provider}")
+
+        if isinstance(target, str):
+            logger.debug("Importing provider %s from %s", name, target)
+            model_class = import_target(target)
+        else:
+            model_class = target
+        self._classes[name] = model_class
+        return model_class
+
+    def names(self) -> List[str]:
+        """Get the names of all registered providers, without importing them."""
+        self._load_entry_points()
+        return sorted(self._targets)
+
+    def __contains__(self, provider: object) -> bool:
+        self._load_entry_points()
+        return self._name(provider) in self._targets
+
+    def _load_entry_points(self) -> bool:
+        """Register providers declared as entry points, once.
+
+        Returns:
+            True if entry points were loaded by this call.
+        """
+        if not self._use_entry_points or self._entry_points_loaded:
+            return False
+        self._entry_points_loaded = True
+
+        from importlib.metadata import entry_points
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            # Explicit registrations take precedence over entry points.
+            self._targets.setdefault(entry_point.name, entry_point.value)
+        return True
+
+# Registry used by the default model factory.
+providers = ProviderRegistry()
@@ -0,0 +1,280 @@
+"""Retries, hedged requests and deadlines for generation calls.
+
+``ResilientModel`` retries failures that are safe to retry with capped,
+jittered exponential backoff, and can send a hedged duplicate of a slow
+non-streaming request once it exceeds a latency percentile. Whichever copy
+succeeds first wins and the other is cancelled. Everything happens within
+an optional overall deadline.
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, FrozenSet, List, Optional, Set
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode
+)
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RetryPolicy:
+    """Retry behaviour for failed generations.
+
+    Attributes:
+        max_attempts: Maximum number of attempts, including the first one.
+        base_delay: Backoff before the first retry, in seconds.
+        max_delay: Upper bound of a single backoff, in seconds.
+        multiplier: Growth factor of the backoff per attempt.
+        retry_codes: Error codes that are safe to retry.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 5.0
+    multiplier: float = 2.0
+    retry_codes: FrozenSet[str] = field(default_factory=lambda: frozenset({
+        ErrorCode.RATE_LIMITED.value,
+        ErrorCode.UPSTREAM_ERROR.value,
+        ErrorCode.NETWORK_ERROR.value,
+        ErrorCode.TIMEOUT.value,
+        ErrorCode.CONNECT_TIMEOUT.value,
+        ErrorCode.FIRST_BYTE_TIMEOUT.value,
+        ErrorCode.IDLE_TIMEOUT.value,
+    }))
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Compute the delay before the next attempt using full jitter.
+
+        Args:
+            attempt: The number of attempts made so far, starting at 1.
+            retry_after: Optional delay requested by the upstream.
+
+        Returns:
+            The delay in seconds.
+        """
+        cap = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+@dataclass
+class HedgePolicy:
+    """Hedging behaviour for slow non-streaming generations.
+
+    Attributes:
+        percentile: Latency percentile after which a hedge is sent.
+        min_delay: Never hedge earlier than this many seconds.
+        max_delay: Optional upper bound of the hedge delay, in seconds.
+        min_samples: Number of observed latencies needed before hedging.
+        window: Number of recent latencies used to compute the percentile.
+    """
+    percentile: float = 95.0
+    min_delay: float = 0.5
+    max_delay: Optional[float] = None
+    min_samples: int = 20
+    window: int = 200
+
+@dataclass
+class ResiliencePolicy:
+    """Combined resilience configuration.
+
+    Attributes:
+        retry: Optional retry policy.
+        hedge: Optional hedging policy.
+        deadline: Optional overall time budget per call, in seconds. The
+            request's own deadline applies as well.
+    """
+    retry: Optional[RetryPolicy] = field(default_factory=RetryPolicy)
+    hedge: Optional[HedgePolicy] = None
+    deadline: Optional[float] = None
+
+class LatencyTracker:
+    """Sliding window of recent successful latencies."""
+
+    def __init__(self, window: int):
+        """Initialize the tracker.
+
+        Args:
+            window: Number of samples to keep.
+        """
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        """Record one latency sample."""
+        self._samples.append(seconds)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Get a latency percentile.
+
+        Args:
+            percentile: The percentile, between 0 and 100.
+
+        Returns:
+            The latency in seconds, or None without samples.
+        """
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+def _failure(error: str, code: ErrorCode) -> GenerationResponse:
+    return GenerationResponse(success=False, chunks=[], error=error, error_code=code.value)
+
+class ResilientModel(ModelWrapper):
+    """Model wrapper applying a ``ResiliencePolicy``."""
+
+    def __init__(self, model: AIModel, policy: Optional[ResiliencePolicy] = None):
+        """Initialize the resilient model.
+
+        Args:
+            model: The model to wrap.
+            policy: Optional resilience policy.
+        """
+        super().__init__(model)
+        self.policy = policy or ResiliencePolicy()
+        window = self.policy.hedge.window if self.policy.hedge else 200
+        self.latencies = LatencyTracker(window)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Get the current hedge delay, or None if hedging is not active."""
+        hedge = self.policy.hedge
+        if hedge is None or len(self.latencies) < hedge.min_samples:
+            return None
+        delay = max(hedge.min_delay, self.latencies.percentile(hedge.percentile) or 0.0)
+        if hedge.max_delay is not None:
+            delay = min(delay, hedge.max_delay)
+        return delay
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content with retries, hedging and a deadline.
+
+        Streaming calls are never hedged, and are only retried while no
+        chunk has been delivered to the callback yet.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        loop = asyncio.get_running_loop()
+        budget = request.remaining()
+        if self.policy.deadline is not None and (budget is None or self.policy.deadline < budget):
+            # Hand the tighter deadline down so providers stop waiting on it too.
+            budget = self.policy.deadline
+            request = replace(request, deadline=time.time() + budget)
+        deadline = None if budget is None else loop.time() + budget
+
+        retry = self.policy.retry
+        max_attempts = retry.max_attempts if retry else 1
+        delivered: List[ContentChunk] = []
+
+        tracked_callback: Optional[ContentCallback] = None
+        if callback:
+            async def tracked_callback(chunk: ContentChunk) -> None:
+                delivered.append(chunk)
+                await callback(chunk)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return _failure("Deadline exceeded", ErrorCode.DEADLINE_EXCEEDED)
+
+            try:
+                response = await asyncio.wait_for(
+                    self._attempt(request, tracked_callback),
+                    timeout=remaining
+                )
+            except asyncio.TimeoutError:
+                return _failure("Deadline exceeded", ErrorCode.DEADLINE_EXCEEDED)
+
+            if response.success or attempt >= max_attempts or delivered:
+                return self._annotate(response, attempt)
+            if response.error_code not in retry.retry_codes:
+                return self._annotate(response, attempt)
+
+            retry_after = (response.metadata or {}).get("retry_after")
+            delay = retry.backoff(attempt, retry_after)
+            if deadline is not None and loop.time() + delay >= deadline:
+                return self._annotate(response, attempt)
+            logger.info(
+                "Retrying %s generation after %s (attempt %d/%d, backoff %.2fs)",
+                self.provider, response.error_code, attempt + 1, max_attempts, delay
+            )
+            await asyncio.sleep(delay)
+
+    async def _attempt(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback]
+    ) -> GenerationResponse:
+        """Make one attempt, hedged if the policy allows it."""
+        hedge_delay = self.hedge_delay() if callback is None else None
+        if hedge_delay is None:
+            return await self._timed(request, callback)
+
+        primary = asyncio.create_task(self._timed(request, None))
+        tasks: Set["asyncio.Task[GenerationResponse]"] = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                logger.debug("Hedging %s request after %.2fs", self.provider, hedge_delay)
+                tasks.add(asyncio.create_task(self._timed(request, None)))
+
+            response: Optional[GenerationResponse] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    response = task.result()
+                    if response.success:
+                        return response
+            return response
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let the losers clean up before the winner is returned.
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _timed(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback]
+    ) -> GenerationResponse:
+        """Call the wrapped model and record the latency of successes."""
+        start = time.monotonic()
+        response = await self.model.generate(request, callback)
+        if response.success:
+            self.latencies.record(time.monotonic() - start)
+        return response
+
+    @staticmethod
+    def _annotate(response: GenerationResponse, attempts: int) -> GenerationResponse:
+        """Record the number of attempts in the response metadata."""
+        if attempts == 1:
+            return response
+        metadata = dict(response.metadata or {})
+        metadata["attempts"] = attempts
+        return replace(response, metadata=metadata)
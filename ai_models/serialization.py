@@ -0,0 +1,208 @@
+"""Conversion of generation requests and responses to and from plain dicts.
+
+The dict form only contains JSON-compatible values and is used wherever
+requests or responses leave the process or must be hashed, for example by
+caches and queues.
+"""
+
+import hashlib
+import json
+import math
+from dataclasses import MISSING, fields
+from typing import Any, Dict, Tuple, get_args, get_type_hints
+
+from .base import AIModel, GenerationRequest, GenerationResponse, ContentChunk, ContentType
+
+# Request fields that do not influence the generated content.
+NON_SEMANTIC_REQUEST_FIELDS = frozenset({
+    "retain_chunks",
+    "deadline",
+    "connect_timeout",
+    "first_byte_timeout",
+    "idle_timeout",
+})
+
+def _request_field_types() -> Dict[str, Tuple[type, bool]]:
+    """Get the value type of each request field and whether it is optional."""
+    types = {}
+    for name, hint in get_type_hints(GenerationRequest).items():
+        args = [arg for arg in get_args(hint) if arg is not type(None)]
+        types[name] = (args[0] if args else hint, bool(args))
+    return types
+
+_REQUEST_FIELD_TYPES = _request_field_types()
+
+_TYPE_NAMES = {str: "a string", int: "an integer", float: "a number", bool: "a boolean"}
+
+def _check_request_field(name: str, value: Any) -> None:
+    """Check the JSON value of a request field against the field's type."""
+    expected, optional = _REQUEST_FIELD_TYPES[name]
+    if value is None:
+        valid = optional
+    elif isinstance(value, bool):
+        valid = expected is bool
+    elif expected is float:
+        valid = isinstance(value, (int, float)) and math.isfinite(value)
+    else:
+        valid = isinstance(value, expected)
+    if not valid:
+        description = _TYPE_NAMES.get(expected, expected.__name__)
+        if optional:
+            description += " or null"
+        raise ValueError(f"Field {name} must be {description}")
+
+def request_to_dict(request: GenerationRequest) -> Dict[str, Any]:
+    """Convert a request to a dict, omitting unset fields.
+
+    Args:
+        request: The generation request.
+
+    Returns:
+        A dict containing the fields that are set on the request.
+    """
+    return {
+        f.name: getattr(request, f.name)
+        for f in fields(request)
+        if getattr(request, f.name) is not None
+    }
+
+def request_from_dict(data: Dict[str, Any], strict: bool = False) -> GenerationRequest:
+    """Create a request from its dict form.
+
+    Args:
+        data: The dict form of the request.
+        strict: Whether to validate untrusted data, e.g. from a client:
+            unknown fields, missing required fields and values of the wrong
+            type are rejected instead of being dropped or passed through.
+
+    Returns:
+        The generation request.
+
+    Raises:
+        ValueError: If ``strict`` is set and the data is not a valid
+            request. The message names the offending field.
+    """
+    if not strict:
+        names = {f.name for f in fields(GenerationRequest)}
+        return GenerationRequest(**{k: v for k, v in data.items() if k in names})
+
+    for name, value in data.items():
+        if name not in _REQUEST_FIELD_TYPES:
+            raise ValueError(f"Unknown field {name}")
+        _check_request_field(name, value)
+    for f in fields(GenerationRequest):
+        if f.default is MISSING and f.default_factory is MISSING and f.name not in data:
+            raise ValueError(f"Missing field {f.name}")
+    return GenerationRequest(**data)
+
+def request_key(request: GenerationRequest, namespace: str = "") -> str:
+    """Compute a canonical content hash for a request.
+
+    Two requests that only differ in fields that do not affect the output
+    map to the same key.
+
+    Args:
+        request: The generation request.
+        namespace: Optional namespace, e.g. the provider name.
+
+    Returns:
+        A hex-encoded SHA-256 digest.
+    """
+    data = {
+        k: v for k, v in request_to_dict(request).items()
+        if k not in NON_SEMANTIC_REQUEST_FIELDS
+    }
+    canonical = json.dumps(
+        [namespace, data],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def model_request_key(model: AIModel, request: GenerationRequest, variant: str = "") -> str:
+    """Compute the key of a request as served by a specific model.
+
+    The key is namespaced by the model's provider and, when the request does
+    not name a model, by the model's default model.
+
+    Args:
+        model: The model that serves the request.
+        request: The generation request.
+        variant: Optional suffix distinguishing otherwise identical requests.
+
+    Returns:
+        A hex-encoded SHA-256 digest.
+    """
+    namespace = model.provider
+    if request.model is None:
+        namespace = f"{namespace}:{getattr(model, 'default_model', '')}"
+    if variant:
+        namespace = f"{namespace}#{variant}"
+    return request_key(request, namespace)
+
+def chunk_to_dict(chunk: ContentChunk) -> Dict[str, Any]:
+    """Convert a content chunk to a dict.
+
+    Args:
+        chunk: The content chunk.
+
+    Returns:
+        The dict form of the chunk.
+    """
+    data: Dict[str, Any] = {"type": chunk.type.value, "content": chunk.content}
+    if chunk.metadata is not None:
+        data["metadata"] = chunk.metadata
+    return data
+
+def chunk_from_dict(data: Dict[str, Any]) -> ContentChunk:
+    """Create a content chunk from its dict form.
+
+    Args:
+        data: The dict form of the chunk.
+
+    Returns:
+        The content chunk.
+    """
+    return ContentChunk(
+        type=ContentType(data["type"]),
+        content=data["content"],
+        metadata=data.get("metadata"),
+    )
+
+def response_to_dict(response: GenerationResponse) -> Dict[str, Any]:
+    """Convert a response to a dict.
+
+    Args:
+        response: The generation response.
+
+    Returns:
+        The dict form of the response.
+    """
+    data: Dict[str, Any] = {
+        "success": response.success,
+        "chunks": [chunk_to_dict(chunk) for chunk in response.chunks],
+    }
+    for name in ("error", "request_id", "metadata", "error_code"):
+        value = getattr(response, name)
+        if value is not None:
+            data[name] = value
+    return data
+
+def response_from_dict(data: Dict[str, Any]) -> GenerationResponse:
+    """Create a response from its dict form.
+
+    Args:
+        data: The dict form of the response.
+
+    Returns:
+        The generation response.
+    """
+    return GenerationResponse(
+        success=data["success"],
+        chunks=[chunk_from_dict(chunk) for chunk in data.get("chunks", [])],
+        error=data.get("error"),
+        request_id=data.get("request_id"),
+        metadata=data.get("metadata"),
+        error_code=data.get("error_code"),
+    )
@@ -0,0 +1,196 @@
+"""Single-flight coalescing of identical in-flight generation requests.
+
+When several callers issue the same request while an identical one is
+already running, only one upstream call is made and its result is shared.
+Streaming subscribers receive every chunk through their own callback,
+including chunks that were produced before they joined.
+
+The shared call runs without a deadline. Each caller waits until its own
+request's deadline instead, so a caller with a short deadline cannot cut
+the call short for the others, and the call is cancelled once its last
+caller has left. Flights of requests with ``retain_chunks`` disabled only
+keep the chunks some subscriber has yet to receive; callers arriving after
+chunks were dropped start a new flight.
+"""
+
+import asyncio
+import logging
+from dataclasses import replace
+from typing import Optional, List, Dict
+
+from .base import (
+    AIModel,
+    ModelWrapper,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ErrorCode,
+    ProviderError,
+    StopGeneration
+)
+from .deadline import Deadline
+from .serialization import model_request_key
+
+logger = logging.getLogger(__name__)
+
+class _Flight:
+    """State shared by all callers of one coalesced request."""
+
+    def __init__(self, retain_chunks: bool = True):
+        self.retain_chunks = retain_chunks
+        self.chunks: List[ContentChunk] = []
+        # Number of chunks dropped from the front of ``chunks``.
+        self.dropped = 0
+        self.waiters = 0
+        self.task: Optional["asyncio.Task[GenerationResponse]"] = None
+        self._changed = asyncio.Event()
+        # Index of the next chunk of each subscriber.
+        self._cursors: Dict[object, int] = {}
+
+    def serves(self, request: GenerationRequest) -> bool:
+        """Check whether a new caller of the same key can join the flight."""
+        return self.dropped == 0 and (self.retain_chunks or not request.retain_chunks)
+
+    @property
+    def changed(self) -> asyncio.Event:
+        """Event that is set the next time a chunk arrives or the flight ends."""
+        return self._changed
+
+    async def publish(self, chunk: ContentChunk) -> None:
+        """Record a chunk and wake up all subscribers."""
+        self.chunks.append(chunk)
+        self.notify()
+
+    def notify(self) -> None:
+        """Wake up all subscribers."""
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    def move(self, subscriber: object, index: Optional[int]) -> None:
+        """Record a subscriber's progress, or its departure with None.
+
+        Without ``retain_chunks``, chunks every subscriber has received are
+        dropped.
+        """
+        if index is None:
+            self._cursors.pop(subscriber, None)
+        else:
+            self._cursors[subscriber] = index
+        if not self.retain_chunks:
+            done = min(self._cursors.values(), default=self.dropped + len(self.chunks))
+            if done > self.dropped:
+                del self.chunks[:done - self.dropped]
+                self.dropped = done
+
+class SingleFlightModel(ModelWrapper):
+    """Model wrapper that collapses concurrent identical requests into one call."""
+
+    def __init__(self, model: AIModel):
+        """Initialize the single-flight wrapper.
+
+        Args:
+            model: The model to wrap.
+        """
+        super().__init__(model)
+        self._flights: Dict[str, _Flight] = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct upstream calls currently running."""
+        return len(self._flights)
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content, joining an identical in-flight request if one exists.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results.
+        """
+        streaming = callback is not None
+        key = model_request_key(self.model, request, "stream" if streaming else "")
+        flight = self._flights.get(key)
+        if flight is None or not flight.serves(request):
+            flight = _Flight(request.retain_chunks)
+            self._flights[key] = flight
+            shared = replace(request, deadline=None) if request.deadline is not None else request
+            flight.task = asyncio.create_task(self._run(key, flight, shared, streaming))
+
+        deadline = Deadline(request)
+        flight.waiters += 1
+        try:
+            async with deadline.total():
+                if callback:
+                    await self._deliver(flight, callback)
+                response = await asyncio.shield(flight.task)
+        except ProviderError as e:
+            # This caller's deadline passed; the flight goes on for the others.
+            return e.to_response()
+        except StopGeneration as e:
+            # This caller's callback stopped; the flight goes on for the others.
+            return GenerationResponse(
+                success=False,
+                chunks=[],
+                error=str(e) or "Generation stopped by the callback",
+                error_code=ErrorCode.CANCELLED.value
+            )
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # The last caller left early, e.g. cancelled or timed out.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+        return replace(response, chunks=list(response.chunks))
+
+    async def _run(
+        self,
+        key: str,
+        flight: _Flight,
+        request: GenerationRequest,
+        streaming: bool
+    ) -> GenerationResponse:
+        """Make the shared upstream call."""
+        try:
+            return await self.model.generate(request, flight.publish if streaming else None)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    @staticmethod
+    async def _deliver(flight: _Flight, callback: ContentCallback) -> None:
+        """Feed every chunk of a flight to one subscriber, in order.
+
+        Raises:
+            StopGeneration: If the callback stopped the generation.
+        """
+        subscriber = object()
+        index = flight.dropped
+        flight.move(subscriber, index)
+        try:
+            while True:
+                changed = flight.changed
+                while index < flight.dropped + len(flight.chunks):
+                    chunk = flight.chunks[index - flight.dropped]
+                    index += 1
+                    try:
+                        await callback(chunk)
+                    except StopGeneration:
+                        raise
+                    except Exception:
+                        logger.exception("Error in content callback")
+                    flight.move(subscriber, index)
+                if flight.task.done():
+                    return
+                await changed.wait()
+        finally:
+            flight.move(subscriber, None)
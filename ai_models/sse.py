@@ -0,0 +1,147 @@
+"""Incremental Server-Sent Events decoding.
+
+``SSEDecoder`` consumes raw bytes as they arrive from the network and
+produces complete events. It handles events split across reads, multi-line
+``data:`` fields and all three line terminators, and skips comment
+(keep-alive) lines without decoding them.
+"""
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+# Image URLs embedded in piapi markdown output, e.g. ``![image](https://...)``.
+IMAGE_URL_PATTERN = re.compile(r"https://storage\.theapi\.app/image/[^)\s]+")
+
+def _select_json_loads() -> Callable[[Any], Any]:
+    """Return the fastest available JSON decoder."""
+    if orjson is not None:
+        return orjson.loads
+    return json.loads
+
+def _select_json_dumps() -> Callable[[Any], bytes]:
+    """Return the fastest available JSON encoder producing UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps
+    return lambda value: json.dumps(value, ensure_ascii=False).encode()
+
+json_loads = _select_json_loads()
+json_dumps = _select_json_dumps()
+
+@dataclass
+class SSEEvent:
+    """A decoded Server-Sent Event.
+
+    Attributes:
+        data: The event data, with multiple ``data:`` lines joined by newlines.
+        event: Optional event type.
+        id: Optional event ID.
+    """
+    data: str
+    event: Optional[str] = None
+    id: Optional[str] = None
+
+class SSEDecoder:
+    """Incremental decoder for a Server-Sent Events byte stream."""
+
+    def __init__(self):
+        """Initialize the decoder."""
+        self._buffer = bytearray()
+        self._data: List[bytes] = []
+        self._event: Optional[str] = None
+        self._id: Optional[str] = None
+        self._pending_cr = False
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Feed bytes into the decoder.
+
+        Args:
+            chunk: Bytes received from the stream.
+
+        Returns:
+            The events completed by this chunk, possibly none.
+        """
+        if self._pending_cr and chunk[:1] == b"\n":
+            # The previous read ended in "\r" and this one starts with the
+            # "\n" of the same "\r\n" terminator.
+            chunk = chunk[1:]
+        self._pending_cr = chunk[-1:] == b"\r"
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        buffer = self._buffer
+        buffer += chunk
+        end = buffer.rfind(b"\n")
+        if end == -1:
+            return []
+        lines = bytes(buffer[:end]).split(b"\n")
+        del buffer[:end + 1]
+
+        events: List[SSEEvent] = []
+        for line in lines:
+            event = self._process_line(line)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[SSEEvent]:
+        """Finish decoding at the end of the stream.
+
+        Returns:
+            The last event if the stream ended without a blank line.
+        """
+        events: List[SSEEvent] = []
+        if self._buffer:
+            event = self._process_line(bytes(self._buffer))
+            self._buffer.clear()
+            if event is not None:
+                events.append(event)
+        event = self._dispatch()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _process_line(self, line: bytes) -> Optional[SSEEvent]:
+        """Process one line and return an event if it completes one."""
+        if not line:
+            return self._dispatch()
+        if line.startswith(b"data:"):
+            self._data.append(line[6:] if line[5:6] == b" " else line[5:])
+            return None
+        if line[0] == 0x3A:  # ":" starts a comment, e.g. a keep-alive.
+            return None
+
+        field, colon, value = line.partition(b":")
+        if colon and value[:1] == b" ":
+            value = value[1:]
+        if field == b"data":
+            self._data.append(value)
+        elif field == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif field == b"id":
+            self._id = value.decode("utf-8", "replace")
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        """Complete the current event, if it has any data."""
+        if not self._data:
+            self._event = None
+            return None
+        if len(self._data) == 1:
+            data = self._data[0]
+        else:
+            data = b"\n".join(self._data)
+        event = SSEEvent(
+            data=data.decode("utf-8", "replace"),
+            event=self._event,
+            id=self._id,
+        )
+        self._data = []
+        self._event = None
+        return event
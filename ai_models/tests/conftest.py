@@ -0,0 +1,9 @@
+"""pytest configuration of the ai_models tests."""
+
+import os
+import sys
+
+# Make ``ai_models`` importable when pytest is run without ``python -m``.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+# Worker processes started by the tests import ``ai_models`` too.
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [sys.path[0], os.environ.get("PYTHONPATH")]))
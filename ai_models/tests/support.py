@@ -0,0 +1,139 @@
+"""Helpers shared by the ai_models tests.
+
+pytest-asyncio is not required: tests are plain functions that drive their
+coroutines with ``asyncio.run``, usually through ``run_with_standin``.
+"""
+
+import asyncio
+from dataclasses import replace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+from ai_models.base import (
+    AIModel,
+    ModelType,
+    GenerationRequest,
+    GenerationResponse,
+    ContentChunk,
+    ContentCallback,
+    ContentType,
+    ErrorCode
+)
+from ai_models.benchmarks.load import model_config
+from ai_models.benchmarks.standins import StandinConfig, StandinServer
+
+# Stand-in behaviour without artificial delays, so tests run quickly.
+FAST = StandinConfig(latency=0.0, jitter=0.0, chunks=3, chunk_interval=0.0, image_bytes=1024)
+
+def run_with_standin(
+    scenario: Callable[[StandinServer, str], Awaitable[Any]],
+    config: Optional[StandinConfig] = None
+) -> Any:
+    """Run a scenario against a stand-in server on a fresh event loop.
+
+    Args:
+        scenario: Coroutine function called with the server and its base URL.
+        config: Optional server behaviour. Defaults to ``FAST``.
+
+    Returns:
+        The result of the scenario.
+    """
+    async def main() -> Any:
+        server = StandinServer(config or FAST)
+        url = await server.start()
+        try:
+            return await scenario(server, url)
+        finally:
+            await server.stop()
+    return asyncio.run(main())
+
+def standin_config(model_type: ModelType, url: str):
+    """Configuration pointing a provider at the stand-in server."""
+    return model_config(model_type, url)
+
+def text(content: str) -> ContentChunk:
+    """Build a text chunk."""
+    return ContentChunk(type=ContentType.TEXT, content=content)
+
+def succeeded(*contents: str) -> GenerationResponse:
+    """Build a successful response with one text chunk per content."""
+    return GenerationResponse(success=True, chunks=[text(c) for c in contents])
+
+def failed(code: Union[ErrorCode, str], metadata: Optional[Dict[str, Any]] = None) -> GenerationResponse:
+    """Build a failed response with an error code."""
+    code = ErrorCode(code)
+    return GenerationResponse(
+        success=False, chunks=[], error=f"Scripted {code.value}", error_code=code.value, metadata=metadata
+    )
+
+class ScriptedModel(AIModel):
+    """Model replaying scripted responses, for testing wrappers.
+
+    Each call takes the next response of the script; the last one repeats.
+    Its chunks are streamed to the callback first. A call waits for
+    ``gate`` when one is set, so tests can hold calls in flight.
+    """
+
+    provider = "scripted"
+
+    def __init__(
+        self,
+        script: Sequence[GenerationResponse] = (),
+        gate: Optional[asyncio.Event] = None,
+        delay: float = 0.0
+    ):
+        self.script = list(script) or [succeeded("ok")]
+        self.gate = gate
+        self.delay = delay
+        self.requests: List[GenerationRequest] = []
+        self.started = 0
+        self.cancelled = 0
+        self.closed = False
+
+    @property
+    def calls(self) -> int:
+        """Number of calls that completed or are in flight."""
+        return len(self.requests)
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        self.requests.append(request)
+        response = self.script[min(self.started, len(self.script) - 1)]
+        self.started += 1
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            if callback:
+                for chunk in response.chunks:
+                    await callback(chunk)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return replace(response, chunks=list(response.chunks))
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        return [{"id": "scripted", "name": "Scripted", "type": "text", "provider": self.provider}]
+
+    def supports_streaming(self, model: str) -> bool:
+        return True
+
+    async def close(self) -> None:
+        self.closed = True
+
+class Collector:
+    """Content callback collecting the chunks it receives."""
+
+    def __init__(self):
+        self.chunks: List[ContentChunk] = []
+
+    async def __call__(self, chunk: ContentChunk) -> None:
+        self.chunks.append(chunk)
+
+    @property
+    def contents(self) -> List[str]:
+        """The contents of the collected chunks."""
+        return [chunk.content for chunk in self.chunks]
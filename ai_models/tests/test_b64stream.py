@@ -0,0 +1,63 @@
+"""Tests of the streaming inline image decoder."""
+
+import base64
+import json
+import os
+
+import pytest
+
+from ai_models.b64stream import InlineImageDecoder, map_image
+from ai_models.base import ProviderError
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+def body(images):
+    data = {"code": 10000, "data": {"binary_data_base64": images, "note": "x"}, "message": "Success"}
+    return json.dumps(data).encode()
+
+def decode(directory, pieces):
+    decoder = InlineImageDecoder(str(directory))
+    for piece in pieces:
+        decoder.feed(piece)
+    return decoder.finish()
+
+def test_images_are_decoded_into_files(tmp_path):
+    document = decode(tmp_path, [body([base64.b64encode(PNG).decode()] * 2)])
+    images = document["data"]["binary_data_base64"]
+    assert document["data"]["note"] == "x" and document["message"] == "Success"
+    assert [image.mime_type for image in images] == ["image/png"] * 2
+    for image in images:
+        assert image.path.endswith(".png") and image.size == len(PNG)
+        with map_image(image.path) as mapped:
+            assert mapped[:] == PNG
+
+def test_any_split_gives_the_same_image(tmp_path):
+    # Escaped slashes and missing padding must also survive the splits.
+    encoded = base64.b64encode(PNG[:-1]).decode().rstrip("=").replace("/", "\\/")
+    raw = body([encoded]).replace(b"\\\\/", b"\\/")
+    for i in range(0, len(raw) + 1, 7):
+        (image,) = decode(tmp_path, [raw[:i], raw[i:]])["data"]["binary_data_base64"]
+        with open(image.path, "rb") as f:
+            assert f.read() == PNG[:-1], i
+        image.remove()
+
+def test_truncated_body_raises_and_discard_removes_files(tmp_path):
+    raw = body([base64.b64encode(PNG).decode()] * 2)
+    decoder = InlineImageDecoder(str(tmp_path))
+    decoder.feed(raw[:len(raw) // 2])
+    with pytest.raises(ProviderError):
+        decoder.finish()
+    assert os.listdir(tmp_path)
+    decoder.discard()
+    assert os.listdir(tmp_path) == []
+
+def test_documents_without_images_parse_unchanged(tmp_path):
+    raw = json.dumps({"data": {"binary_data_base64": None, "image_urls": ["u"]}}).encode()
+    assert decode(tmp_path, [raw]) == {"data": {"binary_data_base64": None, "image_urls": ["u"]}}
+
+def test_truncated_quantum_raises_provider_error(tmp_path):
+    decoder = InlineImageDecoder(str(tmp_path))
+    with pytest.raises(ProviderError):
+        decoder.feed(body([base64.b64encode(PNG).decode() + "A"]))
+    decoder.discard()
+    assert os.listdir(tmp_path) == []
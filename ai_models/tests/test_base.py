@@ -0,0 +1,48 @@
+"""Tests of the batch helpers of the model base class."""
+
+import asyncio
+
+import pytest
+
+from ai_models.base import GenerationRequest
+
+from support import ScriptedModel, failed, succeeded
+
+def test_generate_many_keeps_request_order():
+    async def main():
+        model = ScriptedModel([succeeded("a"), failed("upstream_error"), succeeded("c")])
+        requests = [GenerationRequest(prompt=p) for p in "abc"]
+        return model, await model.generate_many(requests, concurrency=1)
+
+    model, responses = asyncio.run(main())
+    assert [r.success for r in responses] == [True, False, True]
+    assert [r.prompt for r in model.requests] == ["a", "b", "c"]
+
+def test_as_completed_bounds_concurrency():
+    async def main():
+        gate = asyncio.Event()
+        model = ScriptedModel(gate=gate)
+        batch = model.as_completed([GenerationRequest(prompt=str(i)) for i in range(5)], concurrency=2)
+        first = asyncio.create_task(batch.__anext__())
+        await asyncio.sleep(0.01)
+        started = model.started
+        gate.set()
+        await first
+        rest = [item async for item in batch]
+        return started, 1 + len(rest)
+
+    assert asyncio.run(main()) == (2, 5)
+
+def test_failing_request_iterator_is_raised():
+    def requests():
+        yield GenerationRequest(prompt="a")
+        yield GenerationRequest(prompt="b")
+        raise OSError("catalogue unavailable")
+
+    async def main():
+        model = ScriptedModel()
+        with pytest.raises(OSError, match="catalogue unavailable"):
+            await model.generate_many(requests(), concurrency=3)
+        return model
+
+    assert asyncio.run(main()).calls == 2
@@ -0,0 +1,77 @@
+"""Tests of the generation cache."""
+
+import asyncio
+
+from ai_models.base import GenerationRequest, ErrorCode, StopGeneration
+from ai_models.cache import CacheConfig, CachedModel, GenerationCache
+
+from support import Collector, ScriptedModel, failed, succeeded
+
+def test_seeded_request_is_served_from_cache():
+    async def main():
+        model = ScriptedModel([succeeded("a", "b")])
+        cached = CachedModel(model, GenerationCache())
+        request = GenerationRequest(prompt="p", seed=1)
+        first = await cached.generate(request)
+        collector = Collector()
+        second = await cached.generate(GenerationRequest(prompt="p", seed=1, deadline=1e12), collector)
+        return model, first, second, collector
+
+    model, first, second, collector = asyncio.run(main())
+    assert model.calls == 1
+    assert not (first.metadata or {}).get("cached")
+    assert second.metadata["cached"] is True
+    assert collector.contents == ["a", "b"]
+
+def test_unseeded_and_failed_requests_are_not_cached():
+    async def main():
+        model = ScriptedModel([failed("upstream_error"), succeeded("a")])
+        cached = CachedModel(model, GenerationCache())
+        await cached.generate(GenerationRequest(prompt="p", seed=1))
+        await cached.generate(GenerationRequest(prompt="p", seed=1))
+        await cached.generate(GenerationRequest(prompt="p"))
+        await cached.generate(GenerationRequest(prompt="p"))
+        return model
+
+    assert asyncio.run(main()).calls == 4
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    config = CacheConfig(disk_path=str(tmp_path))
+
+    async def main():
+        request = GenerationRequest(prompt="p", seed=1)
+        await CachedModel(ScriptedModel([succeeded("a")]), GenerationCache(config)).generate(request)
+        model = ScriptedModel()
+        response = await CachedModel(model, GenerationCache(config)).generate(request)
+        return model, response
+
+    model, response = asyncio.run(main())
+    assert model.calls == 0
+    assert [c.content for c in response.chunks] == ["a"]
+
+def test_expired_and_evicted_entries_miss():
+    async def main():
+        cache = GenerationCache(CacheConfig(max_entries=1, ttl=0.0))
+        await cache.set("k", succeeded("a"))
+        expired = await cache.get("k")
+        cache.config.ttl = 60.0
+        await cache.set("k1", succeeded("a"))
+        await cache.set("k2", succeeded("b"))
+        return expired, await cache.get("k1"), await cache.get("k2")
+
+    expired, evicted, kept = asyncio.run(main())
+    assert expired is None and evicted is None
+    assert kept.chunks[0].content == "b"
+
+def test_stop_generation_during_replay_cancels():
+    async def main():
+        model = ScriptedModel([succeeded("a", "b")])
+        cached = CachedModel(model, GenerationCache())
+        await cached.generate(GenerationRequest(prompt="p", seed=1))
+        async def stop(chunk):
+            raise StopGeneration()
+        return await cached.generate(GenerationRequest(prompt="p", seed=1), stop)
+
+    response = asyncio.run(main())
+    assert response.error_code == ErrorCode.CANCELLED.value
+    assert [c.content for c in response.chunks] == ["a"]
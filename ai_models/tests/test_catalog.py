@@ -0,0 +1,83 @@
+"""Tests of the model catalog and the catalog router."""
+
+import asyncio
+
+import pytest
+
+from ai_models.base import ErrorCode, GenerationRequest
+from ai_models.catalog import CatalogRouter, ModelCatalog
+
+from support import ScriptedModel, succeeded
+
+class ProviderModel(ScriptedModel):
+    """Scripted model of a named provider with fixed model definitions."""
+
+    def __init__(self, provider, definitions, streaming=()):
+        super().__init__([succeeded(provider)])
+        self.provider = provider
+        self.definitions = definitions
+        self.streaming = set(streaming)
+
+    def get_available_models(self):
+        return self.definitions
+
+    def supports_streaming(self, model):
+        return model in self.streaming
+
+def providers():
+    return [
+        ProviderModel("chat", [
+            {"id": "gpt", "category": "OpenAI", "img2img": True},
+            {"id": "shared", "category": "OpenAI"},
+        ], streaming={"gpt"}),
+        ProviderModel("paint", [
+            {"id": "sd", "category": "SD", "max_images": 4, "inpainting": True},
+            {"id": "shared", "category": "SD"},
+        ]),
+    ]
+
+def test_catalog_indexes_models_by_capability():
+    catalog = ModelCatalog.from_models(providers())
+    assert len(catalog) == 3
+    # The first provider declaring an ID wins.
+    assert catalog.get("shared").provider == "chat"
+    assert catalog.categories() == ["OpenAI", "SD"]
+    assert [info.id for info in catalog.find(streaming=True)] == ["gpt"]
+    assert [info.id for info in catalog.find(img2img=False, provider="chat")] == ["shared"]
+    assert [info.id for info in catalog.find(category="SD", inpainting=True, min_images=2)] == ["sd"]
+    assert catalog.find(category="SD", provider="chat") == []
+
+def test_router_sends_requests_to_the_provider_of_their_model():
+    async def main():
+        router = CatalogRouter(providers(), default_model="sd")
+        routed = await router.generate(GenerationRequest(prompt="p", model="gpt"))
+        default = await router.generate(GenerationRequest(prompt="p"))
+        return router, routed, default
+
+    router, routed, default = asyncio.run(main())
+    assert routed.chunks[0].content == "chat"
+    assert default.chunks[0].content == "paint"
+    # Requests without a model are sent with the default model filled in.
+    assert router.models["paint"].requests[0].model == "sd"
+    assert router.supports_streaming("gpt") and not router.supports_streaming("sd")
+
+@pytest.mark.parametrize("request_fields", [
+    {"model": "unknown"},
+    {"model": "sd", "n": 5},
+    {"model": "sd", "image_url": "http://example.com/a.png"},
+    {"model": "gpt", "mask_url": "http://example.com/m.png"},
+])
+def test_router_rejects_unsupported_requests(request_fields):
+    async def main():
+        router = CatalogRouter(providers())
+        return router, await router.generate(GenerationRequest(prompt="p", **request_fields))
+
+    router, response = asyncio.run(main())
+    assert response.error_code == ErrorCode.CLIENT_ERROR.value
+    assert all(model.calls == 0 for model in router.models.values())
+
+def test_router_needs_a_known_default_model():
+    with pytest.raises(ValueError):
+        CatalogRouter(providers(), default_model="missing")
+    with pytest.raises(ValueError):
+        CatalogRouter([])
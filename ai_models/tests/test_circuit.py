@@ -0,0 +1,146 @@
+"""Tests of circuit breakers and failover."""
+
+import asyncio
+
+import pytest
+
+from ai_models.base import GenerationRequest, ErrorCode, StopGeneration
+from ai_models.circuit import (
+    BreakerConfig,
+    BreakerRegistry,
+    BreakerState,
+    CircuitBreaker,
+    FailoverModel,
+    FailoverTarget
+)
+
+from support import ScriptedModel, failed, succeeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_breaker_opens_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker("b", BreakerConfig(failure_threshold=2, reset_timeout=10.0), clock)
+    transitions = []
+    breaker.listeners.append(lambda name, old, new: transitions.append((old, new)))
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record(failed("upstream_error"))
+    assert breaker.state is BreakerState.OPEN
+    assert not breaker.allow()
+
+    clock.now += 10.0
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time.
+    breaker.record(succeeded())
+    assert breaker.state is BreakerState.CLOSED
+    assert transitions == [
+        (BreakerState.CLOSED, BreakerState.OPEN),
+        (BreakerState.OPEN, BreakerState.HALF_OPEN),
+        (BreakerState.HALF_OPEN, BreakerState.CLOSED),
+    ]
+
+def test_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker("b", BreakerConfig(failure_threshold=1, reset_timeout=5.0), clock)
+    breaker.allow()
+    breaker.record(failed("timeout"))
+    clock.now += 5.0
+    assert breaker.allow()
+    breaker.record(failed("timeout"))
+    assert breaker.state is BreakerState.OPEN
+
+def test_client_errors_do_not_count_as_failures():
+    breaker = CircuitBreaker("b", BreakerConfig(failure_threshold=1))
+    breaker.allow()
+    breaker.record(failed("client_error"))
+    assert breaker.state is BreakerState.CLOSED
+
+def test_failover_moves_to_the_next_target():
+    async def main():
+        primary = ScriptedModel([failed("upstream_error")])
+        secondary = ScriptedModel([succeeded("b")])
+        registry = BreakerRegistry(BreakerConfig(failure_threshold=1))
+        failover = FailoverModel(
+            [FailoverTarget(primary, "first"), FailoverTarget(secondary, "second")], registry
+        )
+        first = await failover.generate(GenerationRequest(prompt="p"))
+        second = await failover.generate(GenerationRequest(prompt="p"))
+        return primary, secondary, first, second
+
+    primary, secondary, first, second = asyncio.run(main())
+    assert first.success and first.metadata["model"] == "second"
+    assert second.success
+    # The primary's breaker opened, so the second request skipped it.
+    assert primary.calls == 1 and secondary.calls == 2
+
+def test_failover_reports_open_circuits():
+    async def main():
+        registry = BreakerRegistry(BreakerConfig(failure_threshold=1))
+        failover = FailoverModel([FailoverTarget(ScriptedModel([failed("network_error")]), "m")], registry)
+        await failover.generate(GenerationRequest(prompt="p"))
+        return await failover.generate(GenerationRequest(prompt="p"))
+
+    assert asyncio.run(main()).error_code == ErrorCode.CIRCUIT_OPEN.value
+
+def test_cancelled_probe_frees_its_slot_without_an_outcome():
+    clock = FakeClock()
+    breaker = CircuitBreaker("b", BreakerConfig(failure_threshold=1, reset_timeout=5.0), clock)
+    breaker.allow()
+    breaker.record(failed("upstream_error"))
+    clock.now += 5.0
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state is BreakerState.HALF_OPEN
+    assert breaker.allow()
+
+def test_cancelled_calls_do_not_trip_the_breaker():
+    async def main():
+        registry = BreakerRegistry(BreakerConfig(failure_threshold=1))
+        model = ScriptedModel(gate=asyncio.Event())
+        failover = FailoverModel([FailoverTarget(model, "m")], registry)
+        task = asyncio.create_task(failover.generate(GenerationRequest(prompt="p")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        stopped = FailoverModel([FailoverTarget(ScriptedModel([failed("cancelled")]), "m")], registry)
+        await stopped.generate(GenerationRequest(prompt="p"))
+        return registry.get("scripted", "m")
+
+    assert asyncio.run(main()).state is BreakerState.CLOSED
+
+def test_stop_generation_from_the_callback_is_not_a_failure():
+    async def main():
+        registry = BreakerRegistry(BreakerConfig(failure_threshold=1))
+        failover = FailoverModel([FailoverTarget(ScriptedModel([succeeded("a")]), "m")], registry)
+
+        async def stop(chunk):
+            raise StopGeneration()
+
+        with pytest.raises(StopGeneration):
+            await failover.generate(GenerationRequest(prompt="p"), stop)
+        return registry.get("scripted", "m")
+
+    assert asyncio.run(main()).state is BreakerState.CLOSED
+
+def test_rejected_requests_do_not_fail_over():
+    async def main():
+        responses = []
+        for code in ("client_error", "auth_error", "deadline_exceeded"):
+            secondary = ScriptedModel()
+            failover = FailoverModel(
+                [FailoverTarget(ScriptedModel([failed(code)]), "first"), FailoverTarget(secondary, "second")]
+            )
+            responses.append((await failover.generate(GenerationRequest(prompt="p")), secondary.calls))
+        return responses
+
+    for response, secondary_calls in asyncio.run(main()):
+        assert not response.success and secondary_calls == 0
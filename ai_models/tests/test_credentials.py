@@ -0,0 +1,115 @@
+"""Tests of credential pools."""
+
+import asyncio
+
+from ai_models.base import ModelConfig, GenerationRequest, ErrorCode
+from ai_models.credentials import Credential, CredentialPool, PooledModel, PoolStrategy
+from ai_models.factory import DefaultModelFactory
+from ai_models.metrics import Instrumentation, MetricsRegistry
+from ai_models.registry import ProviderRegistry
+
+from support import ScriptedModel, failed, succeeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def pool(*credentials, **options):
+    return CredentialPool(ModelConfig(api_key=""), credentials, **options)
+
+def test_least_loaded_key_is_picked():
+    keys = pool(Credential("a"), Credential("b"))
+    first = keys.acquire()
+    second = keys.acquire()
+    assert {first.credential.api_key, second.credential.api_key} == {"a", "b"}
+    keys.release(first, succeeded())
+    assert keys.acquire() is first
+
+def test_remaining_quota_strategy_and_quota_windows():
+    clock = FakeClock()
+    keys = pool(Credential("a", quota=1), Credential("b", quota=3), strategy=PoolStrategy.REMAINING_QUOTA, clock=clock)
+    picks = [keys.acquire() for _ in range(4)]
+    assert [p.credential.api_key if p else None for p in picks] == ["b", "b", "a", "b"]
+    assert keys.acquire() is None
+    assert keys.retry_after() == 60.0
+    clock.now += 60.0
+    assert keys.acquire() is not None
+
+def test_throttled_key_cools_down_with_backoff():
+    clock = FakeClock()
+    keys = pool(Credential("a"), cooldown=2.0, clock=clock)
+    state = keys.acquire()
+    keys.release(state, failed("rate_limited"))
+    assert keys.acquire() is None and keys.retry_after() == 2.0
+    clock.now += 2.0
+    keys.release(keys.acquire(), failed("rate_limited"))
+    assert keys.retry_after() == 4.0
+    keys.release(state, failed("rate_limited", {"retry_after": 30}))
+    assert keys.retry_after() == 30.0
+
+def test_pooled_model_switches_keys_on_throttling():
+    async def main():
+        keys = pool(Credential("a", name="a"), Credential("b", name="b"))
+        models = [ScriptedModel([failed("rate_limited")]), ScriptedModel([succeeded("x")])]
+        response = await PooledModel(models, keys).generate(GenerationRequest(prompt="p"))
+        exhausted = await PooledModel(models, keys).generate(GenerationRequest(prompt="p"))
+        return response, exhausted
+
+    response, exhausted = asyncio.run(main())
+    assert response.success and response.metadata["credential"] == "b"
+    assert exhausted.success and exhausted.metadata["credential"] == "b"
+
+def test_pooled_model_reports_when_no_key_is_left():
+    async def main():
+        keys = pool(Credential("a"))
+        model = PooledModel([ScriptedModel([failed("auth_error")])], keys)
+        await model.generate(GenerationRequest(prompt="p"))
+        return await model.generate(GenerationRequest(prompt="p"))
+
+    response = asyncio.run(main())
+    assert response.error_code == ErrorCode.RATE_LIMITED.value
+    assert response.metadata["retry_after"] > 0
+
+def test_instrumented_pool_exports_usage_per_key():
+    registry = MetricsRegistry()
+    keys = pool(Credential("a", name="a", quota=5, concurrency=2), Credential("b", name="b"), registry=registry)
+    state = keys.acquire(exclude=keys.states[1:])
+    metrics = registry.snapshot()
+    assert [["a"], 1] in metrics["credential_in_flight"]["series"]
+    assert [["a"], 0.5] in metrics["credential_utilization"]["series"]
+    assert [["a"], 4] in metrics["credential_quota_remaining"]["series"]
+    keys.release(state, failed("rate_limited"))
+    metrics = registry.snapshot()
+    assert [["a"], 0] in metrics["credential_in_flight"]["series"]
+    assert metrics["credential_requests_total"]["series"] == [[["a"], 1]]
+    assert metrics["credential_cooldowns_total"]["series"] == [[["a", "throttled"], 1]]
+    assert 'credential_utilization{key="b"} 0' in registry.render_prometheus()
+
+class KeyedModel(ScriptedModel):
+    def __init__(self, config, transport=None):
+        super().__init__([failed("rate_limited")] if config.api_key == "a" else [succeeded("x")])
+
+def test_factory_wraps_the_pooled_model_and_instruments_the_pool():
+    wrapped = []
+
+    def middleware(model):
+        wrapped.append(model)
+        return model
+
+    async def main():
+        providers = ProviderRegistry(entry_points=False)
+        providers.register("keyed", KeyedModel)
+        instrumentation = Instrumentation()
+        keys = pool(Credential("a", name="a"), Credential("b", name="b"))
+        async with DefaultModelFactory(middleware=[middleware], instrumentation=instrumentation, registry=providers) as factory:
+            model = factory.create_model("keyed", keys)
+            return model, keys, instrumentation.registry, await model.generate(GenerationRequest(prompt="p"))
+
+    model, keys, registry, response = asyncio.run(main())
+    assert wrapped == [model] and isinstance(model, PooledModel)
+    assert keys.registry is registry
+    assert response.success and response.metadata["credential"] == "b"
+    assert "credential_requests_total" in registry.snapshot()
@@ -0,0 +1,98 @@
+"""Tests of per-phase timeouts and request deadlines."""
+
+import asyncio
+import time
+from dataclasses import replace
+
+import pytest
+
+from ai_models.base import ErrorCode, GenerationRequest, ModelType, ProviderError, StopGeneration
+from ai_models.deadline import Deadline, NO_DEADLINE
+from ai_models.factory import DefaultModelFactory
+
+from support import FAST, Collector, run_with_standin, standin_config
+
+class SlowStream:
+    """Response body yielding pieces after a delay."""
+
+    def __init__(self, pieces, delay):
+        self.pieces = list(pieces)
+        self.delay = delay
+
+    async def readany(self):
+        await asyncio.sleep(self.delay)
+        return self.pieces.pop(0) if self.pieces else b""
+
+def raised_code(coroutine):
+    async def main():
+        with pytest.raises(ProviderError) as raised:
+            await coroutine()
+        return raised.value.code
+    return asyncio.run(main())
+
+def test_phase_timeout_raises_its_code():
+    async def wait():
+        async with Deadline(GenerationRequest(prompt="p", first_byte_timeout=0.01)).first_byte():
+            await asyncio.sleep(1)
+
+    assert raised_code(wait) is ErrorCode.FIRST_BYTE_TIMEOUT
+
+def test_earlier_deadline_overrides_the_phase_timeout():
+    async def wait():
+        request = GenerationRequest(prompt="p", idle_timeout=10, deadline=time.time() + 0.01)
+        async with Deadline(request).idle():
+            await asyncio.sleep(1)
+
+    assert raised_code(wait) is ErrorCode.DEADLINE_EXCEEDED
+
+def test_passed_deadline_fails_the_check():
+    async def check():
+        Deadline(GenerationRequest(prompt="p", deadline=time.time() - 1)).check()
+
+    assert raised_code(check) is ErrorCode.DEADLINE_EXCEEDED
+
+def test_idle_timeout_bounds_each_read_only():
+    async def main():
+        deadline = Deadline(GenerationRequest(prompt="p", idle_timeout=0.05))
+        # Three reads take longer than one idle timeout in total.
+        return [data async for data in deadline.iter_reads(SlowStream([b"a", b"b", b"c"], 0.02))]
+
+    assert asyncio.run(main()) == [b"a", b"b", b"c"]
+
+    async def stalled():
+        deadline = Deadline(GenerationRequest(prompt="p", idle_timeout=0.01))
+        await deadline.read(SlowStream([b"a"], 1))
+
+    assert raised_code(stalled) is ErrorCode.IDLE_TIMEOUT
+
+def test_unbounded_deadline_uses_no_timers():
+    assert not NO_DEADLINE.bounds_reads
+    assert NO_DEADLINE.first_byte() is NO_DEADLINE.total()
+
+def generate_openai(request, standin, callback=None):
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            return await model.generate(request, callback)
+
+    return run_with_standin(scenario, standin)
+
+def test_openai_first_byte_timeout():
+    response = generate_openai(
+        GenerationRequest(prompt="p", first_byte_timeout=0.02), replace(FAST, latency=0.5)
+    )
+    assert response.error_code == ErrorCode.FIRST_BYTE_TIMEOUT.value
+
+def test_openai_idle_timeout_while_streaming():
+    response = generate_openai(
+        GenerationRequest(prompt="p", idle_timeout=0.02), replace(FAST, chunk_interval=0.5), Collector()
+    )
+    assert response.error_code == ErrorCode.IDLE_TIMEOUT.value
+
+def test_openai_stream_stopped_by_the_callback():
+    async def stop(chunk):
+        raise StopGeneration("consumer left")
+
+    response = generate_openai(GenerationRequest(prompt="p"), replace(FAST, chunk_interval=0.5), stop)
+    assert response.error_code == ErrorCode.CANCELLED.value
+    assert response.error == "consumer left"
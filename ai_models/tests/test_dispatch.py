@@ -0,0 +1,93 @@
+"""Tests of decoupled callback dispatch."""
+
+import asyncio
+
+from ai_models.base import GenerationRequest, ErrorCode, StopGeneration
+from ai_models.dispatch import (
+    CallbackDispatcher,
+    DispatchConfig,
+    DispatchingModel,
+    OverflowPolicy,
+    callback_name
+)
+
+from support import Collector, ScriptedModel, succeeded, text
+
+CONTENTS = [str(i) for i in range(10)]
+
+def test_chunks_arrive_in_order():
+    async def main():
+        dispatcher = CallbackDispatcher(DispatchConfig(queue_size=2, lag_interval=None))
+        collector = Collector()
+        model = DispatchingModel(ScriptedModel([succeeded(*CONTENTS)]), dispatcher)
+        response = await model.generate(GenerationRequest(prompt="p"), collector)
+        return response, collector
+
+    response, collector = asyncio.run(main())
+    assert response.success
+    assert collector.contents == CONTENTS
+
+async def overflow(policy):
+    dispatcher = CallbackDispatcher(DispatchConfig(queue_size=2, overflow=policy, lag_interval=None))
+    release = asyncio.Event()
+    received = []
+
+    async def slow(chunk):
+        await release.wait()
+        received.append(chunk.content)
+
+    async with dispatcher.stream(slow) as stream:
+        for content in CONTENTS:
+            await stream.put(text(content))
+        release.set()
+    return received
+
+def test_coalesce_merges_text_into_the_last_chunk():
+    # The consumer only starts once the producer yields, so nothing is
+    # delivered while the chunks are put.
+    assert asyncio.run(overflow(OverflowPolicy.COALESCE)) == ["0", "123456789"]
+
+def test_drop_oldest_text_keeps_the_newest():
+    assert asyncio.run(overflow(OverflowPolicy.DROP_OLDEST_TEXT)) == ["8", "9"]
+
+def test_stop_generation_from_the_callback_cancels():
+    async def main():
+        dispatcher = CallbackDispatcher(DispatchConfig(lag_interval=None))
+
+        async def stop(chunk):
+            raise StopGeneration("gone")
+
+        model = DispatchingModel(ScriptedModel([succeeded("a")]), dispatcher)
+        return await model.generate(GenerationRequest(prompt="p"), stop)
+
+    response = asyncio.run(main())
+    assert response.error_code == ErrorCode.CANCELLED.value
+
+def test_closing_the_last_model_stops_the_lag_monitor():
+    async def main():
+        dispatcher = CallbackDispatcher(DispatchConfig(lag_interval=0.01))
+        models = [DispatchingModel(ScriptedModel([succeeded("a")]), dispatcher) for _ in range(2)]
+        await models[0].generate(GenerationRequest(prompt="p"), Collector())
+        running = [dispatcher.monitor._task is not None]
+        await models[0].close()
+        running.append(dispatcher.monitor._task is not None)
+        await models[1].close()
+        running.append(dispatcher.monitor._task is not None)
+        return running, models
+
+    running, models = asyncio.run(main())
+    assert running == [True, True, False]
+    assert all(model.model.closed for model in models)
+
+def test_queue_depth_is_labelled_by_callback():
+    async def main():
+        dispatcher = CallbackDispatcher(DispatchConfig(lag_interval=None))
+        model = DispatchingModel(ScriptedModel([succeeded("a", "b")]), dispatcher)
+        collector = Collector()
+        await model.generate(GenerationRequest(prompt="p"), collector)
+        return dispatcher.registry.snapshot()
+
+    snapshot = asyncio.run(main())
+    (series,) = snapshot["dispatch_queue_depth"]["series"]
+    assert series[0] == [callback_name(Collector())]
+    assert series[1] == 0
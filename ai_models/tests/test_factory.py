@@ -0,0 +1,39 @@
+"""Tests of the model factory."""
+
+import os
+import subprocess
+import sys
+
+from ai_models.base import ModelConfig, ModelType
+from ai_models.catalog import CatalogRouter
+from ai_models.circuit import BreakerRegistry, FailoverModel
+from ai_models.credentials import Credential, CredentialPool, PooledModel
+from ai_models.factory import DefaultModelFactory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_importing_the_factory_loads_no_optional_modules():
+    code = (
+        "import sys, ai_models.factory\n"
+        "print(' '.join(sorted(m for m in sys.modules if m.startswith(('ai_models.', 'aiohttp')))))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert output == ["ai_models.base", "ai_models.factory", "ai_models.registry"]
+
+def test_factory_builds_pools_failover_and_routers():
+    factory = DefaultModelFactory()
+    config = ModelConfig(api_key="k")
+    pool = CredentialPool(config, [Credential("a"), Credential("b")])
+    assert isinstance(factory.create_model(ModelType.OPENAI, pool), PooledModel)
+
+    failover = factory.create_failover(
+        [(ModelType.DOUBAO, "high_aes_general_v21_L"), (ModelType.OPENAI, "gpt-4o-image")],
+        {ModelType.DOUBAO: config, ModelType.OPENAI: config},
+    )
+    assert isinstance(failover, FailoverModel)
+    assert isinstance(factory.breakers, BreakerRegistry) and failover.breakers is factory.breakers
+
+    router = factory.create_router({ModelType.OPENAI: config})
+    assert isinstance(router, CatalogRouter)
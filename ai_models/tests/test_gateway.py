@@ -0,0 +1,71 @@
+"""Tests of the HTTP gateway."""
+
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from ai_models.base import ModelType
+from ai_models.factory import DefaultModelFactory
+from ai_models.gateway import Gateway
+
+from support import ScriptedModel, run_with_standin, standin_config
+
+async def post(gateway, path, body):
+    # Closing the client shuts the app down, which drains the gateway.
+    async with TestClient(TestServer(gateway.app())) as client:
+        response = await client.post(path, json=body)
+        return response.status, await response.json()
+
+def test_generate_through_a_router():
+    async def scenario(server, url):
+        factory = DefaultModelFactory()
+        router = factory.create_router({ModelType.OPENAI: standin_config(ModelType.OPENAI, url)})
+        return await post(Gateway(router, factory=factory), "/v1/generate", {"prompt": "a cat", "n": 1})
+
+    status, body = run_with_standin(scenario)
+    assert status == 200 and body["success"]
+
+def test_fields_of_the_wrong_type_are_rejected():
+    cases = [
+        ({"prompt": "p", "n": "3"}, "n"),
+        ({"prompt": "p", "seed": 1.5}, "seed"),
+        ({"prompt": "p", "deadline": "x"}, "deadline"),
+        ({"prompt": "p", "width": True}, "width"),
+        ({"prompt": "p", "retain_chunks": None}, "retain_chunks"),
+        ({"prompt": "p", "stream": True}, "stream"),
+        ({"prompt": "p", "size": "1024x1024"}, "size"),
+    ]
+
+    async def main():
+        return [await post(Gateway(ScriptedModel()), "/v1/generate", body) for body, _ in cases]
+
+    for (status, body), (_, name) in zip(asyncio.run(main()), cases):
+        assert status == 400, body
+        assert body["error_code"] == "client_error"
+        assert name in body["error"]
+
+def test_batch_items_are_validated():
+    async def main():
+        good = await post(
+            Gateway(ScriptedModel()), "/v1/batch", {"requests": [{"prompt": "p", "cfg_scale": 7, "deadline": None}]}
+        )
+        bad = await post(Gateway(ScriptedModel()), "/v1/batch", {"requests": [{"prompt": "p"}, {"prompt": "q", "steps": "20"}]})
+        return good, bad
+
+    (good_status, good), (bad_status, bad) = asyncio.run(main())
+    assert good_status == 200 and good["responses"][0]["success"]
+    assert bad_status == 400 and "steps" in bad["error"]
+
+def test_durations_of_error_responses_are_recorded():
+    async def main():
+        gateway = Gateway(ScriptedModel())
+        async with TestClient(TestServer(gateway.app())) as client:
+            missing = await client.get("/missing")
+            wrong_method = await client.get("/v1/generate")
+            return gateway, missing.status, wrong_method.status
+
+    gateway, missing, wrong_method = asyncio.run(main())
+    assert (missing, wrong_method) == (404, 405)
+    assert gateway._seconds.count("unmatched") == 2
+    assert gateway._responses.value("unmatched", "404") == 1
+    assert gateway._responses.value("unmatched", "405") == 1
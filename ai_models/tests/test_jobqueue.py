@@ -0,0 +1,120 @@
+"""Tests of the SQLite job queue and its worker pool."""
+
+import asyncio
+
+from ai_models.base import GenerationRequest
+from ai_models.jobqueue import JobQueue, JobQueueConfig, JobState, JobWorkerPool, WorkerPoolConfig
+
+from support import ScriptedModel, failed, succeeded
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_jobs_run_in_priority_order(tmp_path):
+    async def main():
+        async with JobQueue(JobQueueConfig(path=str(tmp_path / "jobs.db"))) as queue:
+            low = await queue.submit(GenerationRequest(prompt="low"), priority=10)
+            high = await queue.submit(GenerationRequest(prompt="high"), priority=0)
+            claimed = await queue.claim("w", limit=2)
+            return [job.id for job in claimed], [low.id, high.id]
+
+    claimed, (low, high) = asyncio.run(main())
+    assert claimed == [high, low]
+
+def test_idempotency_key_returns_the_existing_job(tmp_path):
+    async def main():
+        async with JobQueue(JobQueueConfig(path=str(tmp_path / "jobs.db"))) as queue:
+            first = await queue.submit(GenerationRequest(prompt="p"), idempotency_key="k")
+            second = await queue.submit(GenerationRequest(prompt="q"), idempotency_key="k")
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert first.id == second.id and second.request.prompt == "p"
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    clock = FakeClock()
+
+    async def main():
+        config = JobQueueConfig(path=str(tmp_path / "jobs.db"), lease=10.0, max_attempts=2)
+        async with JobQueue(config, clock) as queue:
+            job = await queue.submit(GenerationRequest(prompt="p"))
+            (claimed,) = await queue.claim("crashed")
+            assert await queue.claim("other") == []
+            clock.now += 10.0
+            (reclaimed,) = await queue.claim("other")
+            assert reclaimed.id == job.id and reclaimed.attempts == 2
+            # The first worker lost the lease and cannot complete the job.
+            lost = await queue.complete(claimed, succeeded(), "crashed")
+            assert lost.state is JobState.RUNNING and lost.worker == "other"
+            clock.now += 10.0
+            assert await queue.claim("third") == []
+            return await queue.get(job.id)
+
+    assert asyncio.run(main()).state is JobState.FAILED
+
+def test_renewed_lease_is_kept(tmp_path):
+    clock = FakeClock()
+
+    async def main():
+        async with JobQueue(JobQueueConfig(path=str(tmp_path / "jobs.db"), lease=10.0), clock) as queue:
+            job = await queue.submit(GenerationRequest(prompt="p"))
+            await queue.claim("w")
+            clock.now += 9.0
+            assert await queue.renew([job.id], "w") == 1
+            clock.now += 9.0
+            return await queue.claim("other")
+
+    assert asyncio.run(main()) == []
+
+def test_retryable_failures_are_retried_with_backoff(tmp_path):
+    clock = FakeClock()
+
+    async def main():
+        config = JobQueueConfig(path=str(tmp_path / "jobs.db"), retry_backoff=5.0)
+        async with JobQueue(config, clock) as queue:
+            await queue.submit(GenerationRequest(prompt="p"))
+            (job,) = await queue.claim("w")
+            retried = await queue.complete(job, failed("rate_limited"), "w")
+            assert retried.state is JobState.PENDING
+            assert await queue.claim("w") == []
+            clock.now += 5.0
+            (job,) = await queue.claim("w")
+            return await queue.complete(job, failed("client_error"), "w")
+
+    assert asyncio.run(main()).state is JobState.FAILED
+
+def test_worker_pool_runs_submitted_jobs(tmp_path):
+    async def main():
+        async with JobQueue(JobQueueConfig(path=str(tmp_path / "jobs.db"))) as queue:
+            model = ScriptedModel([succeeded("done")])
+            async with JobWorkerPool(queue, model, WorkerPoolConfig(concurrency=2, poll_interval=0.05)):
+                jobs = [await queue.submit(GenerationRequest(prompt=str(i))) for i in range(3)]
+                return [await queue.wait(job.id, timeout=5.0) for job in jobs]
+
+    jobs = asyncio.run(main())
+    assert all(job.state is JobState.SUCCEEDED for job in jobs)
+    assert jobs[0].response.chunks[0].content == "done"
+
+def test_leases_are_renewed_while_the_pool_drains(tmp_path):
+    async def main():
+        config = JobQueueConfig(path=str(tmp_path / "jobs.db"), lease=0.15)
+        async with JobQueue(config) as queue:
+            pool = JobWorkerPool(queue, ScriptedModel(delay=0.6), WorkerPoolConfig(concurrency=1, poll_interval=0.05))
+            pool.start()
+            job = await queue.submit(GenerationRequest(prompt="p"))
+            while not pool.running:
+                await asyncio.sleep(0.01)
+            stopping = asyncio.create_task(pool.stop())
+            await asyncio.sleep(0.4)
+            # Well past the lease: another worker must not get the job.
+            stolen = await queue.claim("other")
+            await stopping
+            return stolen, await queue.get(job.id)
+
+    stolen, job = asyncio.run(main())
+    assert stolen == []
+    assert job.state is JobState.SUCCEEDED and job.attempts == 1
@@ -0,0 +1,81 @@
+"""Tests of the image materialization pipeline."""
+
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+
+from aiohttp import web
+
+from ai_models.base import GenerationResponse, ContentChunk, ContentType
+from ai_models.materialize import ImagePipeline, MaterializeConfig
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + os.urandom(200_000)
+
+def image(url):
+    return ContentChunk(type=ContentType.IMAGE, content=url)
+
+async def serve_image():
+    async def handler(request):
+        return web.Response(body=IMAGE, content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/image.png", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}/image.png"
+
+def test_downloads_are_stored_once_by_content(tmp_path):
+    async def main():
+        runner, url = await serve_image()
+        try:
+            config = MaterializeConfig(root=str(tmp_path / "store"), variants={}, chunk_size=16 * 1024)
+            async with ImagePipeline(config) as pipeline:
+                response = GenerationResponse(success=True, chunks=[image(url), image(url + "?again")])
+                return await pipeline.materialize(response)
+        finally:
+            await runner.cleanup()
+
+    first, second = asyncio.run(main()).chunks
+    assert first.metadata["sha256"] == hashlib.sha256(IMAGE).hexdigest()
+    assert first.metadata["local_path"] == second.metadata["local_path"]
+    assert {first.metadata["deduplicated"], second.metadata["deduplicated"]} == {True, False}
+    assert Path(first.metadata["local_path"]).read_bytes() == IMAGE
+    assert os.listdir(tmp_path / "store" / "tmp") == []
+
+def test_local_files_are_added_to_the_store(tmp_path):
+    source = tmp_path / "decoded.png"
+    source.write_bytes(IMAGE)
+
+    async def main():
+        config = MaterializeConfig(root=str(tmp_path / "store"), variants={})
+        async with ImagePipeline(config) as pipeline:
+            return await pipeline.materialize_chunk(image(source.as_uri()))
+
+    chunk = asyncio.run(main())
+    assert "materialize_error" not in chunk.metadata
+    assert chunk.metadata["local_path"].endswith(".png")
+    assert chunk.metadata["size"] == len(IMAGE)
+    assert Path(chunk.metadata["local_path"]).read_bytes() == IMAGE
+    assert source.exists()
+
+def test_oversized_images_fail_without_leftovers(tmp_path):
+    source = tmp_path / "decoded.png"
+    source.write_bytes(IMAGE)
+
+    async def main():
+        runner, url = await serve_image()
+        try:
+            config = MaterializeConfig(root=str(tmp_path / "store"), variants={}, max_bytes=1024)
+            async with ImagePipeline(config) as pipeline:
+                response = GenerationResponse(success=True, chunks=[image(url), image(source.as_uri())])
+                return await pipeline.materialize(response)
+        finally:
+            await runner.cleanup()
+
+    for chunk in asyncio.run(main()).chunks:
+        assert "exceeds" in chunk.metadata["materialize_error"]
+    assert os.listdir(tmp_path / "store") == ["tmp"]
+    assert os.listdir(tmp_path / "store" / "tmp") == []
@@ -0,0 +1,70 @@
+"""Tests of the metrics registry and request instrumentation."""
+
+import pytest
+
+from ai_models.base import GenerationRequest, ModelType
+from ai_models.factory import DefaultModelFactory
+from ai_models.metrics import Instrumentation, MetricsRegistry
+
+from support import run_with_standin, standin_config
+
+def test_counter_and_gauge_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ("route",))
+    requests.inc(1, 'a"b')
+    requests.inc(2, 'a"b')
+    registry.gauge("depth", "Depth.").set(1.5)
+    assert registry.render_prometheus() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{route="a\\"b"} 3\n'
+        "# HELP depth Depth.\n"
+        "# TYPE depth gauge\n"
+        "depth 1.5\n"
+    )
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency", "Latency.", ("p",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "x")
+    assert registry.render_prometheus().splitlines()[2:] == [
+        'latency_bucket{p="x",le="0.1"} 1',
+        'latency_bucket{p="x",le="1"} 2',
+        'latency_bucket{p="x",le="+Inf"} 3',
+        'latency_sum{p="x"} 5.55',
+        'latency_count{p="x"} 3',
+    ]
+
+def test_merge_sums_the_series_of_snapshots():
+    workers = [MetricsRegistry() for _ in range(2)]
+    for i, registry in enumerate(workers):
+        registry.counter("calls_total", "Calls.", ("worker",)).inc(i + 1, "all")
+        registry.histogram("seconds", "Seconds.", buckets=(1.0,)).observe(0.5 + i)
+    merged = MetricsRegistry()
+    for registry in workers:
+        merged.merge(registry.snapshot())
+    assert merged.counter("calls_total", "Calls.", ("worker",)).value("all") == 3
+    assert merged.histogram("seconds", "Seconds.", buckets=(1.0,)).count() == 2
+
+def test_name_registered_with_another_kind_is_rejected():
+    registry = MetricsRegistry()
+    registry.counter("x", "X.")
+    with pytest.raises(ValueError):
+        registry.gauge("x", "X.")
+
+def test_instrumented_model_records_phases_and_outcome():
+    async def scenario(server, url):
+        instrumentation = Instrumentation()
+        async with DefaultModelFactory(instrumentation=instrumentation) as factory:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            response = await model.generate(GenerationRequest(prompt="p", model="gpt-4o"))
+        assert response.success, response.error
+        return instrumentation
+
+    instrumentation = run_with_standin(scenario)
+    labels = ("openai", "gpt-4o")
+    assert instrumentation.requests.value(*labels, "ok") == 1
+    for phase in ("build", "connect", "first_byte", "first_chunk", "total"):
+        assert instrumentation.phase_seconds.count(*labels, phase) == 1, phase
+    assert instrumentation.received_bytes.value(*labels) > 0
@@ -0,0 +1,95 @@
+"""Tests of the shared task poller."""
+
+import asyncio
+
+import pytest
+
+from ai_models.base import ErrorCode, ProviderError
+from ai_models.polling import PollConfig, TaskPoller
+
+QUICK = PollConfig(initial_interval=0.001, max_interval=0.004, backoff=2.0)
+
+def polls_until(done_after, result="ok"):
+    """Poll function reporting done on its ``done_after``-th call."""
+    calls = []
+
+    async def poll():
+        calls.append(asyncio.get_running_loop().time())
+        return len(calls) >= done_after, result
+
+    return poll, calls
+
+def test_task_is_polled_until_done():
+    async def main():
+        poller = TaskPoller(QUICK)
+        poll, calls = polls_until(4)
+        result = await poller.wait(poll, key="t")
+        return poller, result, calls
+
+    poller, result, calls = asyncio.run(main())
+    assert result == "ok"
+    assert len(calls) == 4 and poller.polls_total == 4
+    assert poller.pending == 0
+
+def test_poll_error_fails_the_task():
+    async def main():
+        async def poll():
+            raise ProviderError("task failed")
+        with pytest.raises(ProviderError, match="task failed"):
+            await TaskPoller(QUICK).wait(poll)
+
+    asyncio.run(main())
+
+def test_pending_task_times_out():
+    async def main():
+        poll, _ = polls_until(10 ** 9)
+        poller = TaskPoller(PollConfig(initial_interval=0.001, task_timeout=0.02))
+        with pytest.raises(ProviderError) as raised:
+            await poller.wait(poll, key="slow")
+        return raised.value
+
+    error = asyncio.run(main())
+    assert error.code is ErrorCode.TIMEOUT
+    assert "slow" in str(error)
+
+def test_polls_are_batched_with_bounded_concurrency():
+    async def main():
+        poller = TaskPoller(PollConfig(initial_interval=0.001, max_concurrency=2))
+        running = peak = 0
+
+        async def poll():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return True, None
+
+        await asyncio.gather(*(poller.wait(poll) for _ in range(6)))
+        return peak
+
+    assert asyncio.run(main()) == 2
+
+def test_cancelled_caller_cancels_its_poll_in_flight():
+    async def main():
+        poller = TaskPoller(QUICK)
+        started = asyncio.Event()
+        cancelled = []
+
+        async def poll():
+            started.set()
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return True, None
+
+        waiter = asyncio.create_task(poller.wait(poll))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        # The poll was cancelled before the caller's cancellation completed.
+        return list(cancelled)
+
+    assert asyncio.run(main()) == [True]
@@ -0,0 +1,105 @@
+"""End-to-end tests of the provider models against the stand-in servers."""
+
+import asyncio
+import base64
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from ai_models.base import ModelConfig, ModelType, GenerationRequest, ContentType, ErrorCode
+from ai_models.benchmarks.standins import StandinConfig
+from ai_models.doubao_model import DoubaoModel
+from ai_models.factory import DefaultModelFactory
+
+from support import FAST, Collector, run_with_standin, standin_config
+
+def test_openai_streams_text_and_image():
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            collector = Collector()
+            response = await model.generate(GenerationRequest(prompt="a cat"), collector)
+        assert response.success, response.error
+        assert "".join(c.content for c in collector.chunks if c.type is ContentType.TEXT) == "x" * 24
+        assert [c.type for c in collector.chunks].count(ContentType.IMAGE) == 1
+        assert server.requests["chat_completions"] == 1
+
+    run_with_standin(scenario)
+
+def test_openai_maps_throttling_to_rate_limited():
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            response = await model.generate(GenerationRequest(prompt="a cat"))
+        assert not response.success
+        assert response.error_code == ErrorCode.RATE_LIMITED.value
+
+    run_with_standin(scenario, StandinConfig(latency=0.0, jitter=0.0, throttle_rate=1.0))
+
+def test_doubao_returns_image_urls():
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.DOUBAO, standin_config(ModelType.DOUBAO, url))
+            response = await model.generate(GenerationRequest(prompt="a cat"))
+        assert response.success, response.error
+        assert [c.type for c in response.chunks] == [ContentType.IMAGE]
+        assert server.requests["CVProcess"] == 1
+
+    run_with_standin(scenario)
+
+def test_doubao_decodes_inline_images(tmp_path):
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(
+                ModelType.DOUBAO, standin_config(ModelType.DOUBAO, url), image_dir=str(tmp_path)
+            )
+            return await model.generate(GenerationRequest(prompt="a cat"))
+
+    response = run_with_standin(scenario)
+    assert response.success, response.error
+    (chunk,) = response.chunks
+    assert chunk.content.startswith("file://")
+    with open(chunk.metadata["path"], "rb") as f:
+        data = f.read()
+    assert data.startswith(b"\x89PNG") and len(data) == FAST.image_bytes
+
+def test_doubao_signs_the_endpoint_host_by_default():
+    assert DoubaoModel(ModelConfig(api_key="k"))._signer.host == "visual.volcengineapi.com"
+    local = DoubaoModel(ModelConfig(api_key="k", endpoint="http://127.0.0.1:8080"))
+    assert local._signer.host == "127.0.0.1:8080"
+    explicit = DoubaoModel(ModelConfig(api_key="k", endpoint="http://127.0.0.1:8080", host="example.com"))
+    assert explicit._signer.host == "example.com"
+
+def test_doubao_rejects_more_images_than_the_model_allows():
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.DOUBAO, standin_config(ModelType.DOUBAO, url))
+            rejected = await model.generate(GenerationRequest(prompt="a cat", n=100))
+            allowed = await model.generate(GenerationRequest(prompt="a cat", n=4))
+        assert rejected.error_code == ErrorCode.CLIENT_ERROR.value
+        assert "at most 4" in rejected.error
+        assert allowed.success, allowed.error
+        assert server.requests["CVProcess"] == 4
+
+    run_with_standin(scenario)
+
+def test_doubao_discards_inline_images_of_a_failed_response(tmp_path):
+    image = base64.b64encode(b"\x89PNG\r\n\x1a\n" + bytes(64)).decode()
+
+    async def handle(request):
+        return web.json_response({"message": "Quota exceeded", "data": {"binary_data_base64": [image]}})
+
+    async def main():
+        app = web.Application()
+        app.router.add_post("/", handle)
+        async with TestServer(app) as server:
+            async with DefaultModelFactory() as factory:
+                config = standin_config(ModelType.DOUBAO, str(server.make_url("")).rstrip("/"))
+                model = factory.create_model(ModelType.DOUBAO, config, image_dir=str(tmp_path / "images"))
+                return await model.generate(GenerationRequest(prompt="a cat"))
+
+    (tmp_path / "images").mkdir()
+    response = asyncio.run(main())
+    assert response.error == "Quota exceeded"
+    assert os.listdir(tmp_path / "images") == []
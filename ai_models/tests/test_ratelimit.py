@@ -0,0 +1,119 @@
+"""Tests of the token bucket and the AIMD concurrency window."""
+
+import asyncio
+import time
+
+from ai_models.base import GenerationRequest, ErrorCode
+from ai_models.ratelimit import (
+    AIMDWindow,
+    RateLimitConfig,
+    RateLimitedModel,
+    RateLimiterRegistry,
+    TokenBucket
+)
+
+from support import ScriptedModel
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_bucket_refills_at_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, burst=4, clock=clock)
+    assert bucket.tokens == 4
+    bucket.pause(1.0)
+    assert bucket.tokens == 0
+    clock.now += 1.0
+    assert bucket.tokens == 2.0
+    clock.now += 10.0
+    assert bucket.tokens == 4
+
+def test_window_decreases_once_per_burst_and_grows_on_success():
+    clock = FakeClock()
+    window = AIMDWindow(RateLimitConfig(initial_concurrency=8), clock)
+
+    async def main():
+        return [await window.acquire() for _ in range(4)]
+
+    permits = asyncio.run(main())
+    clock.now += 1.0
+    window.release(permits[0], throttled=True, succeeded=False)
+    window.release(permits[1], throttled=True, succeeded=False)
+    assert window.size == 4.0
+    window.release(permits[2], throttled=False, succeeded=True)
+    assert window.size == 4.25
+    window.release(permits[3], throttled=False, succeeded=False)
+    assert window.in_flight == 0
+
+def test_window_hands_slots_to_waiters_in_order():
+    async def main():
+        window = AIMDWindow(RateLimitConfig(initial_concurrency=1))
+        first = await window.acquire()
+        order = []
+
+        async def wait(name):
+            await window.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(wait(name)) for name in ("a", "b")]
+        await asyncio.sleep(0)
+        assert order == []
+        window.release(first, throttled=False, succeeded=False)
+        await asyncio.sleep(0)
+        assert order == ["a"]
+        window.release(0.0, throttled=False, succeeded=False)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["a", "b"]
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        window = AIMDWindow(RateLimitConfig(initial_concurrency=1))
+        first = await window.acquire()
+        waiter = asyncio.create_task(window.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        window.release(first, throttled=False, succeeded=False)
+        return window
+
+    window = asyncio.run(main())
+    assert window.in_flight == 0
+    assert not window._waiters
+
+def test_waiter_cancelled_and_dropped_before_it_resumes():
+    async def main():
+        window = AIMDWindow(RateLimitConfig(initial_concurrency=1))
+        first = await window.acquire()
+        waiter = asyncio.create_task(window.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        # The release runs before the cancelled task resumes and drops the waiter.
+        window.release(first, throttled=False, succeeded=False)
+        results = await asyncio.gather(waiter, return_exceptions=True)
+        return window, results
+
+    window, (result,) = asyncio.run(main())
+    assert isinstance(result, asyncio.CancelledError)
+    assert window.in_flight == 0 and not window._waiters
+
+def test_limiter_wait_ends_at_the_request_deadline():
+    async def main():
+        registry = RateLimiterRegistry(RateLimitConfig(rate=1.0, burst=1))
+        model = RateLimitedModel(ScriptedModel(), registry)
+        model.limiter.bucket.pause(10.0)
+        started = time.monotonic()
+        response = await model.generate(GenerationRequest(prompt="p", deadline=time.time() + 0.05))
+        return model, response, time.monotonic() - started
+
+    model, response, waited = asyncio.run(main())
+    assert response.error_code == ErrorCode.RATE_LIMITED.value
+    assert waited < 1.0
+    assert model.model.calls == 0
+    snapshot = model.limiter.snapshot()
+    assert snapshot["expired_total"] == 1 and snapshot["in_flight"] == 0 and snapshot["waiting"] == 0
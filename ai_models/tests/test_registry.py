@@ -0,0 +1,59 @@
+"""Tests of the lazy provider registry."""
+
+import importlib.metadata
+import subprocess
+import sys
+
+import pytest
+
+from ai_models.base import ModelType
+from ai_models.registry import ENTRY_POINT_GROUP, ProviderRegistry, import_target
+
+from support import ScriptedModel
+
+def test_importing_the_factory_loads_no_provider():
+    code = (
+        "import sys, ai_models.factory\n"
+        "print(sorted(m for m in ('aiohttp', 'ai_models.openai_model', 'ai_models.doubao_model')"
+        " if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
+
+def test_dotted_paths_are_imported_on_first_resolve():
+    registry = ProviderRegistry({"scripted": "support:ScriptedModel"}, entry_points=False)
+    assert registry.resolve("scripted") is ScriptedModel
+    assert registry._classes["scripted"] is ScriptedModel
+
+def test_model_types_and_registrations():
+    registry = ProviderRegistry(entry_points=False)
+    assert ModelType.OPENAI in registry and "doubao" in registry
+    registry.register(ModelType.OPENAI, ScriptedModel)
+    assert registry.resolve(ModelType.OPENAI) is ScriptedModel
+    with pytest.raises(ValueError):
+        registry.resolve("unknown")
+
+def test_import_target_accepts_both_separators():
+    assert import_target("support:ScriptedModel") is ScriptedModel
+    assert import_target("support.ScriptedModel") is ScriptedModel
+    with pytest.raises(ImportError):
+        import_target("support:Missing")
+
+def test_unknown_providers_are_looked_up_in_entry_points(monkeypatch):
+    declared = [
+        importlib.metadata.EntryPoint("plugin", "support:ScriptedModel", ENTRY_POINT_GROUP),
+        importlib.metadata.EntryPoint("openai", "support:Collector", ENTRY_POINT_GROUP),
+    ]
+    groups = []
+
+    def entry_points(group):
+        groups.append(group)
+        return declared
+
+    monkeypatch.setattr(importlib.metadata, "entry_points", entry_points)
+    registry = ProviderRegistry()
+    assert registry.resolve("plugin") is ScriptedModel
+    # Built-in registrations take precedence, and entry points are read once.
+    assert registry._targets["openai"].endswith("openai_model:OpenAIModel")
+    assert "plugin" in registry.names()
+    assert groups == [ENTRY_POINT_GROUP]
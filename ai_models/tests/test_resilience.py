@@ -0,0 +1,117 @@
+"""Tests of retries, hedging and deadlines."""
+
+import asyncio
+
+from ai_models.base import ErrorCode, GenerationRequest, GenerationResponse
+from ai_models.resilience import HedgePolicy, ResiliencePolicy, ResilientModel, RetryPolicy
+
+from support import Collector, ScriptedModel, failed, succeeded, text
+
+NO_DELAY = RetryPolicy(base_delay=0.0)
+
+class SlowFirstModel(ScriptedModel):
+    """Scripted model whose first call hangs until cancelled."""
+
+    async def generate(self, request, callback=None):
+        if self.started == 0:
+            self.started += 1
+            self.requests.append(request)
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return await super().generate(request, callback)
+
+def test_retryable_failure_is_retried():
+    async def main():
+        model = ScriptedModel([failed("upstream_error"), succeeded("a")])
+        resilient = ResilientModel(model, ResiliencePolicy(retry=NO_DELAY))
+        response = await resilient.generate(GenerationRequest(prompt="p"))
+        return model, response
+
+    model, response = asyncio.run(main())
+    assert response.success
+    assert model.calls == 2
+    assert response.metadata["attempts"] == 2
+
+def test_client_error_is_not_retried():
+    async def main():
+        model = ScriptedModel([failed("client_error"), succeeded("a")])
+        resilient = ResilientModel(model, ResiliencePolicy(retry=NO_DELAY))
+        response = await resilient.generate(GenerationRequest(prompt="p"))
+        return model, response
+
+    model, response = asyncio.run(main())
+    assert response.error_code == ErrorCode.CLIENT_ERROR.value
+    assert model.calls == 1
+
+def test_stream_is_not_retried_after_a_chunk():
+    partial = GenerationResponse(
+        success=False, chunks=[text("a")], error="reset", error_code=ErrorCode.NETWORK_ERROR.value
+    )
+
+    async def main():
+        model = ScriptedModel([partial, succeeded("b")])
+        collector = Collector()
+        resilient = ResilientModel(model, ResiliencePolicy(retry=NO_DELAY))
+        response = await resilient.generate(GenerationRequest(prompt="p"), collector)
+        return model, response, collector
+
+    model, response, collector = asyncio.run(main())
+    assert not response.success
+    assert model.calls == 1
+    assert collector.contents == ["a"]
+
+def test_backoff_is_capped_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1.0, max_delay=2.0, multiplier=10.0)
+    assert all(0 <= policy.backoff(attempt) <= min(2.0, 10.0 ** (attempt - 1)) for attempt in range(1, 5))
+    assert policy.backoff(1, retry_after=7.0) == 7.0
+
+def test_policy_deadline_fails_a_hanging_call():
+    async def main():
+        model = ScriptedModel(gate=asyncio.Event())
+        resilient = ResilientModel(model, ResiliencePolicy(deadline=0.05))
+        return model, await resilient.generate(GenerationRequest(prompt="p"))
+
+    model, response = asyncio.run(main())
+    assert response.error_code == ErrorCode.DEADLINE_EXCEEDED.value
+    assert model.cancelled == 1
+
+def test_latency_of_successes_is_tracked():
+    async def main():
+        model = ScriptedModel([succeeded("a"), failed("client_error")])
+        resilient = ResilientModel(model)
+        await resilient.generate(GenerationRequest(prompt="p"))
+        await resilient.generate(GenerationRequest(prompt="p"))
+        return resilient
+
+    resilient = asyncio.run(main())
+    assert len(resilient.latencies) == 1
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    async def main():
+        model = SlowFirstModel([succeeded("a")])
+        policy = ResiliencePolicy(hedge=HedgePolicy(min_samples=1, min_delay=0.01))
+        resilient = ResilientModel(model, policy)
+        resilient.latencies.record(0.01)
+        assert resilient.hedge_delay() == 0.01
+        response = await resilient.generate(GenerationRequest(prompt="p"))
+        # The loser has been cancelled and awaited by the time we return.
+        return model, response, model.cancelled
+
+    model, response, cancelled = asyncio.run(main())
+    assert response.success
+    assert model.calls == 2
+    assert cancelled == 1
+
+def test_streaming_calls_are_not_hedged():
+    async def main():
+        model = ScriptedModel([succeeded("a")], delay=0.05)
+        policy = ResiliencePolicy(hedge=HedgePolicy(min_samples=1, min_delay=0.01))
+        resilient = ResilientModel(model, policy)
+        resilient.latencies.record(0.01)
+        await resilient.generate(GenerationRequest(prompt="p"), Collector())
+        return model
+
+    assert asyncio.run(main()).calls == 1
@@ -0,0 +1,41 @@
+"""Tests of the Volcengine request signer."""
+
+import asyncio
+import hashlib
+import hmac
+
+from ai_models.benchmarks.signing import (
+    ACCESS_KEY, ACTION, BODY, HOST, REGION, SECRET_KEY, SERVICE, VERSION, LegacySigner
+)
+from ai_models.signing import V4Signer, sign_string_encoder
+
+def signer(**kwargs):
+    return V4Signer(ACCESS_KEY, SECRET_KEY, REGION, SERVICE, HOST, **kwargs)
+
+def test_headers_match_the_legacy_signer():
+    cached = signer()
+    for x_date in ("20240101T000000Z", "20240101T235959Z", "20241231T120000Z"):
+        legacy = asyncio.run(LegacySigner().sign(BODY.decode(), x_date))
+        assert cached.sign(BODY, ACTION, VERSION, x_date) == legacy
+
+def test_string_and_bytes_bodies_sign_alike():
+    x_date = "20240101T000000Z"
+    assert signer().sign(BODY.decode(), ACTION, VERSION, x_date) == signer().sign(BODY, ACTION, VERSION, x_date)
+
+def test_signing_key_is_derived_per_date_and_cached():
+    s = signer(max_cached_keys=2)
+    key = s.signing_key("20240101")
+    expected = SECRET_KEY.encode()
+    for part in ("20240101", REGION, SERVICE, "request"):
+        expected = hmac.new(expected, part.encode(), hashlib.sha256).digest()
+    assert key == expected
+    assert s.signing_key("20240101") is key
+    s.signing_key("20240102")
+    s.signing_key("20240103")
+    # The oldest date was evicted and is derived again.
+    assert s.signing_key("20240101") is not key
+    assert len(s._keys) == 2
+
+def test_query_string_is_percent_encoded():
+    assert signer().query_string("A b*", "1/2") == "Action=A%20b%2A&Version=1%2F2"
+    assert sign_string_encoder("a~*") == "a~%2A"
@@ -0,0 +1,157 @@
+"""Tests of single-flight request coalescing."""
+
+import asyncio
+import time
+
+from ai_models.base import GenerationRequest, ErrorCode, StopGeneration
+from ai_models.singleflight import SingleFlightModel, _Flight
+
+from support import Collector, ScriptedModel, succeeded, text
+
+def test_identical_requests_share_one_call():
+    async def main():
+        gate = asyncio.Event()
+        model = ScriptedModel([succeeded("a", "b")], gate=gate)
+        flights = SingleFlightModel(model)
+        collectors = [Collector() for _ in range(3)]
+        tasks = [
+            asyncio.create_task(flights.generate(GenerationRequest(prompt="p"), collector))
+            for collector in collectors
+        ]
+        await asyncio.sleep(0)
+        assert flights.in_flight == 1
+        gate.set()
+        responses = await asyncio.gather(*tasks)
+        return model, flights, collectors, responses
+
+    model, flights, collectors, responses = asyncio.run(main())
+    assert model.calls == 1
+    assert flights.in_flight == 0
+    assert all(c.contents == ["a", "b"] for c in collectors)
+    assert all(r.success for r in responses)
+
+def test_different_requests_are_not_coalesced():
+    async def main():
+        model = ScriptedModel()
+        flights = SingleFlightModel(model)
+        await asyncio.gather(
+            flights.generate(GenerationRequest(prompt="p")),
+            flights.generate(GenerationRequest(prompt="q")),
+        )
+        return model
+
+    assert asyncio.run(main()).calls == 2
+
+def test_cancelling_the_last_waiter_cancels_the_call():
+    async def main():
+        model = ScriptedModel(gate=asyncio.Event())
+        flights = SingleFlightModel(model)
+        task = asyncio.create_task(flights.generate(GenerationRequest(prompt="p")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return model, flights
+
+    model, flights = asyncio.run(main())
+    assert model.cancelled == 1
+    assert flights.in_flight == 0
+
+def test_joiner_outlives_the_leaders_deadline():
+    async def main():
+        model = ScriptedModel([succeeded("a")], delay=0.2)
+        flights = SingleFlightModel(model)
+        leader = asyncio.create_task(flights.generate(GenerationRequest(prompt="p", deadline=time.time() + 0.05)))
+        await asyncio.sleep(0)
+        joiner = await flights.generate(GenerationRequest(prompt="p", deadline=time.time() + 5))
+        return model, await leader, joiner
+
+    model, leader, joiner = asyncio.run(main())
+    assert leader.error_code == ErrorCode.DEADLINE_EXCEEDED.value
+    assert joiner.success
+    assert model.calls == 1 and model.cancelled == 0
+    # The shared call is not bounded by the leader's deadline.
+    assert model.requests[0].deadline is None
+
+def test_call_is_cancelled_when_every_caller_timed_out():
+    async def main():
+        model = ScriptedModel(delay=1.0)
+        flights = SingleFlightModel(model)
+        response = await flights.generate(GenerationRequest(prompt="p", deadline=time.time() + 0.02))
+        await asyncio.sleep(0)
+        return model, flights, response
+
+    model, flights, response = asyncio.run(main())
+    assert response.error_code == ErrorCode.DEADLINE_EXCEEDED.value
+    assert model.cancelled == 1 and flights.in_flight == 0
+
+def test_chunks_are_dropped_without_retain_chunks():
+    async def main():
+        gate = asyncio.Event()
+        flights = SingleFlightModel(ScriptedModel([succeeded(*"abcd")], gate=gate))
+        sizes = []
+
+        async def callback(chunk):
+            sizes.append(len(flight.chunks))
+
+        task = asyncio.create_task(flights.generate(GenerationRequest(prompt="p", retain_chunks=False), callback))
+        await asyncio.sleep(0)
+        (flight,) = flights._flights.values()
+        gate.set()
+        return sizes, await task
+
+    sizes, response = asyncio.run(main())
+    assert sizes == [4, 3, 2, 1]
+    assert response.success
+
+def test_late_joiners_skip_flights_that_dropped_chunks():
+    async def main():
+        flight = _Flight(retain_chunks=False)
+        subscriber = object()
+        flight.move(subscriber, 0)
+        assert flight.serves(GenerationRequest(prompt="p", retain_chunks=False))
+        assert not flight.serves(GenerationRequest(prompt="p"))
+        await flight.publish(text("a"))
+        flight.move(subscriber, 1)
+        return flight
+
+    flight = asyncio.run(main())
+    assert flight.chunks == [] and flight.dropped == 1
+    assert not flight.serves(GenerationRequest(prompt="p", retain_chunks=False))
+
+def test_stop_generation_cancels_only_that_caller():
+    async def main():
+        gate = asyncio.Event()
+        flights = SingleFlightModel(ScriptedModel([succeeded("a", "b")], gate=gate))
+        async def stop(chunk):
+            raise StopGeneration()
+        collector = Collector()
+        tasks = [
+            asyncio.create_task(flights.generate(GenerationRequest(prompt="p"), stop)),
+            asyncio.create_task(flights.generate(GenerationRequest(prompt="p"), collector)),
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks), collector
+
+    (stopped, other), collector = asyncio.run(main())
+    assert stopped.error_code == ErrorCode.CANCELLED.value
+    assert other.success
+    assert collector.contents == ["a", "b"]
+
+def test_callback_errors_are_logged_and_delivery_goes_on():
+    async def main():
+        flights = SingleFlightModel(ScriptedModel([succeeded("a", "b", "c")]))
+        received = []
+
+        async def flaky(chunk):
+            received.append(chunk.content)
+            if chunk.content == "a":
+                raise RuntimeError("bad chunk")
+
+        response = await flights.generate(GenerationRequest(prompt="p"), flaky)
+        return response, received
+
+    response, received = asyncio.run(main())
+    assert response.success
+    assert received == ["a", "b", "c"]
@@ -0,0 +1,42 @@
+"""Tests of the incremental SSE decoder."""
+
+from ai_models.sse import SSEDecoder
+
+STREAM = (
+    b": keep-alive\r\n"
+    b"event: delta\r\n"
+    b"id: 1\r\n"
+    b"data: {\"a\": 1}\r\n"
+    b"\r\n"
+    b"data: line one\n"
+    b"data:line two\n"
+    b"\n"
+    b"data: [DONE]\n\n"
+)
+
+def decode(pieces):
+    decoder = SSEDecoder()
+    events = []
+    for piece in pieces:
+        events.extend(decoder.feed(piece))
+    events.extend(decoder.flush())
+    return [(e.event, e.id, e.data) for e in events]
+
+EXPECTED = decode([STREAM])
+
+def test_decodes_fields_and_multiline_data():
+    assert EXPECTED == [
+        ("delta", "1", '{"a": 1}'),
+        (None, "1", "line one\nline two"),
+        (None, "1", "[DONE]"),
+    ]
+
+def test_any_split_into_two_reads_gives_the_same_events():
+    for i in range(len(STREAM) + 1):
+        assert decode([STREAM[:i], STREAM[i:]]) == EXPECTED, i
+
+def test_byte_by_byte_reads_give_the_same_events():
+    assert decode([STREAM[i:i + 1] for i in range(len(STREAM))]) == EXPECTED
+
+def test_flush_completes_an_unterminated_event():
+    assert decode([b"data: tail"]) == [(None, None, "tail")]
@@ -0,0 +1,82 @@
+"""Tests of the async-iterator streaming API."""
+
+import asyncio
+from contextlib import aclosing
+from dataclasses import replace
+
+import pytest
+
+from ai_models.base import ContentType, ErrorCode, GenerationRequest, ModelType, ProviderError
+from ai_models.factory import DefaultModelFactory
+from ai_models.openai_model import CoalesceConfig
+
+from support import FAST, ScriptedModel, failed, run_with_standin, standin_config, succeeded, text
+
+def test_stream_yields_the_chunks_in_order():
+    async def main():
+        model = ScriptedModel([succeeded("a", "b", "c")])
+        return [chunk.content async for chunk in model.generate_stream(GenerationRequest(prompt="p"))]
+
+    assert asyncio.run(main()) == ["a", "b", "c"]
+
+def test_failed_generation_raises_provider_error():
+    async def main():
+        model = ScriptedModel([failed("rate_limited")])
+        with pytest.raises(ProviderError) as raised:
+            async for _ in model.generate_stream(GenerationRequest(prompt="p")):
+                pass
+        return raised.value
+
+    assert asyncio.run(main()).code is ErrorCode.RATE_LIMITED
+
+def test_closing_the_stream_early_cancels_the_upstream():
+    async def main():
+        model = ScriptedModel([succeeded(*"abcdefgh")])
+        async with aclosing(model.generate_stream(GenerationRequest(prompt="p"), buffer_size=1)) as stream:
+            first = await stream.__anext__()
+        return model, first
+
+    model, first = asyncio.run(main())
+    assert first.content == "a"
+    assert model.cancelled == 1
+
+def test_openai_streams_natively():
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            return [chunk async for chunk in model.generate_stream(GenerationRequest(prompt="a cat"))]
+
+    chunks = run_with_standin(scenario)
+    assert "".join(c.content for c in chunks if c.type is ContentType.TEXT) == "x" * 24
+    assert chunks[-1].type is ContentType.IMAGE
+
+def coalesced_stream(coalesce, standin):
+    async def scenario(server, url):
+        async with DefaultModelFactory() as factory:
+            model = factory.create_model(
+                ModelType.OPENAI, standin_config(ModelType.OPENAI, url), coalesce=coalesce
+            )
+            return [chunk async for chunk in model.generate_stream(GenerationRequest(prompt="a cat"))]
+
+    return run_with_standin(scenario, standin)
+
+def test_coalescing_merges_deltas_and_keeps_the_text():
+    standin = replace(FAST, chunks=20, chunk_size=4)
+    chunks = coalesced_stream(CoalesceConfig(max_chars=32, flush_interval=1.0), standin)
+    texts = [c.content for c in chunks if c.type is ContentType.TEXT]
+    assert "".join(texts) == "x" * 80
+    # The first delta is emitted alone; the rest is merged up to max_chars.
+    assert texts[0] == "xxxx"
+    assert len(texts) < 20 and all(len(t) <= 32 + 4 for t in texts)
+    assert chunks[-1].type is ContentType.IMAGE
+
+def test_coalescing_flushes_held_text_after_the_interval():
+    standin = replace(FAST, chunks=4, chunk_size=4, chunk_interval=0.05)
+    chunks = coalesced_stream(CoalesceConfig(max_chars=1000, flush_interval=0.01), standin)
+    texts = [c.content for c in chunks if c.type is ContentType.TEXT]
+    # Deltas arrive slower than the flush interval, so none are held back together.
+    assert texts == ["xxxx"] * 4
+
+def test_chunks_have_no_instance_dict():
+    chunk = text("a")
+    assert not hasattr(chunk, "__dict__")
@@ -0,0 +1,62 @@
+"""Tests of the pooled HTTP transport."""
+
+import asyncio
+
+from ai_models.base import ModelType, GenerationRequest
+from ai_models.benchmarks.standins import StandinServer
+from ai_models.factory import DefaultModelFactory
+
+from support import FAST, standin_config
+
+def test_factory_can_be_shared_across_event_loops():
+    factory = DefaultModelFactory()
+
+    async def generate():
+        server = StandinServer(FAST)
+        url = await server.start()
+        try:
+            model = factory.create_model(ModelType.OPENAI, standin_config(ModelType.OPENAI, url))
+            return await model.generate(GenerationRequest(prompt="p"))
+        finally:
+            await server.stop()
+
+    first = asyncio.run(generate())
+    second = asyncio.run(generate())
+    assert first.success, first.error
+    assert second.success, second.error
+    # The first loop's session was closed when that loop shut down.
+    assert len(factory.transport._sessions) == 0
+
+def test_sessions_are_reused_within_a_loop():
+    async def main():
+        async with DefaultModelFactory() as factory:
+            transport = factory.transport
+            first = await transport.session_for("http://127.0.0.1:1/a")
+            assert await transport.session_for("http://127.0.0.1:1/b") is first
+        return first
+
+    assert asyncio.run(main()).closed
+
+def test_close_with_sessions_for_two_hosts():
+    async def main():
+        server = StandinServer(FAST)
+        url = await server.start()
+        try:
+            factory = DefaultModelFactory()
+            transport = factory.transport
+            sessions = [
+                await transport.session_for(url),
+                await transport.session_for(url.replace("127.0.0.1", "localhost")),
+            ]
+            for session in sessions:
+                async with session.get(f"{url}/v1/models") as response:
+                    await response.read()
+            await factory.close()
+            return sessions, transport
+        finally:
+            await server.stop()
+
+    sessions, transport = asyncio.run(main())
+    assert len(sessions) == 2 and sessions[0] is not sessions[1]
+    assert all(session.closed for session in sessions)
+    assert not transport._sessions
@@ -0,0 +1,102 @@
+"""Tests of the multi-process worker mode."""
+
+import asyncio
+import time
+from dataclasses import replace
+
+from ai_models.base import ErrorCode, GenerationRequest, ModelType, StopGeneration
+from ai_models.workers import ShardedModel, SupervisorConfig, _Worker
+
+from support import FAST, run_with_standin, standin_config
+
+class FakeProcess:
+    """Worker process whose output is fed by the test."""
+
+    def __init__(self):
+        self.stdout = asyncio.StreamReader()
+        self.returncode = None
+        self.killed = False
+
+    def kill(self) -> None:
+        self.killed = True
+
+def test_malformed_message_fails_calls_and_kills_worker():
+    async def main():
+        model = ShardedModel(config=SupervisorConfig(processes=1))
+        worker = _Worker(0)
+        worker.ready.set()
+        process = worker.process = FakeProcess()
+        queue = asyncio.Queue()
+        worker.calls[7] = queue
+        process.stdout.feed_data(b'{"id": 7, "type": "chunk", "data": {"type": "text", "content": "a"}}\n')
+        process.stdout.feed_data(b'{"id": 7, "type": "chu\n')
+        await asyncio.wait_for(model._read(worker, process), 1)
+        return worker, process, [queue.get_nowait() for _ in range(queue.qsize())]
+
+    worker, process, messages = asyncio.run(main())
+    assert [kind for kind, _ in messages] == ["chunk", "response"]
+    assert messages[1][1].error_code == ErrorCode.INTERNAL_ERROR.value
+    assert not worker.calls
+    assert not worker.ready.is_set()
+    assert process.killed
+
+def test_message_without_fields_fails_calls():
+    async def main():
+        model = ShardedModel(config=SupervisorConfig(processes=1))
+        worker = _Worker(0)
+        process = worker.process = FakeProcess()
+        queue = asyncio.Queue()
+        worker.calls[3] = queue
+        process.stdout.feed_data(b'{"id": 3}\n')
+        await asyncio.wait_for(model._read(worker, process), 1)
+        return process, queue.get_nowait()
+
+    process, (kind, response) = asyncio.run(main())
+    assert kind == "response" and response.error_code == ErrorCode.INTERNAL_ERROR.value
+    assert process.killed
+
+def run_sharded(scenario):
+    """Run a scenario against one worker serving OpenAI from a slow stand-in."""
+    async def main(server, url):
+        config = standin_config(ModelType.OPENAI, url)
+        model = ShardedModel(
+            args={"providers": {"openai": {"api_key": config.api_key, "endpoint": config.endpoint}}},
+            config=SupervisorConfig(processes=1, stop_timeout=10)
+        )
+        await model.start()
+        try:
+            result = await scenario(model)
+        finally:
+            start = time.monotonic()
+            await model.close()
+            stopped = time.monotonic() - start
+        return result, stopped
+
+    return run_with_standin(main, replace(FAST, chunks=100, chunk_interval=0.05))
+
+def test_stop_generation_cancels_the_call_in_the_worker():
+    async def scenario(model):
+        async def stop(chunk):
+            raise StopGeneration("gone")
+        return await model.generate(GenerationRequest(prompt="p"), stop)
+
+    response, stopped = run_sharded(scenario)
+    assert response.error_code == ErrorCode.CANCELLED.value
+    assert response.error == "gone"
+    # The stream would take 5s; the worker only waits for it if not cancelled.
+    assert stopped < 2
+
+def test_cancelled_caller_cancels_the_call_in_the_worker():
+    async def scenario(model):
+        first = asyncio.Event()
+        async def callback(chunk):
+            first.set()
+        task = asyncio.create_task(model.generate(GenerationRequest(prompt="p"), callback))
+        await first.wait()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return task.cancelled()
+
+    cancelled, stopped = run_sharded(scenario)
+    assert cancelled
+    assert stopped < 2
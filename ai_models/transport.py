@@ -0,0 +1,256 @@
+"""Shared HTTP transport for AI model implementations.
+
+This module provides a pooled HTTP client layer. One ``aiohttp.ClientSession``
+is kept per upstream host and event loop so that model instances can reuse
+warm TCP/TLS connections instead of opening a new session for every model.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Sequence, Tuple
+from urllib.parse import urlsplit
+import aiohttp
+from .base import ErrorCode, ProviderError
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TransportConfig:
+    """Configuration for the pooled HTTP transport.
+
+    Attributes:
+        limit: Maximum number of simultaneous connections per session.
+        limit_per_host: Maximum number of simultaneous connections to one endpoint.
+        keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        dns_cache_ttl: Seconds resolved addresses are cached, or None to cache forever.
+        connect_timeout: Optional timeout in seconds for establishing a connection.
+        total_timeout: Optional timeout in seconds for a whole request.
+    """
+    limit: int = 100
+    limit_per_host: int = 0
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: Optional[int] = 300
+    connect_timeout: Optional[float] = 10.0
+    total_timeout: Optional[float] = None
+
+class HTTPTransport:
+    """Pool of ``aiohttp`` sessions, one per upstream host and event loop.
+
+    Sessions are created lazily on first use and live until ``close()`` is
+    called or their event loop shuts down. A session is bound to the loop
+    that created it, so a transport shared across ``asyncio.run`` calls
+    opens fresh sessions on each loop, and closes them when ``asyncio.run``
+    cancels the loop's remaining tasks. Model instances borrow sessions
+    from the transport and must not close them themselves.
+    """
+
+    def __init__(
+        self,
+        config: Optional[TransportConfig] = None,
+        trace_configs: Sequence[aiohttp.TraceConfig] = ()
+    ):
+        """Initialize the transport.
+
+        Args:
+            config: Optional transport configuration.
+            trace_configs: Optional ``aiohttp`` trace configs attached to
+                every session, e.g. ``Instrumentation.trace_config()``.
+        """
+        self.config = config or TransportConfig()
+        self.trace_configs = list(trace_configs)
+        self._sessions: Dict[Tuple[asyncio.AbstractEventLoop, str], aiohttp.ClientSession] = {}
+        # Per loop, a task closing the loop's sessions when it is cancelled.
+        self._watchers: Dict[asyncio.AbstractEventLoop, "asyncio.Task[None]"] = {}
+        self._closed = False
+
+    async def __aenter__(self) -> "HTTPTransport":
+        """Enter the transport context."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close all pooled sessions when exiting context."""
+        await self.close()
+
+    @property
+    def closed(self) -> bool:
+        """Whether the transport has been closed."""
+        return self._closed
+
+    @staticmethod
+    def host_key(url: str) -> str:
+        """Get the pool key for a URL.
+
+        Args:
+            url: The request URL.
+
+        Returns:
+            The scheme and network location of the URL.
+        """
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """Create a new pooled session."""
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.config.total_timeout,
+            sock_connect=self.config.connect_timeout,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            trace_configs=self.trace_configs or None,
+        )
+
+    async def session_for(self, url: str) -> aiohttp.ClientSession:
+        """Get the pooled session for the host of a URL.
+
+        Args:
+            url: The request URL.
+
+        Returns:
+            The shared session for the URL's host on the running loop.
+
+        Raises:
+            RuntimeError: If the transport has been closed.
+        """
+        if self._closed:
+            raise RuntimeError("HTTP transport is closed")
+
+        loop = asyncio.get_running_loop()
+        key = (loop, self.host_key(url))
+        session = self._sessions.get(key)
+        if session is not None and not session.closed:
+            return session
+
+        # Creating the session does not await, so no lock is needed.
+        self._discard_stale()
+        session = self._create_session()
+        self._sessions[key] = session
+        if loop not in self._watchers:
+            self._watchers[loop] = loop.create_task(self._close_on_shutdown(loop))
+        logger.debug("Opened pooled HTTP session for %s", key[1])
+        return session
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Wait until cancelled, e.g. by ``asyncio.run``, then close the loop's sessions."""
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._watchers.pop(loop, None)
+            await self._close_sessions(loop)
+
+    async def _close_sessions(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Close the sessions of one loop, which must be running."""
+        for key in [key for key in self._sessions if key[0] is loop]:
+            # Another caller may have closed it while we awaited.
+            session = self._sessions.pop(key, None)
+            if session is not None and not session.closed:
+                await session.close()
+
+    def _discard_stale(self) -> None:
+        """Drop the sessions of event loops that have been closed."""
+        for key in [key for key in self._sessions if key[0].is_closed()]:
+            # The loop can no longer run the session's cleanup.
+            self._sessions.pop(key).detach()
+        for loop in [loop for loop in self._watchers if loop.is_closed()]:
+            del self._watchers[loop]
+
+    async def close(self) -> None:
+        """Close all pooled sessions.
+
+        Sessions of the running loop are closed gracefully. Those of other
+        loops are closed by their loop's shutdown, or released if that loop
+        is already closed.
+        """
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        watcher = self._watchers.pop(loop, None)
+        if watcher is not None:
+            watcher.cancel()
+            # Its cleanup closes the loop's sessions; let it finish first.
+            await asyncio.gather(watcher, return_exceptions=True)
+        await self._close_sessions(loop)
+        self._discard_stale()
+
+def request_timeout(session: aiohttp.ClientSession, connect_timeout: Optional[float]) -> aiohttp.ClientTimeout:
+    """Get the timeout of one request made with a pooled session.
+
+    Args:
+        session: The session making the request.
+        connect_timeout: Optional seconds to acquire a pooled or new
+            connection, overriding the session's connect timeout.
+
+    Returns:
+        The session timeout, with the connect timeout applied.
+    """
+    timeout = session.timeout
+    if connect_timeout is None:
+        return timeout
+    return aiohttp.ClientTimeout(
+        total=timeout.total,
+        connect=connect_timeout,
+        sock_read=timeout.sock_read,
+        sock_connect=timeout.sock_connect,
+        ceil_threshold=timeout.ceil_threshold,
+    )
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header given in seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+async def provider_error_from(response: aiohttp.ClientResponse, fallback: str) -> ProviderError:
+    """Build a ProviderError from a failed upstream response.
+
+    Args:
+        response: The failed HTTP response.
+        fallback: Message used when the body has no ``message`` field.
+
+    Returns:
+        The error, carrying the status code and any ``Retry-After`` delay.
+    """
+    try:
+        error_data = await response.json(content_type=None)
+    except ValueError:
+        error_data = {}
+    message = None
+    if isinstance(error_data, dict):
+        message = error_data.get("message")
+    return ProviderError(
+        message or fallback,
+        status=response.status,
+        retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+    )
+
+def error_code_for(exc: BaseException) -> ErrorCode:
+    """Classify an exception raised while calling an upstream.
+
+    Args:
+        exc: The exception.
+
+    Returns:
+        The matching error code.
+    """
+    if isinstance(exc, ProviderError):
+        return exc.code
+    if isinstance(exc, aiohttp.ConnectionTimeoutError):
+        return ErrorCode.CONNECT_TIMEOUT
+    if isinstance(exc, aiohttp.SocketTimeoutError):
+        return ErrorCode.IDLE_TIMEOUT
+    if isinstance(exc, asyncio.TimeoutError):
+        return ErrorCode.TIMEOUT
+    if isinstance(exc, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, OSError)):
+        return ErrorCode.NETWORK_ERROR
+    return ErrorCode.INTERNAL_ERROR
@@ -0,0 +1,580 @@
+"""Multi-process worker mode with requests sharded by consistent hashing.
+
+One event loop saturates a core on request signing, JSON parsing and SSE
+handling. ``ShardedModel`` runs N worker processes, each with its own event
+loop, ``DefaultModelFactory`` and connection pool, and sends every request
+to a worker chosen by a consistent hash of its request key. Identical
+requests therefore always land on the same worker, so per-process caches
+and single-flight coalescing keep working, and adding a worker only moves
+about 1/N of the keys.
+
+Workers build their model by calling a builder, given as a dotted path so
+it can be imported in the child, with a factory and JSON-compatible
+arguments. The default builder, ``build_router``, serves every configured
+provider through a ``CatalogRouter``. Streamed chunks, responses and
+metrics flow back to the caller; crashed workers are restarted with
+backoff, and their shard is served by the next worker on the ring
+meanwhile.
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Union
+
+from .base import (
+    AIModel,
+    ModelConfig,
+    GenerationRequest,
+    GenerationResponse,
+    ContentCallback,
+    ErrorCode,
+    StopGeneration
+)
+from .credentials import Credential, CredentialPool
+from .factory import DefaultModelFactory
+from .metrics import Instrumentation, MetricsRegistry
+from .registry import import_target
+from .serialization import (
+    chunk_from_dict,
+    chunk_to_dict,
+    request_from_dict,
+    request_key,
+    request_to_dict,
+    response_from_dict,
+    response_to_dict
+)
+from .sse import json_dumps, json_loads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUILDER = f"{__name__}:build_router"
+
+# Maximum size of one protocol message, i.e. of one serialized response.
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+def build_router(
+    factory: DefaultModelFactory,
+    providers: Mapping[str, Mapping[str, Any]],
+    default_model: Optional[str] = None,
+    options: Optional[Mapping[str, Mapping[str, Any]]] = None
+) -> AIModel:
+    """Build a router over providers given as plain dicts.
+
+    Args:
+        factory: The factory creating the provider models.
+        providers: ``ModelConfig`` fields per provider name. String values
+            may reference environment variables, e.g. ``"${PIAPI_KEY}"``.
+            A ``credentials`` list of ``Credential`` fields creates a
+            credential pool, configured by an optional ``pool`` dict of
+            ``CredentialPool`` options.
+        default_model: Optional model used for requests without ``model``.
+        options: Optional provider-specific options per provider name.
+
+    Returns:
+        A ``CatalogRouter`` serving every model of the providers.
+
+    Raises:
+        ValueError: If no providers are given or one is unsupported.
+    """
+    if not providers:
+        raise ValueError("No providers configured")
+    def expand(values: Mapping[str, Any], names: Set[str]) -> Dict[str, Any]:
+        return {
+            k: os.path.expandvars(v) if isinstance(v, str) else v
+            for k, v in values.items() if k in names
+        }
+
+    names = {f.name for f in fields(ModelConfig)}
+    credential_names = {f.name for f in fields(Credential)}
+    configs: Dict[str, Union[ModelConfig, CredentialPool]] = {}
+    for provider, values in providers.items():
+        if values.get("credentials"):
+            # The keys come from the credentials; the shared config needs none.
+            config = ModelConfig(**{"api_key": "", **expand(values, names)})
+            credentials = [Credential(**expand(c, credential_names)) for c in values["credentials"]]
+            configs[provider] = CredentialPool(config, credentials, **values.get("pool", {}))
+        else:
+            configs[provider] = ModelConfig(**expand(values, names))
+    return factory.create_router(configs, default_model, options)
+
+class ConsistentHashRing:
+    """Consistent hash ring mapping keys to a fixed set of nodes."""
+
+    def __init__(self, nodes: int, virtual_nodes: int = 64):
+        """Build the ring.
+
+        Args:
+            nodes: Number of nodes, identified by index.
+            virtual_nodes: Points per node on the ring; more points spread
+                keys more evenly.
+        """
+        points = sorted(
+            (self._hash(f"node-{node}-{replica}"), node)
+            for node in range(nodes)
+            for replica in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+        self.size = nodes
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def nodes_for(self, key: str) -> Iterator[int]:
+        """Iterate over the distinct nodes in ring order, starting at a key's owner.
+
+        Args:
+            key: The key.
+
+        Yields:
+            Node indexes; the first is the key's owner, the next ones are its
+            fallbacks.
+        """
+        start = bisect.bisect(self._hashes, self._hash(key))
+        seen = set()
+        for offset in range(len(self._nodes)):
+            node = self._nodes[(start + offset) % len(self._nodes)]
+            if node not in seen:
+                seen.add(node)
+                yield node
+                if len(seen) == self.size:
+                    return
+
+@dataclass
+class SupervisorConfig:
+    """Configuration of the worker supervisor.
+
+    Attributes:
+        processes: Number of worker processes. Defaults to the CPU count.
+        virtual_nodes: Points per worker on the hash ring.
+        start_timeout: Seconds a worker gets to build its model.
+        restart_backoff: Delay before restarting a crashed worker, in
+            seconds; doubled for every crash in a row.
+        max_restart_backoff: Upper bound of the restart delay, in seconds.
+        stable_after: Seconds a worker must run to reset its backoff.
+        stop_timeout: Seconds workers get to finish running requests on close.
+    """
+    processes: Optional[int] = None
+    virtual_nodes: int = 64
+    start_timeout: float = 30.0
+    restart_backoff: float = 0.5
+    max_restart_backoff: float = 30.0
+    stable_after: float = 60.0
+    stop_timeout: float = 30.0
+
+class _Worker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.reader: Optional["asyncio.Task[None]"] = None
+        self.ready = asyncio.Event()
+        self.calls: Dict[int, "asyncio.Queue[Tuple[str, Any]]"] = {}
+        self.started_at = 0.0
+        self.restarts = 0
+        self.models: List[Dict[str, Any]] = []
+        self.streaming: List[str] = []
+
+    @property
+    def alive(self) -> bool:
+        return self.ready.is_set() and self.process is not None and self.process.returncode is None
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        self.process.stdin.write(json_dumps(message) + b"\n")
+        await self.process.stdin.drain()
+
+    def fail_calls(self, error: str) -> None:
+        """Fail every call in flight on this worker."""
+        response = GenerationResponse(
+            success=False,
+            chunks=[],
+            error=error,
+            error_code=ErrorCode.INTERNAL_ERROR.value
+        )
+        for queue in self.calls.values():
+            queue.put_nowait(("response", response))
+        self.calls.clear()
+
+    def cancel(self, call_id: int) -> None:
+        """Stop a call whose caller has gone away, unless it already ended."""
+        if self.calls.pop(call_id, None) is None:
+            return
+        stdin = self.process.stdin
+        if not stdin.is_closing():
+            # Written without draining, so it also works while cancelled.
+            stdin.write(json_dumps({"id": call_id, "type": "cancel"}) + b"\n")
+
+class ShardedModel(AIModel):
+    """Model running requests in a pool of worker processes."""
+
+    provider = "sharded"
+
+    def __init__(
+        self,
+        builder: str = DEFAULT_BUILDER,
+        args: Optional[Mapping[str, Any]] = None,
+        config: Optional[SupervisorConfig] = None
+    ):
+        """Initialize the supervisor. Call ``start`` before generating.
+
+        Args:
+            builder: Dotted path of a callable ``(factory, **args) -> AIModel``
+                run in every worker.
+            args: JSON-compatible keyword arguments of the builder.
+            config: Optional supervisor configuration.
+        """
+        self.builder = builder
+        self.args = dict(args or {})
+        self.config = config or SupervisorConfig()
+        processes = self.config.processes or os.cpu_count() or 1
+        self.ring = ConsistentHashRing(processes, self.config.virtual_nodes)
+        self.registry = MetricsRegistry()
+        self._restarts = self.registry.counter(
+            "worker_restarts_total", "Worker processes restarted after a crash.", ("worker",)
+        )
+        self._workers = [_Worker(index) for index in range(processes)]
+        self._monitors: List["asyncio.Task[None]"] = []
+        self._ids = itertools.count()
+        self._closing = False
+
+    async def __aenter__(self) -> "ShardedModel":
+        """Start the workers when entering context."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Stop the workers when exiting context."""
+        await self.close()
+
+    async def start(self) -> None:
+        """Start all workers and wait until they are ready.
+
+        Raises:
+            RuntimeError: If a worker fails to start.
+        """
+        self._closing = False
+        await asyncio.gather(*(self._spawn(worker) for worker in self._workers))
+        self._monitors = [asyncio.create_task(self._supervise(worker)) for worker in self._workers]
+
+    async def _spawn(self, worker: _Worker) -> None:
+        """Start a worker process and wait for its ready message."""
+        worker.ready.clear()
+        worker.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", __name__, "--worker", str(worker.index),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=MAX_MESSAGE_SIZE,
+        )
+        worker.started_at = time.monotonic()
+        await worker.send({"builder": self.builder, "args": self.args})
+        try:
+            async with asyncio.timeout(self.config.start_timeout):
+                line = await worker.process.stdout.readline()
+        except TimeoutError:
+            line = b""
+        if not line:
+            worker.process.kill()
+            await worker.process.wait()
+            raise RuntimeError(f"Worker {worker.index} failed to start")
+        message = json_loads(line)
+        worker.models = message["models"]
+        worker.streaming = message["streaming"]
+        worker.ready.set()
+        worker.reader = asyncio.create_task(self._read(worker, worker.process))
+        logger.info("Worker %d started as pid %d", worker.index, worker.process.pid)
+
+    async def _read(self, worker: _Worker, process: asyncio.subprocess.Process) -> None:
+        """Route messages of a worker to the waiting calls.
+
+        A malformed message leaves the worker's output in an unknown state,
+        so its calls fail and the worker is killed, and then restarted by
+        ``_supervise`` like after a crash.
+        """
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    return
+                message = json_loads(line)
+                queue = worker.calls.get(message["id"])
+                if queue is None:
+                    continue
+                kind, data = message["type"], message["data"]
+                if kind != "chunk":
+                    del worker.calls[message["id"]]
+                queue.put_nowait((kind, data))
+        except (ValueError, KeyError, TypeError) as e:
+            # ValueError also covers lines longer than MAX_MESSAGE_SIZE.
+            logger.error("Worker %d sent a malformed message; restarting it: %r", worker.index, e)
+            worker.ready.clear()
+            worker.fail_calls(f"Worker {worker.index} sent a malformed message")
+            if process.returncode is None:
+                process.kill()
+
+    async def _supervise(self, worker: _Worker) -> None:
+        """Restart a worker whenever it exits, until the model is closed."""
+        backoff = self.config.restart_backoff
+        while True:
+            code = await worker.process.wait()
+            worker.ready.clear()
+            if self._closing:
+                return
+            worker.fail_calls(f"Worker {worker.index} exited with code {code}")
+            if time.monotonic() - worker.started_at >= self.config.stable_after:
+                backoff = self.config.restart_backoff
+            logger.error("Worker %d exited with code %s; restarting in %.1fs",
+                         worker.index, code, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.config.max_restart_backoff)
+            try:
+                await self._spawn(worker)
+            except (RuntimeError, OSError):
+                logger.exception("Failed to restart worker %d", worker.index)
+                continue
+            worker.restarts += 1
+            self._restarts.inc(1, str(worker.index))
+
+    def worker_for(self, request: GenerationRequest) -> Optional[_Worker]:
+        """Get the live worker owning a request's shard, or its first live fallback."""
+        for index in self.ring.nodes_for(request_key(request)):
+            worker = self._workers[index]
+            if worker.alive:
+                return worker
+        return None
+
+    async def _call(
+        self,
+        worker: _Worker,
+        message: Dict[str, Any]
+    ) -> Tuple[int, "asyncio.Queue[Tuple[str, Any]]"]:
+        call_id = next(self._ids)
+        queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+        worker.calls[call_id] = queue
+        try:
+            await worker.send({"id": call_id, **message})
+        except (ConnectionError, OSError) as e:
+            worker.calls.pop(call_id, None)
+            raise ConnectionError(f"Worker {worker.index} is unavailable: {e}") from e
+        return call_id, queue
+
+    async def generate(
+        self,
+        request: GenerationRequest,
+        callback: Optional[ContentCallback] = None
+    ) -> GenerationResponse:
+        """Generate content in the worker owning the request's shard.
+
+        Args:
+            request: The generation request parameters.
+            callback: Optional callback for streaming content.
+
+        Returns:
+            A GenerationResponse containing the generation results. Requests
+            in flight on a worker that crashes fail with ``internal_error``.
+            If the callback raises ``StopGeneration`` or the caller is
+            cancelled, the worker is told to stop the request.
+        """
+        worker = self.worker_for(request)
+        if worker is None:
+            return GenerationResponse(
+                success=False,
+                chunks=[],
+                error="No worker is available",
+                error_code=ErrorCode.OVERLOADED.value
+            )
+        try:
+            call_id, queue = await self._call(worker, {
+                "type": "generate",
+                "request": request_to_dict(request),
+                "stream": callback is not None,
+            })
+        except ConnectionError as e:
+            return GenerationResponse(
+                success=False, chunks=[], error=str(e), error_code=ErrorCode.INTERNAL_ERROR.value
+            )
+
+        chunks = []
+        try:
+            while True:
+                kind, data = await queue.get()
+                if kind == "response":
+                    return data if isinstance(data, GenerationResponse) else response_from_dict(data)
+                chunk = chunk_from_dict(data)
+                chunks.append(chunk)
+                try:
+                    await callback(chunk)
+                except StopGeneration as e:
+                    worker.cancel(call_id)
+                    return GenerationResponse(
+                        success=False,
+                        chunks=chunks,
+                        error=str(e) or "Generation stopped by the callback",
+                        error_code=ErrorCode.CANCELLED.value
+                    )
+                except Exception:
+                    logger.exception("Error in content callback")
+        except asyncio.CancelledError:
+            worker.cancel(call_id)
+            raise
+
+    async def metrics(self) -> MetricsRegistry:
+        """Collect the metrics of all live workers.
+
+        Returns:
+            A registry with the sum of the workers' metrics and the
+            supervisor's own. Counters of a restarted worker start over.
+        """
+        merged = MetricsRegistry()
+        merged.merge(self.registry.snapshot())
+        for worker in self._workers:
+            if not worker.alive:
+                continue
+            try:
+                _, queue = await self._call(worker, {"type": "metrics"})
+            except ConnectionError:
+                continue
+            kind, data = await queue.get()
+            if kind == "metrics":
+                merged.merge(data)
+        return merged
+
+    def get_available_models(self) -> List[Dict[str, Any]]:
+        """Get the models served by the workers.
+
+        Returns:
+            A list of dictionaries containing model information.
+        """
+        return next((worker.models for worker in self._workers if worker.models), [])
+
+    def supports_streaming(self, model: str) -> bool:
+        """Check if the workers stream a model."""
+        return any(model in worker.streaming for worker in self._workers)
+
+    async def close(self) -> None:
+        """Stop the workers after they finish their running requests."""
+        self._closing = True
+        for task in self._monitors:
+            task.cancel()
+        await asyncio.gather(*self._monitors, return_exceptions=True)
+        self._monitors = []
+
+        async def stop(worker: _Worker) -> None:
+            process = worker.process
+            if process is None or process.returncode is not None:
+                return
+            process.stdin.close()
+            try:
+                async with asyncio.timeout(self.config.stop_timeout):
+                    await process.wait()
+            except TimeoutError:
+                logger.warning("Worker %d did not stop in time; killing it", worker.index)
+                process.kill()
+                await process.wait()
+            worker.fail_calls(f"Worker {worker.index} stopped")
+
+        await asyncio.gather(*(stop(worker) for worker in self._workers))
+
+class _WorkerProcess:
+    """Child-side loop serving requests from the supervisor."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.registry = MetricsRegistry()
+        self.factory = DefaultModelFactory(instrumentation=Instrumentation(self.registry))
+        self.model: Optional[AIModel] = None
+        # Running generations by call ID.
+        self._tasks: Dict[int, "asyncio.Task[None]"] = {}
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        self.writer.write(json_dumps(message) + b"\n")
+        await self.writer.drain()
+
+    async def run(self) -> None:
+        spec = json_loads(await self.reader.readline())
+        builder: Callable[..., AIModel] = import_target(spec["builder"])
+        self.model = builder(self.factory, **spec["args"])
+        models = self.model.get_available_models()
+        await self.send({
+            "models": models,
+            "streaming": [m["id"] for m in models if self.model.supports_streaming(m["id"])],
+        })
+
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json_loads(line)
+                if message["type"] == "metrics":
+                    await self.send({
+                        "id": message["id"], "type": "metrics", "data": self.registry.snapshot()
+                    })
+                    continue
+                call_id = message["id"]
+                if message["type"] == "cancel":
+                    # The caller is gone and expects no response.
+                    task = self._tasks.get(call_id)
+                    if task is not None:
+                        task.cancel()
+                    continue
+                task = asyncio.create_task(self._generate(message))
+                self._tasks[call_id] = task
+                task.add_done_callback(lambda _, call_id=call_id: self._tasks.pop(call_id, None))
+            # The supervisor closed our input: finish running requests, then exit.
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            await self.model.close()
+            await self.factory.close()
+
+    async def _generate(self, message: Dict[str, Any]) -> None:
+        call_id = message["id"]
+
+        async def send_chunk(chunk) -> None:
+            await self.send({"id": call_id, "type": "chunk", "data": chunk_to_dict(chunk)})
+
+        request = request_from_dict(message["request"])
+        try:
+            response = await self.model.generate(request, send_chunk if message["stream"] else None)
+        except Exception as e:
+            logger.exception("Error in worker generation")
+            response = GenerationResponse(
+                success=False, chunks=[], error=str(e), error_code=ErrorCode.INTERNAL_ERROR.value
+            )
+        await self.send({"id": call_id, "type": "response", "data": response_to_dict(response)})
+
+async def _serve_worker() -> None:
+    """Serve the supervisor over stdin and the original stdout."""
+    loop = asyncio.get_running_loop()
+    # Keep stdout for the protocol; stray prints go to stderr instead.
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    reader = asyncio.StreamReader(limit=MAX_MESSAGE_SIZE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(
+        lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()), protocol_out
+    )
+    writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    await _WorkerProcess(reader, writer).run()
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--worker", type=int, required=True, help="Index of this worker")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format=f"worker {args.worker}: %(levelname)s %(name)s: %(message)s")
+    asyncio.run(_serve_worker())
+
+if __name__ == "__main__":
+    main()